@@ -4,6 +4,7 @@ from .models import (
     User, SourceFile, ExtractedMedia, 
     Subject, Context, Question, GenerationLog
 )
+from .search import matching_question_ids
 
 
 # ============== USER ADMIN ==============
@@ -150,6 +151,14 @@ class QuestionAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of LIKE '%term%' scans when available
+        fts = matching_question_ids(search_term)
+        if fts is None:
+            return super().get_search_results(request, queryset, search_term)
+        where, params = fts
+        return queryset.extra(where=[where], params=params), False
+    
     def stem_preview(self, obj):
         return obj.stem[:60] + '...' if len(obj.stem) > 60 else obj.stem
     stem_preview.short_description = 'Stem'
@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
 
 
 class GenmcqConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'genmcq'
+
+    def ready(self):
+        from . import db, dedup, search
+        from .models import Question, Subject
+
+        # SQLite tuning profile (settings.SQLITE_PRAGMAS)
+        connection_created.connect(db.apply_sqlite_pragmas, dispatch_uid='apply_sqlite_pragmas')
+
+        # Keep loaded near-duplicate indexes in sync with the question bank
+        post_save.connect(dedup.question_saved, sender=Question, dispatch_uid='dedup_question_saved')
+        post_delete.connect(dedup.question_deleted, sender=Question, dispatch_uid='dedup_question_deleted')
+        post_delete.connect(dedup.subject_deleted, sender=Subject, dispatch_uid='dedup_subject_deleted')
+
+        # Keep the full-text index in sync (same transaction as the row change)
+        post_save.connect(search.question_saved, sender=Question, dispatch_uid='search_question_saved')
+        post_delete.connect(search.question_deleted, sender=Question, dispatch_uid='search_question_deleted')
+        post_save.connect(search.subject_saved, sender=Subject, dispatch_uid='search_subject_saved')
@@ -0,0 +1,219 @@
+"""
+Server-side export of a Subject's questions.
+
+Rows are read with .values().iterator() so only a chunk of questions is in
+memory at a time. Text formats (CSV, JSONL, JSON) are generated
+incrementally for StreamingHttpResponse. Binary formats (XLSX, DOCX, PDF)
+are written to a temporary file that is then sent back in chunks:
+XLSX uses openpyxl's write-only mode. python-docx has no streaming writer,
+so DOCX keeps the document tree in memory while it is built, and so does PDF:
+reportlab's canvas holds every finished page until save(), so PDF memory grows
+with the number of pages (about 10 MB at peak for 300 pages / 2,000 questions).
+
+CSV and XLSX cells that a spreadsheet would read as a formula (starting with
+=, +, -, @, tab or CR) are prefixed with an apostrophe; the CSV importer
+removes it again.
+"""
+import csv
+import json
+import os
+import tempfile
+
+from django.conf import settings
+
+from .models import Question
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+    'json': ('application/json; charset=utf-8', 'json'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx'),
+    'pdf': ('application/pdf', 'pdf'),
+}
+STREAMED_FORMATS = {'csv', 'jsonl', 'json'}
+
+# Leading characters that make Excel / LibreOffice evaluate a cell
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+MAX_OPTION_COLUMNS = 6
+CHUNK_SIZE = 500
+HEADER = (
+    ['STT', 'Câu hỏi']
+    + [chr(ord('A') + i) for i in range(MAX_OPTION_COLUMNS)]
+    + ['Đáp án', 'Giải thích', 'Độ khó', 'Bloom']
+)
+
+# Fonts with Vietnamese glyphs for PDF output (first one found is used)
+PDF_FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+]
+
+
+def question_rows(subject):
+    """Export rows of a Subject's questions, in display order"""
+    rows = Question.objects.filter(subject=subject).order_by('order', 'created_at').values(
+        'order', 'stem', 'options', 'correct_answer', 'explanation', 'difficulty', 'reasoning'
+    )
+    for number, row in enumerate(rows.iterator(chunk_size=CHUNK_SIZE), start=1):
+        reasoning = row['reasoning'] if isinstance(row['reasoning'], dict) else {}
+        yield {
+            'number': number,
+            'stem': row['stem'],
+            'options': [
+                {'id': str(opt.get('id', '')), 'text': str(opt.get('text', ''))}
+                for opt in row['options'] or [] if isinstance(opt, dict)
+            ],
+            'correct_answer': row['correct_answer'],
+            'explanation': row['explanation'],
+            'difficulty': row['difficulty'],
+            'bloom_level': reasoning.get('bloom_level', ''),
+        }
+
+
+def escape_formula(value):
+    """'=1+1 for =1+1: text a spreadsheet shows as is instead of evaluating"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def flat_row(row: dict) -> list:
+    """CSV / XLSX row, with formula-like cells escaped"""
+    option_texts = [opt['text'] for opt in row['options'][:MAX_OPTION_COLUMNS]]
+    option_texts += [''] * (MAX_OPTION_COLUMNS - len(option_texts))
+    return [escape_formula(value) for value in (
+        [row['number'], row['stem']] + option_texts
+        + [row['correct_answer'], row['explanation'], row['difficulty'], row['bloom_level']]
+    )]
+
+
+# ============== STREAMED TEXT FORMATS ==============
+
+class _Echo:
+    """File-like object whose write() returns the value (for csv.writer)"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(subject):
+    writer = csv.writer(_Echo())
+    yield '\ufeff'  # BOM so Excel reads the UTF-8 text correctly
+    yield writer.writerow(HEADER)
+    for row in question_rows(subject):
+        yield writer.writerow(flat_row(row))
+
+
+def stream_jsonl(subject):
+    for row in question_rows(subject):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_json(subject):
+    yield '{"subject": %s, "subject_id": "%s", "questions": [' % (
+        json.dumps(subject.subject or subject.title, ensure_ascii=False), subject.id
+    )
+    for i, row in enumerate(question_rows(subject)):
+        yield (',' if i else '') + '\n' + json.dumps(row, ensure_ascii=False)
+    yield '\n]}\n'
+
+
+def stream_text(subject, fmt: str):
+    return {'csv': stream_csv, 'jsonl': stream_jsonl, 'json': stream_json}[fmt](subject)
+
+
+# ============== FILE FORMATS ==============
+
+def write_export_file(subject, fmt: str):
+    """
+    Write an XLSX / DOCX / PDF export to an anonymous temporary file and
+    return it rewound. The file is removed when closed (FileResponse closes
+    it once sent).
+
+    Raises:
+        ImportError: the library for the format is not installed
+    """
+    writer = {'xlsx': write_xlsx, 'docx': write_docx, 'pdf': write_pdf}[fmt]
+    output = tempfile.TemporaryFile()
+    try:
+        writer(subject, output)
+    except BaseException:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def write_xlsx(subject, output):
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows to disk instead of keeping every cell
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title='Questions')
+    sheet.append(HEADER)
+    for row in question_rows(subject):
+        sheet.append(flat_row(row))
+    workbook.save(output)
+
+
+def write_docx(subject, output):
+    import docx
+
+    document = docx.Document()
+    document.add_heading(subject.subject or subject.title or 'Câu hỏi', level=1)
+    for row in question_rows(subject):
+        document.add_paragraph().add_run(f"Câu {row['number']}. {row['stem']}").bold = True
+        for opt in row['options']:
+            document.add_paragraph(f"{opt['id']}. {opt['text']}")
+        document.add_paragraph(f"Đáp án: {row['correct_answer']}")
+        if row['explanation']:
+            document.add_paragraph(f"Giải thích: {row['explanation']}")
+    document.save(output)
+
+
+def pdf_font() -> str:
+    """Register and return a font that can render Vietnamese (Helvetica if none found)"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    candidates = [getattr(settings, 'EXPORT_PDF_FONT', '')] + PDF_FONT_CANDIDATES
+    for font_path in candidates:
+        if font_path and os.path.exists(font_path):
+            if 'ExportFont' not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont('ExportFont', font_path))
+            return 'ExportFont'
+    return 'Helvetica'
+
+
+def write_pdf(subject, output):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas
+
+    font, size, leading, margin = pdf_font(), 11, 15, 50
+    width, height = A4
+    pdf = canvas.Canvas(output, pagesize=A4)
+    y = height - margin
+
+    def line(text: str, indent: float = 0):
+        nonlocal y
+        for part in simpleSplit(text, font, size, width - 2 * margin - indent) or ['']:
+            if y < margin:
+                pdf.showPage()  # Kept in memory until pdf.save()
+                y = height - margin
+            pdf.setFont(font, size)
+            pdf.drawString(margin + indent, y, part)
+            y -= leading
+
+    line(subject.subject or subject.title or 'Câu hỏi')
+    y -= leading
+    for row in question_rows(subject):
+        line(f"Câu {row['number']}. {row['stem']}")
+        for opt in row['options']:
+            line(f"{opt['id']}. {opt['text']}", indent=15)
+        line(f"Đáp án: {row['correct_answer']}", indent=15)
+        y -= leading / 2
+    pdf.save()
@@ -0,0 +1,501 @@
+"""
+Bulk import of existing question banks.
+
+Supported formats: Moodle XML, GIFT, IMS QTI (1.2 and 2.x, as an XML file
+or a zip package) and CSV (the columns written by export.py). Parsers read
+the file incrementally (XML via iterparse, text formats line by line) and
+yield one raw item at a time. Items are validated and written with
+bulk_create in batches, with `order` values precomputed from a single
+Max('order') query, all inside one transaction. Memory use is bounded by
+the batch size, not by the size of the file.
+
+bulk_create does not send post_save, so the full-text index is fed
+directly and the Subject's near-duplicate index is rebuilt on next use.
+"""
+import csv
+import html
+import io
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import Iterator, Optional, TypedDict
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from . import dedup, search
+from .export import FORMULA_PREFIXES
+from .models import Question, Subject
+
+IMPORT_FORMATS = ('moodle', 'gift', 'qti', 'csv')
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+DIFFICULTIES = {'easy', 'medium', 'hard'}
+OPTION_IDS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class RawItem(TypedDict, total=False):
+    """One question as read from the file, before validation"""
+    line: int                 # Line / item number in the source, for error reports
+    error: str                # Set when the item cannot be imported at all
+    question_type: str
+    stem: str
+    options: list[str]
+    correct: Optional[int]    # Index into options
+    explanation: str
+    difficulty: str
+    bloom_level: str
+
+
+class ImportResult(TypedDict):
+    subject_id: Optional[str]   # None when a new subject was not kept (nothing imported)
+    imported: int
+    skipped: int
+    errors: list[dict]        # First MAX_REPORTED_ERRORS {'line', 'error'}
+
+
+def clean_text(value: str) -> str:
+    """Plain text from an HTML / entity-encoded fragment"""
+    return ' '.join(html.unescape(strip_tags(value or '')).split())
+
+
+def _local(tag: str) -> str:
+    """Tag name without its XML namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def detect_format(filename: str, stream) -> str:
+    """Import format from the file name, sniffing XML files for Moodle vs QTI"""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext in ('gift', 'txt'):
+        return 'gift'
+    if ext in ('csv', 'zip'):
+        return {'csv': 'csv', 'zip': 'qti'}[ext]
+    if ext == 'xml':
+        head = stream.read(4096)
+        stream.seek(0)
+        if isinstance(head, bytes):
+            head = head.decode('utf-8', errors='ignore')
+        return 'qti' if re.search(r'<(\w+:)?(questestinterop|assessmentItem|assessmentTest)\b', head) else 'moodle'
+    raise ValueError(f'Không nhận dạng được định dạng file: {filename}')
+
+
+def iter_elements(stream, names: set) -> Iterator:
+    """
+    Yield each completed element whose local tag name is in `names`, then
+    detach it from its parent, so memory does not grow with the file
+    """
+    parents = []
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if _local(elem.tag) in names:
+            yield elem
+            if parents:
+                parents[-1].remove(elem)
+
+
+# ============== MOODLE XML ==============
+
+def parse_moodle(stream) -> Iterator[RawItem]:
+    number = 0
+    for elem in iter_elements(stream, {'question'}):
+        qtype = elem.get('type', '')
+        if qtype not in ('category', 'description'):
+            number += 1
+            yield _moodle_item(elem, qtype, number)
+
+
+def _moodle_item(elem, qtype: str, number: int) -> RawItem:
+    if qtype not in ('multichoice', 'truefalse'):
+        return {'line': number, 'error': f'Loại câu hỏi không hỗ trợ: {qtype}'}
+    options, fractions = [], []
+    for answer in elem.findall('answer'):
+        options.append(clean_text(answer.findtext('text', '')))
+        try:
+            fractions.append(float(answer.get('fraction', '0')))
+        except ValueError:
+            fractions.append(0.0)
+    best = max(fractions, default=0.0)
+    return {
+        'line': number,
+        'question_type': 'true_false' if qtype == 'truefalse' else 'mcq',
+        'stem': clean_text(elem.findtext('questiontext/text', '')),
+        'options': options,
+        'correct': fractions.index(best) if best > 0 else None,
+        'explanation': clean_text(elem.findtext('generalfeedback/text', '')),
+    }
+
+
+# ============== GIFT ==============
+
+# Escaped GIFT control characters are swapped for private-use placeholders
+# while parsing, then restored
+_GIFT_ESCAPES = {f'\\{c}': chr(0xE000 + i) for i, c in enumerate('~=#{}:\\')}
+_GIFT_UNESCAPE = {v: k[1] for k, v in _GIFT_ESCAPES.items()}
+_GIFT_TITLE = re.compile(r'^\s*::.*?::')
+_GIFT_FORMAT = re.compile(r'^\s*\[(html|moodle|plain|markdown)\]')
+_GIFT_WEIGHT = re.compile(r'^%-?[\d.]+%')
+
+
+def _gift_unescape(text: str) -> str:
+    for placeholder, char in _GIFT_UNESCAPE.items():
+        text = text.replace(placeholder, char)
+    return text
+
+
+def _gift_blocks(stream) -> Iterator[tuple[int, str]]:
+    """Questions are separated by blank lines; comments and categories are skipped"""
+    lines, start = [], 0
+    for number, line in enumerate(stream, start=1):
+        stripped = line.strip()
+        if stripped.startswith('//') or stripped.startswith('$CATEGORY'):
+            continue
+        if stripped:
+            if not lines:
+                start = number
+            lines.append(line.rstrip('\n'))
+        elif lines:
+            yield start, '\n'.join(lines)
+            lines = []
+    if lines:
+        yield start, '\n'.join(lines)
+
+
+def parse_gift(stream) -> Iterator[RawItem]:
+    for line, block in _gift_blocks(stream):
+        for escaped, placeholder in _GIFT_ESCAPES.items():
+            block = block.replace(escaped, placeholder)
+        yield _gift_item(line, block)
+
+
+def _gift_item(line: int, block: str) -> RawItem:
+    opening, closing = block.find('{'), block.rfind('}')
+    if opening < 0 or closing < opening:
+        return {'line': line, 'error': 'Câu hỏi GIFT thiếu phần đáp án {...}'}
+    before = _GIFT_FORMAT.sub('', _GIFT_TITLE.sub('', block[:opening]))
+    after = block[closing + 1:].strip()
+    stem = clean_text(_gift_unescape(before + (' _____ ' + after if after else '')))
+    body = block[opening + 1:closing].strip()
+
+    explanation = ''
+    if '####' in body:
+        body, explanation = body.split('####', 1)
+        body, explanation = body.strip(), clean_text(_gift_unescape(explanation))
+
+    if body.upper() in ('T', 'TRUE', 'F', 'FALSE'):
+        return {
+            'line': line, 'question_type': 'true_false', 'stem': stem,
+            'options': ['Đúng', 'Sai'], 'correct': 0 if body.upper().startswith('T') else 1,
+            'explanation': explanation,
+        }
+    if body.startswith('#') or '->' in body:
+        return {'line': line, 'error': 'Loại câu hỏi không hỗ trợ: numerical/matching'}
+    answers = re.findall(r'([=~])([^=~]*)', body)
+    if not any(marker == '~' for marker, _ in answers):
+        return {'line': line, 'error': 'Loại câu hỏi không hỗ trợ: short answer'}
+
+    options, correct = [], None
+    for marker, text in answers:
+        text = _GIFT_WEIGHT.sub('', text.strip()).split('#', 1)[0]
+        if marker == '=' and correct is None:
+            correct = len(options)
+        options.append(clean_text(_gift_unescape(text)))
+    return {
+        'line': line, 'question_type': 'mcq', 'stem': stem,
+        'options': options, 'correct': correct, 'explanation': explanation,
+    }
+
+
+# ============== IMS QTI ==============
+
+def parse_qti(stream) -> Iterator[RawItem]:
+    """A QTI XML file, or a content package (zip) of item files"""
+    if zipfile.is_zipfile(stream):
+        stream.seek(0)
+        number = 0
+        with zipfile.ZipFile(stream) as package:
+            for name in package.namelist():
+                if not name.lower().endswith('.xml') or name.lower().endswith('imsmanifest.xml'):
+                    continue
+                with package.open(name) as member:
+                    for item in _parse_qti_xml(member, number):
+                        number = item['line']
+                        yield item
+        return
+    stream.seek(0)
+    yield from _parse_qti_xml(stream, 0)
+
+
+def _parse_qti_xml(stream, number: int) -> Iterator[RawItem]:
+    for elem in iter_elements(stream, {'item', 'assessmentItem'}):
+        number += 1
+        yield _qti1_item(elem, number) if _local(elem.tag) == 'item' else _qti2_item(elem, number)
+
+
+def _find_all(elem, name: str) -> list:
+    return [e for e in elem.iter() if _local(e.tag) == name]
+
+
+def _text_of(elem, skip=()) -> str:
+    """All text under elem, leaving out subtrees whose tag is in skip"""
+    parts = [elem.text or '']
+    for child in elem:
+        if _local(child.tag) not in skip:
+            parts.append(_text_of(child, skip))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def _qti1_item(elem, number: int) -> RawItem:
+    """QTI 1.2 <item>: response_lid / render_choice, scored in resprocessing"""
+    presentation = next(iter(_find_all(elem, 'presentation')), None)
+    response = next(iter(_find_all(elem, 'response_lid')), None) if presentation is not None else None
+    if response is None:
+        return {'line': number, 'error': 'Loại câu hỏi không hỗ trợ: QTI item không có lựa chọn'}
+    option_texts = set(_find_all(response, 'mattext'))
+    stem = ' '.join(
+        clean_text(m.text) for m in _find_all(presentation, 'mattext') if m not in option_texts
+    )
+    labels = _find_all(response, 'response_label')
+    idents = [label.get('ident') for label in labels]
+    options = [clean_text(' '.join(m.text or '' for m in _find_all(label, 'mattext'))) for label in labels]
+
+    correct = None
+    for condition in _find_all(elem, 'respcondition'):
+        scores = [s for s in _find_all(condition, 'setvar') if _is_positive(s.text)]
+        values = [v.text.strip() for v in _find_all(condition, 'varequal') if v.text]
+        if scores and values and values[0] in idents:
+            correct = idents.index(values[0])
+            break
+    feedback = ' '.join(
+        clean_text(m.text) for fb in _find_all(elem, 'itemfeedback') for m in _find_all(fb, 'mattext')
+    )
+    return {
+        'line': number, 'question_type': 'mcq', 'stem': stem,
+        'options': options, 'correct': correct, 'explanation': feedback,
+    }
+
+
+def _is_positive(value) -> bool:
+    try:
+        return float(value) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def _qti2_item(elem, number: int) -> RawItem:
+    """QTI 2.x <assessmentItem>: choiceInteraction with a correctResponse"""
+    interaction = next(iter(_find_all(elem, 'choiceInteraction')), None)
+    body = next(iter(_find_all(elem, 'itemBody')), None)
+    if interaction is None or body is None:
+        return {'line': number, 'error': 'Loại câu hỏi không hỗ trợ: QTI item không có choiceInteraction'}
+    prompt = next(iter(_find_all(interaction, 'prompt')), None)
+    stem = clean_text(_text_of(body, skip={'choiceInteraction'}))
+    if prompt is not None:
+        stem = ' '.join(filter(None, [stem, clean_text(_text_of(prompt))]))
+
+    choices = _find_all(interaction, 'simpleChoice')
+    idents = [choice.get('identifier') for choice in choices]
+    options = [clean_text(_text_of(choice, skip={'feedbackInline'})) for choice in choices]
+
+    correct = None
+    response_id = interaction.get('responseIdentifier')
+    for declaration in _find_all(elem, 'responseDeclaration'):
+        if declaration.get('identifier') != response_id:
+            continue
+        values = [v.text.strip() for v in _find_all(declaration, 'value') if v.text]
+        if values and values[0] in idents:
+            correct = idents.index(values[0])
+    feedback = ' '.join(clean_text(_text_of(fb)) for fb in _find_all(elem, 'modalFeedback'))
+    return {
+        'line': number, 'question_type': 'mcq', 'stem': stem,
+        'options': options, 'correct': correct, 'explanation': feedback,
+    }
+
+
+# ============== CSV ==============
+
+CSV_COLUMNS = {
+    'stem': {'stem', 'question', 'content', 'câu hỏi'},
+    'correct': {'correct_answer', 'answer', 'đáp án'},
+    'explanation': {'explanation', 'giải thích'},
+    'difficulty': {'difficulty', 'độ khó'},
+    'bloom_level': {'bloom', 'bloom_level'},
+}
+
+
+def unescape_formula(value: str) -> str:
+    """Undo export.escape_formula: '=1+1 -> =1+1"""
+    if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def parse_csv(stream) -> Iterator[RawItem]:
+    """Header row required; option columns are A..Z or option_a..option_z"""
+    reader = csv.reader(stream)
+    header = [h.strip().lower() for h in next(reader, [])]
+    columns = {}
+    option_columns = []
+    for i, name in enumerate(header):
+        letter = name[len('option_'):] if name.startswith('option_') else name
+        if len(letter) == 1 and letter.upper() in OPTION_IDS:
+            option_columns.append((letter.upper(), i))
+        for key, names in CSV_COLUMNS.items():
+            if name in names:
+                columns[key] = i
+    option_columns.sort()
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        def cell(key: str) -> str:
+            i = columns.get(key)
+            return unescape_formula(row[i].strip()) if i is not None and i < len(row) else ''
+
+        letters, options = [], []
+        for letter, i in option_columns:
+            if i < len(row) and row[i].strip():
+                letters.append(letter)
+                options.append(unescape_formula(row[i].strip()))
+        answer = cell('correct')
+        if answer.upper() in letters:
+            correct = letters.index(answer.upper())
+        else:
+            correct = options.index(answer) if answer in options else None
+        yield {
+            'line': reader.line_num, 'question_type': 'mcq', 'stem': cell('stem'),
+            'options': options, 'correct': correct, 'explanation': cell('explanation'),
+            'difficulty': cell('difficulty').lower(), 'bloom_level': cell('bloom_level').lower(),
+        }
+
+
+# ============== IMPORT ==============
+
+def parse(stream, fmt: str) -> Iterator[RawItem]:
+    """Raw items from a binary file-like object"""
+    if fmt in ('gift', 'csv'):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+        return {'gift': parse_gift, 'csv': parse_csv}[fmt](text)
+    return {'moodle': parse_moodle, 'qti': parse_qti}[fmt](stream)
+
+
+def validate(item: RawItem) -> Optional[str]:
+    """Reason the item cannot be imported, or None"""
+    if item.get('error'):
+        return item['error']
+    if not item.get('stem'):
+        return 'Thiếu nội dung câu hỏi'
+    if len(item.get('options') or []) < 2:
+        return 'Cần ít nhất 2 đáp án'
+    if len(item['options']) > len(OPTION_IDS):
+        return f'Tối đa {len(OPTION_IDS)} đáp án'
+    if any(not text for text in item['options']):
+        return 'Đáp án không được để trống'
+    if item.get('correct') is None:
+        return 'Không xác định được đáp án đúng'
+    return None
+
+
+def resolve_subject(user, subject_id=None, subject_name: str = '', filename: str = '') -> Subject:
+    """
+    Subject to import into: an existing one by id, one matched by name (like
+    api_create_question), or a new Subject named after the file. A new Subject
+    is returned unsaved: import_questions saves it in its transaction, and
+    only when at least one question was imported.
+
+    Raises:
+        Subject.DoesNotExist: subject_id does not belong to the user
+    """
+    if subject_id:
+        return Subject.objects.get(id=subject_id, user=user)
+    name = subject_name or filename.rsplit('.', 1)[0] or 'Import'
+    subject = Subject.objects.filter(user=user, subject=name).first() if subject_name else None
+    if subject is None:
+        subject = Subject(
+            user=user,
+            title=f'Gen MCQ - {name}',
+            source_type='text',
+            subject=name,
+            status='completed',
+            source_text=f'Imported from {filename}' if filename else 'Imported questions',
+        )
+    return subject
+
+
+def import_questions(subject: Subject, stream, fmt: str, difficulty: str = 'medium',
+                     bloom_level: str = 'understand', batch_size: int = BATCH_SIZE) -> ImportResult:
+    """
+    Parse `stream` (binary file-like) and bulk-insert its valid questions
+    into `subject`, after the existing ones. All-or-nothing: a database error
+    rolls back the whole import; invalid items are skipped and reported.
+    An unsaved `subject` (from resolve_subject) is created in the same
+    transaction and rolled back with it, or when nothing was imported;
+    subject_id is then None.
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f'Định dạng không hỗ trợ: {fmt}')
+    imported, skipped, errors = 0, 0, []
+
+    created = subject._state.adding
+
+    with transaction.atomic():
+        if created:
+            subject.save()
+        next_order = (subject.questions.aggregate(max_order=Max('order'))['max_order'] or 0) + 1
+        batch = []
+
+        def flush():
+            Question.objects.bulk_create(batch)
+            search.index_questions(batch)
+            batch.clear()
+
+        for item in parse(stream, fmt):
+            reason = validate(item)
+            if reason:
+                skipped += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': item.get('line'), 'error': reason})
+                continue
+            item_difficulty = item.get('difficulty') if item.get('difficulty') in DIFFICULTIES else difficulty
+            batch.append(Question(
+                subject=subject,
+                question_type=item.get('question_type', 'mcq'),
+                stem=item['stem'],
+                difficulty=item_difficulty,
+                options=[
+                    {'id': OPTION_IDS[i], 'text': text, 'is_correct': i == item['correct']}
+                    for i, text in enumerate(item['options'])
+                ],
+                correct_answer=OPTION_IDS[item['correct']],
+                explanation=item.get('explanation', ''),
+                reasoning={
+                    'bloom_level': item.get('bloom_level') or bloom_level,
+                    'difficulty': item_difficulty,
+                    'imported_from': fmt
+                },
+                user_edited=True,
+                order=next_order + imported
+            ))
+            imported += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        if imported and not created:
+            subject.updated_at = timezone.now()
+            subject.save(update_fields=['updated_at'])
+        elif not imported and created:
+            # Every item was invalid: leave no empty "Gen MCQ - <file>" subject behind
+            transaction.set_rollback(True)
+
+    # bulk_create skipped the post_save receivers that keep it in sync
+    dedup.forget_subject(subject.id)
+    subject_id = str(subject.id) if imported or not created else None
+    return {'subject_id': subject_id, 'imported': imported, 'skipped': skipped, 'errors': errors}
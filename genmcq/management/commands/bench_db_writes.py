@@ -0,0 +1,134 @@
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import override_settings
+
+from genmcq.models import Context, Question, Subject, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark SQLite write throughput under concurrent generation jobs for "
+        "each settings.SQLITE_PROFILES profile. Runs against throwaway database "
+        "files, never the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', dest='profiles',
+                            help='Profile(s) to benchmark (default: all)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent writers')
+        parser.add_argument('--jobs', type=int, default=10, help='Generation jobs per writer')
+        parser.add_argument('--questions', type=int, default=10, help='Contexts/questions per job')
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Concurrent readers loading question lists (web workers)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("bench_db_writes only applies to SQLite")
+        profiles = options['profiles'] or list(settings.SQLITE_PROFILES)
+        unknown = [p for p in profiles if p not in settings.SQLITE_PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(unknown)}")
+
+        db = connections['default']
+        original = {key: db.settings_dict[key] for key in ('NAME', 'CONN_MAX_AGE', 'OPTIONS')}
+        workdir = Path(tempfile.mkdtemp(prefix='bench_db_writes_'))
+        try:
+            for profile in profiles:
+                self.run_profile(profile, workdir / f'{profile}.sqlite3', options)
+        finally:
+            db.close()
+            db.settings_dict.update(original)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_profile(self, profile: str, path: Path, options: dict):
+        conf = settings.SQLITE_PROFILES[profile]
+        db = connections['default']
+        db.close()
+        # Worker threads build their connections from this same settings dict
+        db.settings_dict.update(NAME=str(path), CONN_MAX_AGE=conf['CONN_MAX_AGE'], OPTIONS=dict(conf['OPTIONS']))
+
+        with override_settings(SQLITE_PRAGMAS=conf['PRAGMAS']):
+            call_command('migrate', verbosity=0)
+            user = User.objects.create_user(username=f'bench-{profile}', password='bench', credits=10 ** 9)
+            db.close()
+
+            workers, jobs, per_job = options['workers'], options['jobs'], options['questions']
+            done, errors, reads = [], [], []
+            writing = threading.Event()
+            writing.set()
+            start = threading.Barrier(workers + options['readers'] + 1)
+
+            def writer(n: int):
+                try:
+                    start.wait()
+                    for job in range(jobs):
+                        try:
+                            self.generation_job(user, f'{n}-{job}', per_job)
+                            done.append(1)
+                        except OperationalError as e:  # "database is locked"
+                            errors.append(str(e))
+                finally:
+                    connections.close_all()
+
+            def reader():
+                try:
+                    start.wait()
+                    while writing.is_set():
+                        try:
+                            list(Question.objects.filter(subject__user=user)
+                                 .order_by('-created_at', '-id').values('id', 'stem')[:50])
+                            reads.append(1)
+                        except OperationalError as e:
+                            errors.append(str(e))
+                finally:
+                    connections.close_all()
+
+            threads = [threading.Thread(target=writer, args=(n,)) for n in range(workers)]
+            readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+            for t in threads + readers:
+                t.start()
+            start.wait()
+            began = time.perf_counter()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - began
+            writing.clear()
+            for t in readers:
+                t.join()
+
+        rows = len(done) * (2 * per_job + 1)
+        self.stdout.write(
+            f"{profile:<12} {workers} writers x {jobs} jobs: "
+            f"{len(done)} ok, {len(errors)} locked, {elapsed:.2f}s, "
+            f"{len(done) / elapsed:.1f} jobs/s, {rows / elapsed:.0f} rows/s, "
+            f"{len(reads) / elapsed:.0f} list reads/s"
+        )
+        if errors:
+            self.stdout.write(f"{'':<12} first error: {errors[0]}")
+
+    @staticmethod
+    def generation_job(user: User, label: str, per_job: int):
+        """The writes one api_generate_mcq request makes once the model has answered"""
+        with transaction.atomic():
+            # Reads before writing, like the view (number_questions, dedup lookups)
+            Subject.objects.filter(user=user).count()
+            subject = Subject.objects.create(user=user, title=f'Bench {label}', status='completed')
+            for i in range(per_job):
+                context = Context.objects.create(subject=subject, content=f'Context {label}/{i}', order=i)
+                Question.objects.create(
+                    subject=subject,
+                    context=context,
+                    stem=f'Question {label}/{i}: which option is correct?',
+                    options=[{'id': c, 'text': f'Option {c} for {label}/{i}'} for c in 'ABCD'],
+                    correct_answer='A',
+                    order=i
+                )
+        user.use_credits(1)
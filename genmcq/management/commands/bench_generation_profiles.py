@@ -0,0 +1,98 @@
+import io
+import statistics
+from contextlib import redirect_stdout
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from genmcq.views import generation_config_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare settings.LLM_GENERATION_PROFILES profiles on the offline fake "
+        "client (graph/fake.py): summed simulated call latency, LLM calls, thinking / "
+        "output tokens and review approval rates per run. No API calls are "
+        "made; the numbers follow the fake's cost model, not a real provider."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', dest='profiles',
+                            help='Profile(s) to benchmark (default: all)')
+        parser.add_argument('--runs', type=int, default=5, help='Generation runs per profile')
+        parser.add_argument('--contexts', type=int, default=5, help='Contexts per run')
+        parser.add_argument('--questions-per-context', type=int, default=1)
+        parser.add_argument('--contexts-per-call', type=int, default=1,
+                            help='Contexts packed into one MCQ generation call')
+        parser.add_argument('--workers', type=int, default=3, help='Concurrent LLM calls')
+        parser.add_argument('--max-iterations', type=int, default=2)
+        parser.add_argument('--fused-review', action='store_true')
+        parser.add_argument('--time-scale', type=float, default=0.01,
+                            help='Fraction of the simulated latency actually slept (does not '
+                                 'change the reported times)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or list(settings.LLM_GENERATION_PROFILES)
+        unknown = [p for p in profiles if p not in settings.LLM_GENERATION_PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(unknown)}")
+
+        import graph.g as g
+        from graph import retry
+        from graph import fake
+
+        # Scale retry backoff like the simulated latency; keep the real client aside
+        policy = retry.DEFAULT_RETRY_POLICY
+        original = (g.client, policy.base_delay, policy.max_delay)
+        policy.base_delay *= options['time_scale']
+        policy.max_delay *= options['time_scale']
+        try:
+            # Untimed pass: graph compilation and lazy imports are not a profile's cost
+            g.client = fake.FakeClient(contexts=options['contexts'], seed=options['seed'], time_scale=0)
+            self.generate(g, profiles[0], options)
+            for profile in profiles:
+                self.run_profile(g, fake, profile, options)
+        finally:
+            g.client, policy.base_delay, policy.max_delay = original
+            retry.CircuitBreaker.reset_all()
+            retry.ModelRateLimit.reset_all()
+
+    def generate(self, g, profile: str, options: dict) -> dict:
+        with redirect_stdout(io.StringIO()):
+            return g.run_mcq_generation(
+                text='Văn bản mẫu cho benchmark.', subject='Benchmark', topic='Profiles',
+                bloom_level='understand', number_contexts=options['contexts'],
+                max_iterations=options['max_iterations'], max_workers=options['workers'],
+                delay_seconds=0, fused_review=options['fused_review'], diversity_threshold=0,
+                questions_per_context=options['questions_per_context'],
+                contexts_per_call=options['contexts_per_call'],
+                generation_config=generation_config_for(profile)
+            )
+
+    def run_profile(self, g, fake, profile: str, options: dict):
+        client = fake.FakeClient(contexts=options['contexts'], seed=options['seed'],
+                                 time_scale=options['time_scale'])
+        g.client = client
+        # Simulated latency of each run summed over its calls: not wall-clock
+        # time (calls overlap with --workers > 1), independent of --time-scale
+        latencies, calls, approved, total = [], 0, 0, 0
+        for _ in range(options['runs']):
+            before = client.stats['latency_seconds']
+            result = self.generate(g, profile, options)
+            latencies.append(client.stats['latency_seconds'] - before)
+            calls += result['budget']['llm_calls']
+            total += len(result['mcqs'])
+            # Approved by a review, not force-approved at max_iterations
+            approved += sum(1 for mcq in result['mcqs'] if mcq.review == fake.APPROVED)
+
+        runs, stats = options['runs'], client.stats
+        review_rate = stats['approvals'] / stats['reviews'] if stats['reviews'] else 0.0
+        self.stdout.write(
+            f"{profile:<16} summed simulated latency {statistics.mean(latencies):6.1f}s/run "
+            f"(max {max(latencies):.1f}s)  {calls / runs:5.1f} calls/run  "
+            f"thinking {stats['thinking_tokens'] // runs:>6} tok/run  "
+            f"output {stats['output_tokens'] // runs:>6} tok/run  "
+            f"review approval {review_rate:5.1%}  "
+            f"MCQs approved {approved}/{total}  truncated {stats['truncated']}"
+        )
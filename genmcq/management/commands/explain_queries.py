@@ -0,0 +1,105 @@
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from genmcq.models import Context, Question, SourceFile, Subject
+
+# Plan lines that mean a full table scan or a sort the indexes do not cover
+BAD_PLAN_PATTERNS = {
+    'sqlite': [
+        re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)'),
+        re.compile(r'\bUSE TEMP B-TREE\b'),
+    ],
+    'postgresql': [
+        re.compile(r'\bSeq Scan\b'),
+        re.compile(r'(?<!Incremental )\bSort\b'),
+    ],
+}
+
+
+def hot_queries() -> dict:
+    """The main view queries, with placeholder ids (plans do not depend on them)"""
+    user_id = uuid.uuid4()
+    subject_id = uuid.uuid4()
+    context_id = uuid.uuid4()
+    now = timezone.now()
+    return {
+        'dashboard / history: subjects by updated_at': (
+            Subject.objects.filter(user_id=user_id).order_by('-updated_at')[:10]
+        ),
+        'subject list: subjects by created_at': (
+            Subject.objects.filter(user_id=user_id, subject__isnull=False)
+            .exclude(subject='').order_by('-created_at')
+        ),
+        'question count of a subject': (
+            Question.objects.filter(subject_id=subject_id).order_by().values('id')
+        ),
+        'questions of a subject, newest first': (
+            Question.objects.filter(subject_id=subject_id, subject__user_id=user_id)
+            .order_by('-created_at', '-id')[:51]
+        ),
+        'questions page after a cursor': (
+            Question.objects.filter(subject_id=subject_id)
+            .filter(Q(created_at__lt=now) | Q(created_at=now, id__lt=uuid.uuid4()))
+            .order_by('-created_at', '-id')[:51]
+        ),
+        'next question order in a subject': (
+            Question.objects.filter(subject_id=subject_id).order_by()
+            .values('subject_id').annotate(max_order=Max('order'))
+        ),
+        'contexts of a subject': (
+            Context.objects.filter(subject_id=subject_id).order_by('order')
+        ),
+        'questions of a context': (
+            Question.objects.filter(context_id=context_id, user_edited=False).order_by('order')
+        ),
+        'source files of a user': (
+            SourceFile.objects.filter(user_id=user_id).order_by('-uploaded_at')[:20]
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the main view queries and fail if any of them falls back to "
+        "a full table scan or a temporary sort."
+    )
+
+    def handle(self, *args, **options):
+        patterns = BAD_PLAN_PATTERNS.get(connection.vendor)
+        if patterns is None:
+            raise CommandError(f"No plan checks for database backend '{connection.vendor}'")
+
+        failures = []
+        for name, queryset in hot_queries().items():
+            plan = self.explain(queryset)
+            bad = [line.strip() for line in plan.splitlines() if any(p.search(line) for p in patterns)]
+            if bad:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL  {name}"))
+                for line in bad:
+                    self.stdout.write(f"        {line}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK    {name}"))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"{len(failures)} query plan(s) need an index: {', '.join(failures)}")
+
+    @staticmethod
+    def explain(queryset) -> str:
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # Small tables are always sequentially scanned; ask what the planner
+        # would do once the table is large
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute("RESET enable_seqscan")
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from genmcq import importers
+from genmcq.models import Subject, User
+from genmcq.views import difficulty_to_bloom
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import questions from a Moodle XML, GIFT, IMS QTI (XML or zip) "
+        "or CSV file into a user's subject."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--user', required=True, help='Username owning the questions')
+        parser.add_argument('--format', choices=importers.IMPORT_FORMATS,
+                            help='File format (default: detected from the file)')
+        parser.add_argument('--subject-id', help='Existing subject to import into')
+        parser.add_argument('--subject', default='', help='Subject name (matched or created)')
+        parser.add_argument('--difficulty', default='medium', choices=sorted(importers.DIFFICULTIES),
+                            help='Difficulty for questions that do not set one')
+        parser.add_argument('--batch-size', type=int, default=importers.BATCH_SIZE,
+                            help='Questions per bulk insert')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{options['user']}'")
+
+        try:
+            stream = open(options['path'], 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+        with stream:
+            try:
+                fmt = options['format'] or importers.detect_format(options['path'], stream)
+                subject = importers.resolve_subject(
+                    user, subject_id=options['subject_id'], subject_name=options['subject'],
+                    filename=options['path'].rsplit('/', 1)[-1]
+                )
+            except (ValueError, Subject.DoesNotExist) as e:
+                raise CommandError(f"Cannot import: {e}")
+
+            began = time.perf_counter()
+            result = importers.import_questions(
+                subject, stream, fmt,
+                difficulty=options['difficulty'],
+                bloom_level=difficulty_to_bloom(options['difficulty']),
+                batch_size=options['batch_size']
+            )
+            elapsed = time.perf_counter() - began
+
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(f"  skipped #{error['line']}: {error['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['imported']} question(s) into subject {result['subject_id'] or '(none created)'} "
+            f"({result['skipped']} skipped) in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from genmcq import search
+from genmcq.models import Question
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-index every question in the SQLite FTS5 search table (after "
+        "migrating an existing database, or bulk changes that bypass signals)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-stale', action='store_true',
+                            help='Only rebuild when the index size differs from the question count')
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError('Full-text index is SQLite-only; other databases need no rebuild')
+        questions = Question.objects.count()
+        if options['if_stale'] and search.index_size() == questions:
+            self.stdout.write(f'Index up to date ({questions} questions)')
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {search.index_size()} questions'))
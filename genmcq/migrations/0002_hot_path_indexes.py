@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genmcq', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='context',
+            index=models.Index(fields=['subject', 'order'], name='contexts_subject_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', '-created_at', '-id'], name='questions_subject_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'order'], name='questions_subject_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['context', 'order'], name='questions_context_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sourcefile',
+            index=models.Index(fields=['user', '-uploaded_at'], name='source_files_user_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['user', '-updated_at'], name='subjects_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['user', '-created_at'], name='subjects_user_created_idx'),
+        ),
+    ]
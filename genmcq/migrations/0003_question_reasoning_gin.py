@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_gin_indexes(apps, schema_editor):
+    # jsonb GIN indexes exist only on PostgreSQL; SQLite has no equivalent
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # has_key / contains lookups on reasoning (e.g. flagged duplicates)
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS questions_reasoning_gin ON questions USING gin (reasoning)"
+    )
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS questions_reasoning_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genmcq', '0002_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends search with a substring filter
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5("
+        # subject_id / user_id are indexed so that scoping a search is a
+        # posting-list intersection rather than a row filter
+        "question_id UNINDEXED, subject_id, user_id, "
+        "stem, options, explanation, topic, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS questions_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genmcq', '0003_question_reasoning_gin'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def drop_gin_indexes(apps, schema_editor):
+    # No query filters on reasoning keys; the index only cost write time
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS questions_reasoning_gin")
+
+
+def create_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS questions_reasoning_gin ON questions USING gin (reasoning)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genmcq', '0004_questions_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_gin_indexes, create_gin_indexes),
+    ]
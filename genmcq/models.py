@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 import uuid
@@ -34,12 +35,25 @@ class User(AbstractUser):
         return self.email or self.username
     
     def use_credits(self, amount: int = 1) -> bool:
-        """Deduct credits if available, return True if successful"""
-        if self.credits >= amount:
-            self.credits -= amount
-            self.save(update_fields=['credits'])
-            return True
-        return False
+        """
+        Deduct credits if available, return True if successful.
+        
+        A single conditional UPDATE (credits >= amount), so concurrent
+        requests cannot double-spend. Used to reserve credits before a
+        generation; give them back with refund_credits() if it fails.
+        """
+        deducted = User.objects.filter(pk=self.pk, credits__gte=amount).update(
+            credits=F('credits') - amount
+        )
+        if deducted:
+            # In-memory value for responses; the database row is authoritative
+            self.credits = max(0, self.credits - amount)
+        return bool(deducted)
+    
+    def refund_credits(self, amount: int = 1):
+        """Return credits reserved by use_credits() for work that did not complete"""
+        User.objects.filter(pk=self.pk).update(credits=F('credits') + amount)
+        self.credits += amount
 
 
 # ============== SOURCE FILE MODEL ==============
@@ -73,6 +87,9 @@ class SourceFile(models.Model):
     class Meta:
         db_table = 'source_files'
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['user', '-uploaded_at'], name='source_files_user_uploaded_idx'),
+        ]
     
     def __str__(self):
         return f"{self.file_name} ({self.user})"
@@ -218,6 +235,12 @@ class Subject(models.Model):
     class Meta:
         db_table = 'subjects'
         ordering = ['-created_at']
+        indexes = [
+            # Dashboard / history: a user's subjects, most recently updated first
+            models.Index(fields=['user', '-updated_at'], name='subjects_user_updated_idx'),
+            # Subject list: a user's subjects, newest first
+            models.Index(fields=['user', '-created_at'], name='subjects_user_created_idx'),
+        ]
         verbose_name = 'Subject'
         verbose_name_plural = 'Subjects'
     
@@ -265,6 +288,9 @@ class Context(models.Model):
     class Meta:
         db_table = 'contexts'
         ordering = ['subject', 'order']
+        indexes = [
+            models.Index(fields=['subject', 'order'], name='contexts_subject_order_idx'),
+        ]
     
     def __str__(self):
         return f"Context {self.order} - {self.subject}"
@@ -359,6 +385,13 @@ class Question(models.Model):
     class Meta:
         db_table = 'questions'
         ordering = ['subject', 'order']
+        indexes = [
+            # Question list: newest first, keyset-paginated on (created_at, id)
+            models.Index(fields=['subject', '-created_at', '-id'], name='questions_subject_created_idx'),
+            models.Index(fields=['subject', 'order'], name='questions_subject_order_idx'),
+            # Regenerating a context replaces its questions in order
+            models.Index(fields=['context', 'order'], name='questions_context_order_idx'),
+        ]
     
     def __str__(self):
         return f"Q{self.order}: {self.stem[:50]}..."
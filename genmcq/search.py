@@ -0,0 +1,207 @@
+"""
+Full-text search over the question bank.
+
+On SQLite an FTS5 table (questions_fts) indexes each question's stem, option
+texts, explanation and its Subject's topic, ranked with BM25. The table is
+created by migration 0004 and kept in sync through Question / Subject
+signals, inside the same transaction as the row change; `python manage.py
+rebuild_search_index` re-indexes existing questions.
+
+Other database backends fall back to a slow path: an unindexed,
+case-insensitive substring filter over the same fields (every term must
+appear in one of them), newest first instead of ranked, and without the
+diacritic folding of the FTS tokenizer.
+"""
+import re
+import uuid
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+FTS_TABLE = 'questions_fts'
+
+# BM25 column weights: question_id, subject_id, user_id (scope only), then
+# stem, options, explanation, topic
+_BM25_WEIGHTS = '0.0, 0.0, 0.0, 10.0, 4.0, 2.0, 1.0'
+_TEXT_COLUMNS = '{stem options explanation topic}'
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_INSERT = (
+    f"INSERT INTO {FTS_TABLE}(rowid, question_id, subject_id, user_id, stem, options, explanation, topic) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def fts_enabled() -> bool:
+    return connection.vendor == 'sqlite'
+
+
+def index_size() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def options_text(options) -> str:
+    return ' '.join(
+        str(opt.get('text', '')) if isinstance(opt, dict) else str(opt)
+        for opt in options or []
+    )
+
+
+def _uuid(value) -> uuid.UUID:
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def rowid(question_id) -> int:
+    """FTS rowid for a question: the top 60 bits of its UUID, so updates and
+    deletes are rowid lookups instead of scans of the unindexed id column"""
+    return _uuid(question_id).int >> 68
+
+
+def _row(question_id, subject_id, user_id, stem, options, explanation, topic) -> tuple:
+    # Ids are stored as 32-char hex, like Django stores UUIDFields on SQLite,
+    # so the table can be joined against `questions` (see matching_question_ids)
+    return (
+        rowid(question_id), _uuid(question_id).hex, _uuid(subject_id).hex, _uuid(user_id).hex,
+        stem or '', options_text(options), explanation or '', topic or ''
+    )
+
+
+def rebuild_index():
+    """Re-index every question (e.g. after bulk changes that bypass signals)"""
+    from .models import Question
+    rows = Question.objects.values_list(
+        'id', 'subject_id', 'subject__user_id', 'stem', 'options', 'explanation', 'subject__topic'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        batch = []
+        for values in rows.iterator(chunk_size=2000):
+            batch.append(_row(*values))
+            if len(batch) >= 2000:
+                cursor.executemany(_INSERT, batch)
+                batch = []
+        if batch:
+            cursor.executemany(_INSERT, batch)
+        # Merge the index segments written by the backfill
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def index_questions(questions):
+    """(Re)index questions saved without signals (bulk_create / bulk_update)"""
+    if not fts_enabled():
+        return
+    rows = [
+        _row(q.id, q.subject_id, q.subject.user_id, q.stem, q.options, q.explanation, q.subject.topic)
+        for q in questions
+    ]
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(_INSERT, rows)
+
+
+def match_query(text: str, user_id=None, subject_id=None) -> str:
+    """
+    FTS5 query for free text: all terms required in the text columns, the
+    last one as a prefix, optionally scoped to a user / Subject
+    """
+    terms = _TOKEN.findall(text or '')
+    if not terms:
+        return ''
+    query = f'{_TEXT_COLUMNS} : (' + ' '.join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*)'
+    if user_id:
+        query = f'user_id : "{_uuid(user_id).hex}" AND {query}'
+    if subject_id:
+        query = f'subject_id : "{_uuid(subject_id).hex}" AND {query}'
+    return query
+
+
+def matching_question_ids(text: str):
+    """
+    SQL fragment + params selecting the ids of questions matching `text`,
+    for QuerySet.extra(where=...); None when FTS is unavailable
+    """
+    query = match_query(text)
+    if not fts_enabled() or not query:
+        return None
+    return (
+        f"questions.id IN (SELECT question_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)",
+        [query]
+    )
+
+
+def search_questions(user, text: str, subject_id=None, limit: int = 20, offset: int = 0):
+    """
+    Rank the user's questions against `text`.
+
+    Returns:
+        (hits, total) where hits is a list of (question_id, score), best
+        match first
+    """
+    from .models import Question
+    if not fts_enabled():
+        terms = _TOKEN.findall(text or '')
+        if not terms:
+            return [], 0
+        questions = Question.objects.filter(subject__user=user)
+        for term in terms:
+            # Slow path: a scan of the user's questions (options as JSON text)
+            questions = questions.filter(
+                Q(stem__icontains=term) | Q(options__icontains=term)
+                | Q(explanation__icontains=term) | Q(subject__topic__icontains=term)
+            )
+        if subject_id:
+            questions = questions.filter(subject_id=subject_id)
+        ids = list(questions.order_by('-created_at').values_list('id', flat=True)[offset:offset + limit])
+        return [(str(qid), 0.0) for qid in ids], questions.count()
+
+    query = match_query(text, user_id=user.id, subject_id=subject_id)
+    if not query:
+        return [], 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT question_id, bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s OFFSET %s",
+            [query, limit, offset]
+        )
+        # bm25() is lower-is-better; expose a higher-is-better score
+        hits = [(str(_uuid(qid)), round(-rank, 6)) for qid, rank in cursor.fetchall()]
+    return hits, total
+
+
+# ============== SIGNAL RECEIVERS ==============
+
+def question_saved(sender, instance, **kwargs):
+    if not fts_enabled():
+        return
+    subject = instance.subject
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid(instance.id)])
+        cursor.execute(
+            _INSERT,
+            _row(instance.id, subject.id, subject.user_id, instance.stem,
+                 instance.options, instance.explanation, subject.topic)
+        )
+
+
+def question_deleted(sender, instance, **kwargs):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid(instance.id)])
+
+
+def subject_saved(sender, instance, created, update_fields=None, **kwargs):
+    # A new Subject has no questions yet; saves that cannot touch the topic
+    # (e.g. update_fields=['updated_at'] after each generation) skip the update
+    if created or not fts_enabled() or (update_fields is not None and 'topic' not in update_fields):
+        return
+    with connection.cursor() as cursor:
+        # MATCH on the indexed subject_id column: a posting-list lookup, not a scan
+        cursor.execute(
+            f"UPDATE {FTS_TABLE} SET topic = %s WHERE {FTS_TABLE} MATCH %s AND topic != %s",
+            [instance.topic or '', f'subject_id : "{_uuid(instance.id).hex}"', instance.topic or '']
+        )
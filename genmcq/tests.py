@@ -1,3 +1,944 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
 
-# Create your tests here.
+from django.db import connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+
+from .models import Question, Subject, User
+
+
+class CreditAccountingTests(TransactionTestCase):
+    """Credits are deducted with a conditional UPDATE: no double-spend under concurrency"""
+
+    def hammer(self, user, threads: int, attempts: int) -> tuple[int, list]:
+        successes = []
+        errors = []
+        start = threading.Barrier(threads)
+
+        def worker():
+            try:
+                start.wait()
+                # A fresh instance per thread, like one request per thread
+                me = User.objects.get(pk=user.pk)
+                for _ in range(attempts):
+                    try:
+                        if me.use_credits(1):
+                            successes.append(1)
+                    except Exception as e:  # e.g. SQLite "database is locked"
+                        errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return len(successes), errors
+
+    def test_concurrent_use_credits_never_overspends(self):
+        user = User.objects.create_user(username='racer', password='pw', credits=50)
+
+        spent, errors = self.hammer(user, threads=16, attempts=10)
+
+        user.refresh_from_db()
+        self.assertGreaterEqual(user.credits, 0)
+        # Every successful deduction is reflected exactly once
+        self.assertEqual(spent, 50 - user.credits)
+        if not errors:
+            # 160 attempts on 50 credits: all credits spent, never more
+            self.assertEqual(spent, 50)
+            self.assertEqual(user.credits, 0)
+
+    def test_refund_returns_reserved_credit(self):
+        user = User.objects.create_user(username='refund', password='pw', credits=1)
+
+        self.assertTrue(user.use_credits(1))
+        self.assertFalse(user.use_credits(1))
+        user.refund_credits(1)
+
+        user.refresh_from_db()
+        self.assertEqual(user.credits, 1)
+
+
+class StartupImportTests(SimpleTestCase):
+    """
+    Booting Django (manage.py, WSGI workers, tests) must not load the LLM /
+    document stacks; they are imported on first use. Measured in a fresh
+    interpreter with -X importtime.
+    """
+    # Cumulative import time of Django setup + URLconf; override on slow machines
+    budget_ms = float(os.getenv('IMPORT_TIME_BUDGET_MS', '1000'))
+    heavy_modules = (
+        'langgraph', 'langchain_core', 'langsmith', 'google.genai',
+        'PyPDF2', 'docx', 'pptx', 'openpyxl', 'reportlab',
+    )
+
+    def import_times(self, code: str) -> dict:
+        """{module: (cumulative microseconds, nesting depth)} for modules imported by `code`"""
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'mcq_gen2025.settings'}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=Path(__file__).resolve().parent.parent, env=env,
+            capture_output=True, text=True, check=True
+        )
+        times = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            times[name.strip()] = (int(cumulative), depth)
+        return times
+
+    def assert_not_loaded(self, times: dict):
+        loaded = [m for m in times if m.split('.')[0] in self.heavy_modules or m in self.heavy_modules]
+        self.assertEqual(loaded, [])
+
+    def test_django_startup_skips_heavy_modules(self):
+        times = self.import_times("import django; django.setup(); import genmcq.urls")
+
+        self.assert_not_loaded(times)
+        total_ms = sum(us for us, depth in times.values() if depth == 0) / 1000
+        self.assertLess(total_ms, self.budget_ms, f"startup imports took {total_ms:.0f}ms")
+
+    def test_graph_module_defers_llm_stack(self):
+        times = self.import_times("import graph.g")
+
+        self.assert_not_loaded(times)
+
+
+class WarmupTests(SimpleTestCase):
+    """Worker warm-up is opt-in"""
+
+    def test_off_by_default(self):
+        from django.conf import settings
+        from unittest import mock
+        from .warmup import warm_up_worker
+
+        self.assertFalse(settings.WARMUP_ON_START)
+        with mock.patch('graph.g.warm_up') as warm_up:
+            warm_up_worker()
+        warm_up.assert_not_called()
+
+    def test_enabled_warms_up_without_blocking_on_the_network(self):
+        from unittest import mock
+        from django.test import override_settings
+        from .warmup import warm_up_worker
+
+        with override_settings(WARMUP_ON_START=True), \
+                mock.patch('graph.g.warm_up', return_value={}) as warm_up, \
+                mock.patch('genmcq.warmup.threading.Thread') as thread:
+            warm_up_worker()
+        warm_up.assert_called_once_with(connect=False)
+        thread.return_value.start.assert_called_once()
+
+
+class ConvergenceTests(SimpleTestCase):
+    """A refinement only counts as 'unchanged' when it really changed nothing"""
+
+    def mcq(self, stem='Thủ đô của Việt Nam là gì?', correct_answer='A'):
+        from graph.gen import MCQ, Question, Options, Reason, option
+        return MCQ(question=Question(
+            stem=stem,
+            options=Options(options=[option(id=c, text=t) for c, t in zip('ABCD', ['Hà Nội', 'Huế', 'Đà Nẵng', 'Sài Gòn'])]),
+            correct_answer=correct_answer,
+            reasoning=Reason(bloom_level_analysis='', tactic_analysis='', answer_justification='',
+                             distractor_justification=[option(id=c, text='') for c in 'BCD'])
+        ))
+
+    def test_whitespace_only_refinement_is_unchanged(self):
+        from graph.convergence import mcq_unchanged, context_unchanged
+
+        self.assertTrue(mcq_unchanged(self.mcq(), self.mcq(stem='  Thủ đô của Việt Nam\n là gì? ')))
+        self.assertTrue(context_unchanged('Một ngữ cảnh.', 'Một  ngữ cảnh.\n'))
+
+    def test_answer_key_change_is_a_change(self):
+        from graph.convergence import mcq_unchanged
+
+        self.assertFalse(mcq_unchanged(self.mcq(correct_answer='B'), self.mcq(correct_answer='A')))
+
+    def test_one_word_stem_change_is_a_change(self):
+        from graph.convergence import mcq_unchanged, context_unchanged
+
+        self.assertFalse(mcq_unchanged(self.mcq(), self.mcq(stem='Thủ đô của Lào là gì?')))
+        self.assertFalse(context_unchanged('Nước sôi ở 100 độ C.', 'Nước sôi ở 90 độ C.'))
+
+
+class ImportTests(TestCase):
+    """Bulk import: stored like generated questions; a failed or empty import leaves no subject behind"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='pw')
+        self.client.force_login(self.user)
+
+    def post(self, name: str, body: bytes):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post('/api/questions/import/', {'file': SimpleUploadedFile(name, body)})
+
+    def test_nothing_imported_creates_no_subject(self):
+        self.assertEqual(self.post('broken.xml', b'<quiz><question').status_code, 400)
+        self.assertEqual(self.post('latin.csv', b'stem,A\n\xff\xfe,x\n').status_code, 400)
+        r = self.post('invalid.csv', b'stem,A,B,answer\nQ?,a,b,Z\n')
+        self.assertEqual((r.status_code, r.json()['imported'], r.json()['subject_id']), (200, 0, None))
+        self.assertFalse(Subject.objects.filter(user=self.user).exists())
+
+    def test_import_creates_subject(self):
+        r = self.post('bank.csv', b'stem,A,B,answer\nQ?,a,b,B\n')
+        subject = Subject.objects.get(user=self.user)
+        self.assertEqual((r.json()['subject_id'], subject.title), (str(subject.id), 'Gen MCQ - bank'))
+        self.assertEqual(subject.questions.get().correct_answer, 'B')
+
+    def test_imported_options_flag_the_correct_answer(self):
+        self.post('bank.csv', b'stem,A,B,C,answer\nQ?,a,b,c,C\n')
+        question = Question.objects.get(subject__user=self.user)
+        flagged = [opt['id'] for opt in question.options if opt['is_correct']]
+        self.assertEqual(flagged, [question.correct_answer])
+        self.assertEqual(flagged, ['C'])
+
+
+class BatchQuestionTests(TestCase):
+    """api_batch_questions: all or nothing, errors name the operation, duplicates within the batch"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='batcher', password='pw')
+        self.client.force_login(self.user)
+        self.subject = Subject.objects.create(user=self.user, title='Batch', subject='Batch')
+        self.existing = Question.objects.create(
+            subject=self.subject, stem='Thủ đô của Việt Nam là thành phố nào?', correct_answer='A',
+            options=self.options(), order=1
+        )
+
+    def options(self):
+        return [{'id': c, 'text': f'Phương án {c}'} for c in 'ABCD']
+
+    def create(self, stem: str, ref: str) -> dict:
+        return {'op': 'create', 'ref': ref, 'content': stem, 'options': self.options(), 'correct_answer': 'A'}
+
+    def batch(self, operations: list):
+        return self.client.post('/api/questions/batch/', json.dumps({
+            'subject_id': str(self.subject.id), 'operations': operations
+        }), content_type='application/json')
+
+    def test_invalid_operation_is_reported_and_nothing_applied(self):
+        r = self.batch([
+            {'op': 'delete', 'id': str(self.existing.id)},
+            self.create('Câu hỏi hợp lệ?', 'ok'),
+            {'op': 'create', 'content': '', 'options': self.options()},
+        ])
+
+        self.assertEqual((r.status_code, r.json()['operation']), (400, 2))
+        self.assertEqual(list(self.subject.questions.all()), [self.existing])
+
+    def test_database_error_rolls_back_the_whole_batch(self):
+        from unittest import mock
+        with mock.patch('genmcq.views.search.index_questions', side_effect=RuntimeError('boom')):
+            r = self.batch([
+                {'op': 'delete', 'id': str(self.existing.id)},
+                self.create('Câu hỏi mới?', 'new'),
+            ])
+
+        self.assertEqual(r.status_code, 500)
+        self.assertEqual(list(self.subject.questions.all()), [self.existing])
+
+    def test_update_bumps_updated_at(self):
+        before = self.existing.updated_at
+        r = self.batch([{'op': 'update', 'id': str(self.existing.id), 'explanation': 'Giải thích'}])
+
+        self.assertEqual(r.status_code, 200)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.explanation, 'Giải thích')
+        self.assertGreater(self.existing.updated_at, before)
+
+    def test_creates_are_checked_against_each_other(self):
+        stem = 'Sông dài nhất thế giới là sông nào trong các con sông sau đây?'
+        r = self.batch([
+            self.create(stem, 'first'),
+            self.create(stem + ' ', 'again'),
+            self.create('Nguyên tố nào có số hiệu nguyên tử bằng 1?', 'other'),
+            self.create(self.existing.stem, 'bank'),
+        ])
+
+        created = {q['ref']: q for q in r.json()['created']}
+        self.assertIsNone(created['first']['duplicate_of'])
+        self.assertEqual(created['again']['duplicate_of'], created['first']['id'])
+        self.assertIsNone(created['other']['duplicate_of'])
+        self.assertEqual(created['bank']['duplicate_of'], str(self.existing.id))
+
+
+class DuplicateModeTests(TestCase):
+    """api_generate_mcq flags, skips or ignores near-duplicates of the bank and of the run"""
+    bank_stem = 'Thủ đô của Việt Nam là thành phố nào trong các thành phố sau?'
+    new_stem = 'Sông dài nhất thế giới là sông nào trong các con sông sau đây?'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='dedup', password='pw', credits=10)
+        self.client.force_login(self.user)
+        self.subject = Subject.objects.create(user=self.user, title='Bank', subject='Bank')
+        self.bank = Question.objects.create(subject=self.subject, stem=self.bank_stem, correct_answer='A',
+                                            options=self.options())
+
+    def options(self):
+        return [{'id': c, 'text': f'Phương án {c}'} for c in 'ABCD']
+
+    def mcq(self, stem: str) -> dict:
+        return {'mcq': {'question': {'stem': stem, 'options': {'options': self.options()}, 'correct_answer': 'A'}},
+                'context_index': 0}
+
+    def generate(self, mode: str) -> dict:
+        from unittest import mock
+        result = {
+            'contexts': [{'context': 'Ngữ cảnh', 'is_approved': True}],
+            'mcqs': [self.mcq(self.bank_stem), self.mcq(self.new_stem), self.mcq(self.new_stem + ' ')],
+        }
+        with mock.patch('graph.g.run_mcq_generation', return_value=result):
+            r = self.client.post('/api/generate-mcq/', json.dumps({
+                'text': 'Tài liệu', 'subject_id': str(self.subject.id), 'duplicates': mode
+            }), content_type='application/json')
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    def test_flag(self):
+        data = self.generate('flag')
+
+        flags = [q['duplicate_of'] for q in data['questions']]
+        self.assertEqual(flags[0], str(self.bank.id))
+        self.assertIsNone(flags[1])
+        self.assertEqual(flags[2], data['questions'][1]['id'])
+        self.assertEqual(data['duplicates_skipped'], 0)
+
+    def test_skip(self):
+        data = self.generate('skip')
+
+        self.assertEqual([q['stem'] for q in data['questions']], [self.new_stem])
+        self.assertEqual(data['duplicates_skipped'], 2)
+
+    def test_off(self):
+        data = self.generate('off')
+
+        self.assertEqual([q['duplicate_of'] for q in data['questions']], [None, None, None])
+        self.assertEqual(data['duplicates_skipped'], 0)
+
+    def test_other_workers_writes_are_seen_after_stamp_ttl(self):
+        from unittest import mock
+        from . import dedup
+        self.assertIsNone(dedup.find_duplicate(self.subject.id, self.new_stem, self.options()))
+        # Written without signals, as another process would
+        Question.objects.bulk_create([Question(subject=self.subject, stem=self.new_stem, correct_answer='A',
+                                               options=self.options())])
+
+        self.assertIsNone(dedup.find_duplicate(self.subject.id, self.new_stem, self.options()))
+        with mock.patch.object(dedup, 'STAMP_TTL', 0):
+            self.assertIsNotNone(dedup.find_duplicate(self.subject.id, self.new_stem, self.options()))
+
+
+class ExportTests(TestCase):
+    """Streamed exports, formula escaping and ownership checks"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='pw')
+        self.client.force_login(self.user)
+        self.subject = Subject.objects.create(user=self.user, title='Export', subject='Export')
+        for order, stem in enumerate(['Câu hỏi thứ nhất?', '=HYPERLINK("http://x","bấm")'], start=1):
+            Question.objects.create(
+                subject=self.subject, stem=stem, correct_answer='B', order=order, explanation='-1 là đáp số',
+                options=[{'id': 'A', 'text': '@SUM(A1)'}, {'id': 'B', 'text': '+84'}]
+            )
+
+    def export(self, fmt: str, subject=None):
+        return self.client.get(f'/api/subjects/{(subject or self.subject).id}/export/', {'format': fmt})
+
+    def test_csv_is_streamed_with_formulas_escaped(self):
+        import csv
+        import io
+        r = self.export('csv')
+
+        self.assertTrue(r.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(r.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:2], ['STT', 'Câu hỏi'])
+        self.assertEqual(rows[1][1:4], ['Câu hỏi thứ nhất?', "'@SUM(A1)", "'+84"])
+        self.assertEqual(rows[2][1], '\'=HYPERLINK("http://x","bấm")')
+        self.assertEqual(rows[2][9], "'-1 là đáp số")
+
+    def test_exported_csv_imports_back_unescaped(self):
+        import io
+        from . import importers
+        data = b''.join(self.export('csv').streaming_content)
+        items = list(importers.parse(io.BytesIO(data), 'csv'))
+
+        self.assertEqual(items[1]['stem'], '=HYPERLINK("http://x","bấm")')
+        self.assertEqual(items[0]['options'], ['@SUM(A1)', '+84'])
+        self.assertEqual(items[0]['correct'], 1)
+
+    def test_jsonl_is_streamed_one_question_per_line(self):
+        r = self.export('jsonl')
+
+        self.assertTrue(r.streaming)
+        lines = b''.join(r.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['number'] for row in rows], [1, 2])
+        # JSON is not evaluated by spreadsheets: kept verbatim
+        self.assertEqual(rows[1]['stem'], '=HYPERLINK("http://x","bấm")')
+
+    def test_other_users_subject_is_not_found(self):
+        other = User.objects.create_user(username='other', password='pw')
+        subject = Subject.objects.create(user=other, title='Private', subject='Private')
+
+        self.assertEqual(self.export('csv', subject).status_code, 404)
+        self.assertEqual(self.export('exe').status_code, 400)
+
+
+class QuestionListTests(TestCase):
+    """api_get_questions: keyset pages and field projections"""
+
+    def setUp(self):
+        from django.utils import timezone
+        self.user = User.objects.create_user(username='lister', password='pw')
+        self.client.force_login(self.user)
+        self.subject = Subject.objects.create(user=self.user, title='List', subject='List')
+        Question.objects.bulk_create([
+            Question(subject=self.subject, stem=f'Câu {n}?', correct_answer='A', order=n,
+                     options=[{'id': 'A', 'text': 'x'}], reasoning={'bloom_level': 'apply', 'note': 'x' * 100})
+            for n in range(7)
+        ])
+        # Ties on created_at: the cursor must fall back to id
+        Question.objects.filter(subject=self.subject).update(created_at=timezone.now())
+
+    def get(self, **params):
+        r = self.client.get('/api/questions/', {'subject_id': str(self.subject.id), **params})
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    def test_cursor_pages_cover_every_question_once_despite_equal_created_at(self):
+        seen, cursor = [], None
+        while True:
+            data = self.get(limit=3, **({'cursor': cursor} if cursor else {}))
+            seen += [q['id'] for q in data['questions']]
+            cursor = data['next_cursor']
+            self.assertEqual(data['has_next'], cursor is not None)
+            if not cursor:
+                break
+
+        expected = sorted((str(q) for q in self.subject.questions.values_list('id', flat=True)), reverse=True)
+        self.assertEqual(seen, expected)
+
+    def test_default_page_size(self):
+        from unittest import mock
+        from . import views
+        with mock.patch.object(views, 'DEFAULT_QUESTIONS_PAGE_SIZE', 4):
+            data = self.get()
+
+        self.assertEqual((data['count'], data['has_next']), (4, True))
+
+    def test_fields_and_compact_projections(self):
+        from .views import COMPACT_QUESTION_FIELDS
+        data = self.get(fields='id,stem,bloom_level')
+        self.assertEqual(set(data['questions'][0]), {'id', 'stem', 'bloom_level'})
+        self.assertEqual(data['questions'][0]['bloom_level'], 'apply')
+
+        compact = self.get(compact='1')['questions'][0]
+        self.assertEqual(set(compact), set(COMPACT_QUESTION_FIELDS))
+        self.assertNotIn('options', compact)
+
+    def test_invalid_parameters(self):
+        for params in ({'fields': 'stem,password'}, {'cursor': 'not-a-cursor'}, {'limit': 'many'}):
+            r = self.client.get('/api/questions/', {'subject_id': str(self.subject.id), **params})
+            self.assertEqual(r.status_code, 400, params)
+
+
+class SearchTests(TestCase):
+    """Full-text search: query escaping, ranking, scoping and the non-FTS fallback"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='pw')
+        self.subject = Subject.objects.create(user=self.user, title='Sinh học', subject='Sinh học', topic='Thực vật')
+        self.in_stem = self.question('Quang hợp diễn ra ở bào quan nào?', explanation='Lục lạp.')
+        self.in_explanation = self.question('Bào quan nào chứa diệp lục?', explanation='Nơi diễn ra quang hợp.')
+        self.in_options = self.question('Chọn đáp án đúng', options=['photosynthesis', 'respiration'])
+        other = User.objects.create_user(username='other', password='pw')
+        Question.objects.create(subject=Subject.objects.create(user=other, title='X', topic=''),
+                                stem='Quang hợp của người khác', correct_answer='A')
+
+    def question(self, stem, explanation='', options=('A', 'B')):
+        return Question.objects.create(subject=self.subject, stem=stem, explanation=explanation, correct_answer='A',
+                                       options=[{'id': 'AB'[i], 'text': t} for i, t in enumerate(options)])
+
+    def test_match_query_quotes_every_term(self):
+        from .search import match_query
+
+        self.assertEqual(match_query('quang "hợp" OR NEAR(x) -y*'),
+                         '{stem options explanation topic} : ("quang" "hợp" "OR" "NEAR" "x" "y"*)')
+        self.assertEqual(match_query('  "*" - '), '')
+        self.assertTrue(match_query('a', subject_id=self.subject.id).startswith(f'subject_id : "{self.subject.id.hex}" AND'))
+
+    def test_stem_matches_rank_above_explanation_matches(self):
+        from .search import search_questions
+
+        hits, total = search_questions(self.user, 'quang hop')
+        self.assertEqual(total, 2)
+        self.assertEqual([qid for qid, _ in hits], [str(self.in_stem.id), str(self.in_explanation.id)])
+        self.assertGreater(hits[0][1], hits[1][1])
+
+    def test_prefix_options_and_topic_are_searched(self):
+        from .search import search_questions
+
+        self.assertEqual(search_questions(self.user, 'photosynth')[0][0][0], str(self.in_options.id))
+        self.assertEqual(search_questions(self.user, 'thuc vat')[1], 3)
+
+    def test_fallback_searches_the_same_fields(self):
+        from unittest import mock
+        from . import search
+
+        with mock.patch.object(search, 'fts_enabled', return_value=False):
+            self.assertEqual(search.search_questions(self.user, 'photosynthesis')[0], [(str(self.in_options.id), 0.0)])
+            hits, total = search.search_questions(self.user, 'Quang hợp')
+        self.assertEqual({qid for qid, _ in hits}, {str(self.in_stem.id), str(self.in_explanation.id)})
+        self.assertEqual(total, 2)
+
+
+class RunBudgetTests(TestCase):
+    """An exhausted run budget settles unfinished items; empty runs give the credit back"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='budget', password='pw', credits=1)
+        self.client.force_login(self.user)
+
+    def complete(self, policy: str) -> dict:
+        from graph.budget import RunBudget
+        from graph.g import ContextItem, MCQItem, complete
+        contexts = [ContextItem('A', is_approved=True), ContextItem('B'), ContextItem('C')]
+        mcqs = [MCQItem(None, 'B', 1, is_approved=True), MCQItem(None, 'C', 2, suggestions=['Sửa đáp án'])]
+        RunBudget.start('budget-test', max_llm_calls=0)
+        try:
+            return complete({'run_id': 'budget-test', 'contexts': contexts, 'mcqs': mcqs,
+                             'on_budget_exhausted': policy})
+        finally:
+            RunBudget.close('budget-test')
+
+    def test_approve_policy_force_approves_unsettled_items(self):
+        result = self.complete('approve')
+
+        self.assertTrue(result['budget_exhausted'])
+        # Deltas: only the items that were still in the loop
+        self.assertEqual(sorted(result['contexts']), [1, 2])
+        self.assertEqual(sorted(result['mcqs']), [1])
+        mcq = result['mcqs'][1]
+        self.assertTrue(mcq.is_approved)
+        self.assertEqual(mcq.suggestions, [])
+        self.assertEqual(mcq.review, 'Budget exhausted (llm_calls)')
+
+    def test_drop_policy_keeps_approved_items_and_reindexes_contexts(self):
+        result = self.complete('drop')
+
+        self.assertEqual([m.context for m in result['mcqs']], ['B'])
+        # Context B is kept for its approved MCQ, C goes with its unapproved one
+        self.assertEqual([c.context for c in result['contexts']], ['A', 'B'])
+        self.assertEqual(result['mcqs'][0].context_index, 1)
+
+    def test_unbounded_run_completes_untouched(self):
+        from graph.g import complete
+
+        result = complete({'run_id': 'no-such-run', 'contexts': [], 'mcqs': []})
+
+        self.assertNotIn('budget_exhausted', result)
+
+    def generate(self, result: dict, **params):
+        from unittest import mock
+        with mock.patch('graph.g.run_mcq_generation', return_value=result) as run:
+            r = self.client.post('/api/generate-mcq/', json.dumps({'text': 'Tài liệu', **params}),
+                                 content_type='application/json')
+        return r, run
+
+    def test_credit_refunded_when_budget_yields_no_context(self):
+        r, _ = self.generate({'contexts': [], 'mcqs': [], 'budget_exhausted': True}, max_llm_calls=1)
+
+        self.assertEqual(r.status_code, 502)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.credits, 1)
+
+    def test_credit_refunded_when_budget_yields_no_mcq(self):
+        r, _ = self.generate({'contexts': [{'context': 'Ngữ cảnh', 'is_approved': True}], 'mcqs': [],
+                              'budget_exhausted': True}, on_budget_exhausted='drop')
+
+        self.assertEqual(r.status_code, 200, r.content)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.credits, 1)
+
+    def test_invalid_budget_params_are_rejected(self):
+        for params in ({'deadline_seconds': 'abc'}, {'max_llm_calls': '2.5'}, {'max_tokens': -1},
+                       {'diversity_threshold': 'x'}, {'diversity_threshold': 1.5}):
+            r, run = self.generate({}, **params)
+
+            self.assertEqual(r.status_code, 400, params)
+            run.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.credits, 1)
+
+    def test_budget_params_are_parsed(self):
+        _, run = self.generate({'contexts': [], 'mcqs': []}, deadline_seconds='30', max_llm_calls='5',
+                               max_tokens=0, diversity_threshold='0')
+
+        kwargs = run.call_args.kwargs
+        self.assertEqual(kwargs['deadline_seconds'], 30.0)
+        self.assertEqual(kwargs['max_llm_calls'], 5)
+        self.assertIsNone(kwargs['max_tokens'])
+        self.assertEqual(kwargs['diversity_threshold'], 0.0)
+
+
+class ProviderError(Exception):
+    """Stand-in for a GenAI APIError: an HTTP status code and error details"""
+
+    def __init__(self, code: int, details: str = ''):
+        super().__init__(f'{code} {details}')
+        self.code = code
+        self.details = details
+
+
+class RetryTests(SimpleTestCase):
+    """Error classification, circuit breaker, rate limits and model fallback of LLM calls"""
+
+    def setUp(self):
+        from graph.retry import CircuitBreaker, ModelRateLimit
+        CircuitBreaker.reset_all()
+        ModelRateLimit.configure({})
+        self.addCleanup(CircuitBreaker.reset_all)
+        self.addCleanup(ModelRateLimit.configure, {})
+
+    def test_classify_error(self):
+        from graph import retry
+
+        class ReadTimeout(Exception):
+            pass
+
+        cases = [
+            (retry.SchemaParseError('bad json'), retry.SCHEMA),
+            (json.JSONDecodeError('bad', '{', 0), retry.SCHEMA),
+            (ProviderError(429), retry.RATE_LIMIT),
+            (ProviderError(503), retry.OVERLOADED),
+            (ProviderError(504), retry.TIMEOUT),
+            (ProviderError(400), retry.FATAL),
+            (ProviderError(403), retry.FATAL),
+            (TimeoutError(), retry.TIMEOUT),
+            (ReadTimeout(), retry.TIMEOUT),
+            (ConnectionResetError(), retry.CONNECTION),
+            (ValueError('bug'), retry.FATAL),
+        ]
+        for error, kind in cases:
+            self.assertEqual(retry.classify_error(error), kind, repr(error))
+        self.assertNotIn(retry.FATAL, retry.RETRYABLE)
+
+    def test_retryable_errors_are_retried_and_fatal_ones_are_not(self):
+        from graph.retry import call_with_retry, LLMCallError, RetryPolicy, FATAL
+        policy = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+        outcomes = [ProviderError(503), TimeoutError(), 'ok']
+
+        def send():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(call_with_retry(send, model='retry', policy=policy), 'ok')
+
+        calls = []
+
+        def rejected():
+            calls.append(1)
+            raise ProviderError(400)
+
+        with self.assertRaises(LLMCallError) as caught:
+            call_with_retry(rejected, model='fatal', policy=policy)
+        self.assertEqual(caught.exception.kind, FATAL)
+        self.assertEqual(len(calls), 1)
+
+    def test_circuit_breaker_transitions(self):
+        from unittest import mock
+        from graph.retry import CircuitBreaker
+        breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=30)
+
+        with mock.patch('graph.retry.time.monotonic', return_value=100.0) as clock:
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())  # Closed below the threshold
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())  # Open: fail fast during the cooldown
+
+            clock.return_value = 131.0
+            self.assertTrue(breaker.allow())  # Half-open: one trial call
+            self.assertFalse(breaker.allow())
+            breaker.record_failure()  # Failed trial re-opens for a new cooldown
+            self.assertFalse(breaker.allow())
+
+            clock.return_value = 162.0
+            self.assertTrue(breaker.allow())
+            breaker.record_success()  # Successful trial closes the circuit
+            self.assertTrue(breaker.allow())
+            self.assertTrue(breaker.allow())
+
+    def test_rate_limit_buckets_from_setting(self):
+        from graph.retry import ModelRateLimit, parse_rate_limits
+
+        limits = parse_rate_limits(' gemini-2.5-flash=10 ,gemini-2.5-flash-lite=15,,broken=,=5')
+        self.assertEqual(limits, {'gemini-2.5-flash': 10.0, 'gemini-2.5-flash-lite': 15.0})
+        self.assertEqual(parse_rate_limits(''), {})
+
+        ModelRateLimit.configure(limits)
+        self.assertEqual(ModelRateLimit.for_model('gemini-2.5-flash').interval, 6.0)
+        self.assertEqual(ModelRateLimit.for_model('gemini-2.5-flash-lite').interval, 4.0)
+        self.assertEqual(ModelRateLimit.for_model('unlisted').interval, 0.0)
+        self.assertIs(ModelRateLimit.for_model('gemini-2.5-flash'), ModelRateLimit.for_model('gemini-2.5-flash'))
+
+    def budgeted_client(self, errors: dict, fallbacks):
+        """BudgetedClient over a fake client failing with errors[model]; returns (client, models called)"""
+        from types import SimpleNamespace
+        from graph.budget import BudgetedClient, RunBudget
+        from graph.retry import RetryPolicy
+        called = []
+
+        def generate_content(*, model, contents, config=None):
+            called.append(model)
+            if model in errors:
+                raise errors[model]
+            return SimpleNamespace(text=model, parsed=None, usage_metadata=None)
+
+        fake = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+        client = BudgetedClient(fake, RunBudget(), retry_policy=RetryPolicy(max_attempts=2, base_delay=0, max_delay=0),
+                                pacer=lambda seconds: None, fallbacks=fallbacks)
+        return client, called
+
+    def test_fallback_chain_order(self):
+        client, called = self.budgeted_client({}, fallbacks=['b', 'a', 'c'])
+
+        self.assertEqual(client.models.generate_content(model='a', contents='x').text, 'a')
+        self.assertEqual(called, ['a'])
+
+        client, called = self.budgeted_client({'a': ProviderError(429, "retryDelay': '30s'"),
+                                               'b': ProviderError(429, "retryDelay': '30s'")},
+                                              fallbacks=['b', 'a', 'c'])
+        # The requested model first, then the fallbacks in order, without repeating it
+        self.assertEqual(client.models.generate_content(model='a', contents='x').text, 'c')
+        self.assertEqual(called, ['a', 'b', 'c'])
+
+        # Held-back models are skipped by later calls
+        called.clear()
+        self.assertEqual(client.models.generate_content(model='a', contents='x').text, 'c')
+        self.assertEqual(called, ['c'])
+
+    def test_fallback_on_open_circuit_but_not_on_fatal_error(self):
+        from graph.retry import CircuitBreaker, LLMCallError, FATAL
+        for _ in range(CircuitBreaker.for_model('a').failure_threshold):
+            CircuitBreaker.for_model('a').record_failure()
+        client, called = self.budgeted_client({}, fallbacks=['b'])
+
+        self.assertEqual(client.models.generate_content(model='a', contents='x').text, 'b')
+        self.assertEqual(called, ['b'])
+
+        client, called = self.budgeted_client({'c': ProviderError(400)}, fallbacks=['b'])
+        with self.assertRaises(LLMCallError) as caught:
+            client.models.generate_content(model='c', contents='x')
+        self.assertEqual(caught.exception.kind, FATAL)
+        self.assertEqual(called, ['c'])
+
+
+class DeltaChannelTests(SimpleTestCase):
+    """`contexts` / `mcqs` reducers and the checkpoints they produce"""
+
+    def items(self, *names):
+        from graph.g import ContextItem
+        return [ContextItem(name) for name in names]
+
+    def test_index_delta_replaces_only_listed_items(self):
+        from graph.g import merge_items
+        items = self.items('A', 'B', 'C')
+        b2, = self.items('B2')
+
+        merged = merge_items(items, [{1: b2}])
+
+        self.assertEqual([c.context for c in merged], ['A', 'B2', 'C'])
+        self.assertIs(merged[0], items[0])
+        # The previous channel value is left untouched
+        self.assertEqual([c.context for c in items], ['A', 'B', 'C'])
+
+    def test_list_update_replaces_appends_and_deletes(self):
+        from graph.g import merge_items
+        items = self.items('A', 'B', 'C')
+
+        self.assertEqual([c.context for c in merge_items(items, [items + self.items('D')])], ['A', 'B', 'C', 'D'])
+        self.assertEqual([c.context for c in merge_items(items, [[items[0], items[2]]])], ['A', 'C'])
+        self.assertEqual(merge_items(items, [[]]), [])
+
+    def test_updates_apply_in_order(self):
+        from graph.g import merge_items
+        items = self.items('A', 'B')
+        a2, b2, c = self.items('A2', 'B2', 'C')
+
+        merged = merge_items(items, [{0: a2}, [a2, items[1], c], {1: b2}])
+
+        self.assertEqual([i.context for i in merged], ['A2', 'B2', 'C'])
+        self.assertIs(merge_items(items, []), items)
+
+    def test_changed_items_is_the_delta_of_replaced_items(self):
+        from dataclasses import replace
+        from graph.g import changed_items, merge_items
+        before = self.items('A', 'B', 'C')
+        after = [before[0], replace(before[1], is_approved=True), before[2]]
+
+        delta = changed_items(before, after)
+
+        self.assertEqual(list(delta), [1])
+        self.assertEqual(merge_items(before, [delta]), after)
+        self.assertEqual(changed_items(before, list(before)), {})
+
+    def mcq_item(self):
+        from graph.g import MCQItem
+        from graph.gen import MCQ, Question, Options, Reason, option
+        return MCQItem(MCQ(question=Question(
+            stem='Thủ đô của Việt Nam là gì?',
+            options=Options(options=[option(id=c, text=t) for c, t in zip('ABCD', ['Hà Nội', 'Huế', 'Đà Nẵng', 'Sài Gòn'])]),
+            correct_answer='A',
+            reasoning=Reason(bloom_level_analysis='', tactic_analysis='', answer_justification='',
+                             distractor_justification=[])
+        )), 'Ngữ cảnh', 0, suggestions=['Sửa phương án B'])
+
+    def test_checkpoint_round_trip_keeps_item_types(self):
+        from graph.g import new_checkpointer
+        serde = new_checkpointer().serde
+        stored = [self.items('A')[0], self.mcq_item()]
+
+        for item in stored:
+            restored = serde.loads_typed(serde.dumps_typed(item))
+            self.assertIs(type(restored), type(item))
+            self.assertEqual(restored, item)
+
+    def test_checkpoint_does_not_revive_types_off_the_allow_list(self):
+        from dataclasses import dataclass
+        from graph.g import new_checkpointer
+        serde = new_checkpointer().serde
+
+        @dataclass
+        class Stranger:
+            value: int = 1
+
+        with self.assertLogs(level='WARNING'):
+            restored = serde.loads_typed(serde.dumps_typed(Stranger()))
+        self.assertEqual(restored, {'value': 1})
+
+    def test_graph_state_is_rebuilt_from_checkpointed_deltas(self):
+        from dataclasses import replace
+        from langgraph.graph import StateGraph, START, END
+        from graph.g import changed_items, new_checkpointer, state_schema
+        mcq = self.mcq_item()
+
+        def approve_b(state):
+            contexts = state['contexts']
+            return {'contexts': changed_items(contexts, [
+                replace(c, is_approved=True) if c.context == 'B' else c for c in contexts
+            ])}
+
+        builder = StateGraph(state_schema())
+        builder.add_node('gen', lambda state: {'contexts': self.items('A', 'B'), 'mcqs': [mcq]})
+        builder.add_node('review', approve_b)
+        builder.add_edge(START, 'gen')
+        builder.add_edge('gen', 'review')
+        builder.add_edge('review', END)
+        graph = builder.compile(checkpointer=new_checkpointer())
+        config = {'configurable': {'thread_id': 'delta-test'}}
+
+        graph.invoke({'run_id': 'delta-test'}, config)
+        values = graph.get_state(config).values
+
+        self.assertEqual([(c.context, c.is_approved) for c in values['contexts']], [('A', False), ('B', True)])
+        self.assertEqual(values['mcqs'], [mcq])
+
+
+@unittest.skipUnless(os.getenv('LOAD_TEST'), "set LOAD_TEST=1 (CI runs it on SQLite and PostgreSQL)")
+class QuestionLoadTests(TransactionTestCase):
+    """
+    Throughput of the question CRUD endpoints and of bulk result persistence
+    on the configured database. CI runs this with DB_ENGINE=sqlite
+    (DATABASE_PROFILE=production, SQLITE_TEST_NAME set) and with
+    DB_ENGINE=postgresql, and compares the printed numbers.
+    """
+    threads = int(os.getenv('LOAD_TEST_THREADS', '8'))
+    cycles = int(os.getenv('LOAD_TEST_CYCLES', '25'))
+
+    def report(self, label: str, ops: int, elapsed: float):
+        print(f"\n[load] {connection.vendor:<10} {label:<28} {ops} ops in {elapsed:.2f}s = {ops / elapsed:.0f} ops/s")
+
+    def test_question_crud_endpoints(self):
+        users = [
+            User.objects.create_user(username=f'load{i}', password='pw', credits=10 ** 6)
+            for i in range(self.threads)
+        ]
+        errors = []
+        start = threading.Barrier(self.threads + 1)
+
+        def worker(user):
+            client = Client()
+            client.force_login(user)
+            try:
+                start.wait()
+                for n in range(self.cycles):
+                    r = client.post('/api/questions/create/', json.dumps({
+                        'content': f'{user.username} question {n}?',
+                        'options': [{'id': c, 'text': f'Option {c} {n}'} for c in 'ABCD'],
+                        'correct_answer': 'A',
+                        'subject': 'Load'
+                    }), content_type='application/json')
+                    if r.status_code != 200:
+                        errors.append(r.content)
+                        continue
+                    qid = r.json()['question']['id']
+                    for r in (
+                        client.post(f'/api/questions/{qid}/update/', json.dumps({'explanation': 'edited'}),
+                                    content_type='application/json'),
+                        client.get('/api/questions/', {'limit': 20}),
+                        client.post(f'/api/questions/{qid}/delete/'),
+                    ):
+                        if r.status_code != 200:
+                            errors.append(r.content)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(u,)) for u in users]
+        for t in workers:
+            t.start()
+        start.wait()
+        began = time.perf_counter()
+        for t in workers:
+            t.join()
+        self.report('CRUD endpoints', self.threads * self.cycles * 4, time.perf_counter() - began)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Question.objects.count(), 0)
+
+    def test_bulk_result_persistence(self):
+        user = User.objects.create_user(username='bulk', password='pw')
+        subject = Subject.objects.create(user=user, title='Bulk')
+        batch = 500
+
+        began = time.perf_counter()
+        with transaction.atomic():
+            # What api_generate_mcq does per generated question
+            for n in range(batch):
+                Question.objects.create(
+                    subject=subject, stem=f'Generated {n}?', correct_answer='A', order=n,
+                    options=[{'id': c, 'text': f'Option {c} {n}'} for c in 'ABCD'],
+                    reasoning={'bloom_level': 'understand'}
+                )
+        self.report('persist generated (create)', batch, time.perf_counter() - began)
+
+        began = time.perf_counter()
+        Question.objects.bulk_create([
+            Question(subject=subject, stem=f'Imported {n}?', correct_answer='A', order=batch + n,
+                     options=[{'id': c, 'text': f'Option {c} {n}'} for c in 'ABCD'])
+            for n in range(batch * 10)
+        ], batch_size=1000)
+        self.report('persist bulk (bulk_create)', batch * 10, time.perf_counter() - began)
+
+        self.assertEqual(subject.questions.count(), batch * 11)
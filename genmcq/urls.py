@@ -17,13 +17,19 @@ urlpatterns = [
     
     # API endpoints for question management
     path('api/questions/', views.api_get_questions, name='api-get-questions'),
+    path('api/questions/search/', views.api_search_questions, name='api-search-questions'),
+    path('api/questions/batch/', views.api_batch_questions, name='api-batch-questions'),
+    path('api/questions/import/', views.api_import_questions, name='api-import-questions'),
     path('api/questions/create/', views.api_create_question, name='api-create-question'),
     path('api/questions/<uuid:question_id>/update/', views.api_update_question, name='api-update-question'),
     path('api/questions/<uuid:question_id>/delete/', views.api_delete_question, name='api-delete-question'),
+    path('api/questions/<uuid:question_id>/regenerate/', views.api_regenerate_question, name='api-regenerate-question'),
+    path('api/contexts/<uuid:context_id>/regenerate/', views.api_regenerate_context, name='api-regenerate-context'),
     path('api/questions/clear-all/', views.api_clear_all_questions, name='api-clear-all-questions'),
     path('api/subjects/list/', views.api_get_subjects_list, name='api-get-subjects-list'),
     path('api/subjects/history/', views.api_get_subjects_history, name='api-get-subjects-history'),
     path('api/subjects/<uuid:subject_id>/delete/', views.api_delete_subject, name='api-delete-subject'),
+    path('api/subjects/<uuid:subject_id>/export/', views.api_export_subject, name='api-export-subject'),
     
     # Generation endpoint
     path('api/generate-mcq/', views.api_generate_mcq, name='api-generate-mcq'),
@@ -1,21 +1,28 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.views.decorators.http import require_http_methods, require_POST
 
-from django.db.models import Max
+from django.db import transaction
+from django.db.models import Max, Q
+from django.db.models.fields.json import KT
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils import timezone
+from django.core.exceptions import ValidationError
+from dataclasses import asdict
+from datetime import datetime
+import base64
+import xml.etree.ElementTree as ET
 import json
 import uuid
-import PyPDF2
-import docx
-import pptx
-from graph.g import run_mcq_generation
 from .forms import RegisterForm, LoginForm, ProfileForm
 from .models import Context, Question, Subject, SourceFile
+from .dedup import find_duplicate
+from .search import search_questions
+from . import dedup, export, importers, search
 
 
 def normalize_difficulty(value: str) -> str:
@@ -38,6 +45,24 @@ def difficulty_to_bloom(difficulty: str) -> str:
     return mapping.get(normalize_difficulty(difficulty), 'understand')
 
 
+def generation_config_for(profile: str = '', overrides=None) -> dict:
+    """
+    Per-node generation config of a settings.LLM_GENERATION_PROFILES profile
+    (default: settings.LLM_GENERATION_PROFILE), with per-node overrides on top.
+    Raises ValueError for an unknown profile; values are checked by the graph.
+    """
+    profile = profile or settings.LLM_GENERATION_PROFILE
+    if profile not in settings.LLM_GENERATION_PROFILES:
+        raise ValueError(f"không có profile '{profile}'")
+    overrides = overrides or {}
+    if not isinstance(overrides, dict):
+        raise ValueError('cần dạng {node: {...}}')
+    config = {node: dict(values) for node, values in settings.LLM_GENERATION_PROFILES[profile].items()}
+    for node, values in overrides.items():
+        config[node] = {**config.get(node, {}), **values} if isinstance(values, dict) else values
+    return config
+
+
 def home(request):
     """Home page view"""
     return render(request, 'home.html')
@@ -164,6 +189,69 @@ def dashboard_view(request):
 
 # ============== API VIEWS FOR QUESTION MANAGEMENT ==============
 
+def validate_new_question(data: dict):
+    """Error message for invalid manual question data, or None."""
+    if not str(data.get('content', '')).strip():
+        return 'Nội dung câu hỏi không được để trống'
+    if len(data.get('options') or []) < 2:
+        return 'Cần ít nhất 2 đáp án'
+    return None
+
+
+def new_manual_question(subject_obj: Subject, data: dict, order: int) -> Question:
+    """Unsaved Question from the editor's create payload."""
+    difficulty = normalize_difficulty(data.get('difficulty', 'medium'))
+    bloom_level = data.get('bloom_level') or difficulty_to_bloom(difficulty)
+    return Question(
+        subject=subject_obj,
+        question_type='mcq',
+        stem=str(data.get('content', '')).strip(),
+        difficulty=difficulty,
+        options=data.get('options', []),
+        correct_answer=data.get('correct_answer', 'A'),
+        explanation=data.get('explanation', ''),
+        reasoning={
+            'bloom_level': bloom_level,
+            'difficulty': difficulty
+        },
+        user_edited=True,
+        order=order
+    )
+
+
+def apply_question_edit(question: Question, data: dict):
+    """Apply the editor's update payload to a Question (not saved)."""
+    # Store original data before editing
+    if not question.original_data:
+        question.original_data = {
+            'stem': question.stem,
+            'options': question.options,
+            'correct_answer': question.correct_answer,
+            'explanation': question.explanation
+        }
+
+    # Update fields
+    if 'content' in data:
+        question.stem = data['content']
+    if 'options' in data:
+        question.options = data['options']
+    if 'correct_answer' in data:
+        question.correct_answer = data['correct_answer']
+    if 'explanation' in data:
+        question.explanation = data['explanation']
+    if 'bloom_level' in data or 'difficulty' in data:
+        new_difficulty = normalize_difficulty(data.get('difficulty', question.difficulty))
+        new_bloom = data.get('bloom_level', question.reasoning.get('bloom_level')) or difficulty_to_bloom(new_difficulty)
+        question.difficulty = new_difficulty
+        question.reasoning = {
+            **question.reasoning,
+            'bloom_level': new_bloom,
+            'difficulty': new_difficulty
+        }
+
+    question.user_edited = True
+
+
 @login_required
 @require_POST
 def api_create_question(request):
@@ -177,21 +265,15 @@ def api_create_question(request):
         # Validate required fields
         content = data.get('content', '').strip()
         options = data.get('options', [])
-        correct_answer = data.get('correct_answer', 'A')
         difficulty = normalize_difficulty(data.get('difficulty', 'medium'))
         bloom_level = data.get('bloom_level') or difficulty_to_bloom(difficulty)
         subject_name = data.get('subject', '').strip()
         
-        if not content:
+        error = validate_new_question(data)
+        if error:
             return JsonResponse({
                 'success': False, 
-                'error': 'Nội dung câu hỏi không được để trống'
-            }, status=400)
-        
-        if len(options) < 2:
-            return JsonResponse({
-                'success': False, 
-                'error': 'Cần ít nhất 2 đáp án'
+                'error': error
             }, status=400)
         
         # Get or create subject based on subject_id or subject_name
@@ -252,27 +334,17 @@ def api_create_question(request):
                 }
             )
         
+        # Flag (but do not block) manual questions that repeat the bank
+        duplicate = find_duplicate(subject_obj.id, content, options)
+        
         # Determine the next order number
         max_order = subject_obj.questions.aggregate(
             max_order=Max('order')
         )['max_order'] or 0
         
         # Create the question
-        question = Question.objects.create(
-            subject=subject_obj,
-            question_type='mcq',
-            stem=content,
-            difficulty=difficulty,
-            options=options,
-            correct_answer=correct_answer,
-            explanation=data.get('explanation', ''),
-            reasoning={
-                'bloom_level': bloom_level,
-                'difficulty': difficulty
-            },
-            user_edited=True,
-            order=max_order + 1
-        )
+        question = new_manual_question(subject_obj, data, max_order + 1)
+        question.save()
         
         # Update subject's updated_at to reflect the latest question creation time
         subject_obj.updated_at = timezone.now()
@@ -293,6 +365,7 @@ def api_create_question(request):
                 'order': question.order,
                 'user_edited': question.user_edited
             },
+            'duplicate_of': duplicate[0] if duplicate else None,
             'user_credits': request.user.credits
         })
         
@@ -323,35 +396,7 @@ def api_update_question(request, question_id):
             subject__user=request.user
         )
         
-        # Store original data before editing
-        if not question.original_data:
-            question.original_data = {
-                'stem': question.stem,
-                'options': question.options,
-                'correct_answer': question.correct_answer,
-                'explanation': question.explanation
-            }
-        
-        # Update fields
-        if 'content' in data:
-            question.stem = data['content']
-        if 'options' in data:
-            question.options = data['options']
-        if 'correct_answer' in data:
-            question.correct_answer = data['correct_answer']
-        if 'explanation' in data:
-            question.explanation = data['explanation']
-        if 'bloom_level' in data or 'difficulty' in data:
-            new_difficulty = normalize_difficulty(data.get('difficulty', question.difficulty))
-            new_bloom = data.get('bloom_level', question.reasoning.get('bloom_level')) or difficulty_to_bloom(new_difficulty)
-            question.difficulty = new_difficulty
-            question.reasoning = {
-                **question.reasoning,
-                'bloom_level': new_bloom,
-                'difficulty': new_difficulty
-            }
-        
-        question.user_edited = True
+        apply_question_edit(question, data)
         question.save()
         
         return JsonResponse({
@@ -410,6 +455,187 @@ def api_delete_question(request, question_id):
         }, status=500)
 
 
+# ============== BATCH EDITING ==============
+
+BATCH_OPERATIONS = ('create', 'update', 'delete', 'reorder')
+MAX_BATCH_OPERATIONS = 500
+BATCH_UPDATE_FIELDS = [
+    'stem', 'options', 'correct_answer', 'explanation', 'difficulty',
+    'reasoning', 'original_data', 'user_edited', 'order',
+    # bulk_update does not apply auto_now; dedup's index stamp relies on it
+    'updated_at'
+]
+
+
+class BatchError(Exception):
+    """Invalid batch operation: message, HTTP status and operation index"""
+    def __init__(self, message: str, status: int = 400, index: int = None):
+        super().__init__(message)
+        self.status = status
+        self.index = index
+
+
+def parse_batch_id(value, index: int) -> uuid.UUID:
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        raise BatchError(f'Thao tác {index}: ID câu hỏi không hợp lệ', index=index)
+
+
+@login_required
+@require_POST
+def api_batch_questions(request):
+    """
+    API endpoint to apply several question edits of one subject in one request.
+    Expects JSON body:
+        {
+            "subject_id": "...",
+            "operations": [
+                {"op": "create", "ref": "local_1", "content": "...", "options": [...], ...},
+                {"op": "update", "id": "...", "content": "...", ...},
+                {"op": "delete", "id": "..."},
+                {"op": "reorder", "ids": ["...", "local_1", ...]}
+            ]
+        }
+
+    Create / update fields are the same as api_create_question /
+    api_update_question. Reorder ids may use the `ref` of a created question.
+    Everything is applied in one transaction (all or nothing) with one
+    delete, one bulk_create and one bulk_update.
+    """
+    try:
+        data = json.loads(request.body)
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            raise BatchError('Danh sách thao tác không hợp lệ')
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise BatchError(f'Tối đa {MAX_BATCH_OPERATIONS} thao tác mỗi lần')
+
+        try:
+            subject_obj = Subject.objects.get(id=data.get('subject_id'), user=request.user)
+        except (Subject.DoesNotExist, ValueError, TypeError, ValidationError):
+            raise BatchError('Không tìm thấy môn học', status=404)
+
+        # Validate everything before touching the database
+        referenced, create_refs = set(), set()
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            if op not in BATCH_OPERATIONS:
+                raise BatchError(f'Thao tác {index}: loại thao tác không hợp lệ', index=index)
+            if op == 'create':
+                error = validate_new_question(operation)
+                if error:
+                    raise BatchError(f'Thao tác {index}: {error}', index=index)
+                if operation.get('ref'):
+                    create_refs.add(str(operation['ref']))
+            elif op in ('update', 'delete'):
+                referenced.add(parse_batch_id(operation.get('id'), index))
+            elif not isinstance(operation.get('ids'), list):
+                raise BatchError(f'Thao tác {index}: thiếu danh sách ids', index=index)
+            else:
+                referenced.update(
+                    parse_batch_id(key, index) for key in operation['ids'] if str(key) not in create_refs
+                )
+
+        questions = {
+            q.id: q for q in Question.objects.select_related('subject').filter(
+                subject=subject_obj, id__in=referenced
+            )
+        }
+        missing = referenced - set(questions)
+        if missing:
+            raise BatchError(f'Không tìm thấy câu hỏi: {", ".join(str(m) for m in missing)}', status=404)
+
+        created, refs, duplicates, updated, deleted = [], {}, {}, {}, set()
+        # Questions created earlier in this batch, which the bank index does not hold yet
+        batch_index = dedup.NearDuplicateIndex()
+        next_order = (subject_obj.questions.aggregate(max_order=Max('order'))['max_order'] or 0) + 1
+        for index, operation in enumerate(operations):
+            op = operation['op']
+            if op == 'create':
+                question = new_manual_question(subject_obj, operation, next_order + len(created))
+                # Flag (but do not block) questions that repeat the bank or this batch
+                text = dedup.question_text(question.stem, question.options)
+                duplicate = (find_duplicate(subject_obj.id, question.stem, question.options)
+                             or batch_index.find(text))
+                if duplicate:
+                    duplicates[question.id] = duplicate[0]
+                batch_index.add(str(question.id), text)
+                created.append(question)
+                if operation.get('ref'):
+                    refs[str(operation['ref'])] = question
+            elif op == 'update':
+                question = questions[parse_batch_id(operation['id'], index)]
+                apply_question_edit(question, operation)
+                updated[question.id] = question
+            elif op == 'delete':
+                deleted.add(parse_batch_id(operation['id'], index))
+            else:
+                for order, key in enumerate(operation['ids'], start=1):
+                    question = refs.get(str(key))
+                    if question is None:
+                        question = questions[parse_batch_id(key, index)]
+                        updated[question.id] = question
+                    question.order = order
+
+        for question_id in deleted:
+            updated.pop(question_id, None)
+        created = [q for q in created if q.id not in deleted]
+        deleted_ids = {str(question_id) for question_id in deleted}
+        duplicates = {key: value for key, value in duplicates.items() if value not in deleted_ids}
+
+        with transaction.atomic():
+            if deleted:
+                Question.objects.filter(subject=subject_obj, id__in=deleted).delete()
+            if created:
+                Question.objects.bulk_create(created)
+            if updated:
+                now = timezone.now()
+                for question in updated.values():
+                    question.updated_at = now
+                Question.objects.bulk_update(list(updated.values()), BATCH_UPDATE_FIELDS)
+            # bulk_create / bulk_update do not send post_save
+            changed = created + list(updated.values())
+            search.index_questions(changed)
+            # Applied to the dedup index on commit, like the post_save receiver
+            for question in created:
+                dedup.question_saved(Question, question, created=True)
+            for question in updated.values():
+                dedup.question_saved(Question, question)
+
+            subject_obj.updated_at = timezone.now()
+            subject_obj.save(update_fields=['updated_at'])
+
+        ref_of = {id(q): ref for ref, q in refs.items()}
+        return JsonResponse({
+            'success': True,
+            'message': f'Đã áp dụng {len(operations)} thao tác',
+            'created': [
+                {**question_payload(q), 'ref': ref_of.get(id(q)), 'duplicate_of': duplicates.get(q.id)}
+                for q in created
+            ],
+            'updated': [question_payload(q) for q in updated.values()],
+            'deleted': [str(question_id) for question_id in deleted]
+        })
+
+    except BatchError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'operation': e.index
+        }, status=e.status)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Dữ liệu JSON không hợp lệ'
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
 @login_required
 def api_get_subjects_list(request):
     """
@@ -491,11 +717,57 @@ def api_get_subjects_history(request):
         }, status=500)
 
 
+# Fields /api/questions/ can return, with the columns each one reads
+QUESTION_LIST_FIELDS = {
+    'id': ('id',),
+    'subject_id': ('subject_id',),
+    'context_id': ('context_id',),
+    'stem': ('stem',),
+    'options': ('options',),
+    'correct_answer': ('correct_answer',),
+    'explanation': ('explanation',),
+    'bloom_level': ('reasoning_bloom', 'difficulty'),
+    'difficulty': ('difficulty',),
+    'order': ('order',),
+    'user_edited': ('user_edited',),
+    'created_at': ('created_at',),
+    'reasoning': ('reasoning',),
+}
+DEFAULT_QUESTION_FIELDS = [
+    'id', 'stem', 'options', 'correct_answer', 'explanation', 'bloom_level',
+    'difficulty', 'order', 'user_edited', 'created_at'
+]
+# Compact mode: no JSON blobs (options / reasoning), e.g. for list views
+COMPACT_QUESTION_FIELDS = ['id', 'stem', 'correct_answer', 'bloom_level', 'difficulty', 'order', 'created_at']
+DEFAULT_QUESTIONS_PAGE_SIZE = 50
+MAX_QUESTIONS_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at, question_id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(question_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """(created_at, id) of the last question of the previous page"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, question_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), uuid.UUID(question_id)
+
+
 @login_required
 def api_get_questions(request):
     """
-    API endpoint to get all questions for the current user.
+    API endpoint to get the questions of a Subject (default: the user's latest Subject).
     Questions are ordered by created_at (newest first) to show most recently created questions first.
+    
+    Query params:
+        subject_id: Subject to list
+        fields: comma-separated subset of QUESTION_LIST_FIELDS
+        compact: 1 to return COMPACT_QUESTION_FIELDS (no options / reasoning)
+        limit, cursor: keyset pagination on (created_at, id); pass the
+            returned next_cursor to get the following page. limit defaults
+            to DEFAULT_QUESTIONS_PAGE_SIZE, at most MAX_QUESTIONS_PAGE_SIZE.
     """
     try:
         subject_id = request.GET.get('subject_id')
@@ -504,39 +776,124 @@ def api_get_questions(request):
             questions = Question.objects.filter(
                 subject_id=subject_id,
                 subject__user=request.user
-            ).order_by('-created_at')  # Newest questions first
+            )
         else:
             # Nếu không truyền subject_id: lấy subject mới nhất được cập nhật của user
             latest_subj = Subject.objects.filter(user=request.user).order_by('-updated_at').first()
             if not latest_subj:
                 questions = Question.objects.none()
             else:
-                questions = Question.objects.filter(
-                    subject=latest_subj
-                ).order_by('-created_at')  # Newest questions first
+                questions = Question.objects.filter(subject=latest_subj)
+        questions = questions.order_by('-created_at', '-id')  # Newest questions first
         
+        # Field projection: only read the columns the response needs
+        if request.GET.get('fields'):
+            fields = [f.strip() for f in request.GET['fields'].split(',') if f.strip()]
+            unknown = [f for f in fields if f not in QUESTION_LIST_FIELDS]
+            if unknown:
+                return JsonResponse({'success': False, 'error': f'Trường không hợp lệ: {", ".join(unknown)}'}, status=400)
+        elif request.GET.get('compact') in ('1', 'true'):
+            fields = COMPACT_QUESTION_FIELDS
+        else:
+            fields = DEFAULT_QUESTION_FIELDS
+        columns = {'id', 'created_at'}
+        for field in fields:
+            columns.update(QUESTION_LIST_FIELDS[field])
+        if 'reasoning_bloom' in columns:
+            # Only the bloom_level key, not the whole reasoning blob
+            questions = questions.annotate(reasoning_bloom=KT('reasoning__bloom_level'))
+        rows = questions.values(*columns)
+        
+        # Keyset pagination
+        cursor = request.GET.get('cursor')
+        try:
+            limit = min(MAX_QUESTIONS_PAGE_SIZE, max(1, int(request.GET.get('limit') or DEFAULT_QUESTIONS_PAGE_SIZE)))
+            if cursor:
+                created_at, last_id = decode_cursor(cursor)
+                rows = rows.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id)
+                )
+        except (ValueError, TypeError):
+            return JsonResponse({'success': False, 'error': 'Tham số phân trang không hợp lệ'}, status=400)
+        rows = list(rows[:limit + 1])
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        
+        questions_data = []
+        last = None
+        for row in rows:
+            last = row
+            item = {}
+            for field in fields:
+                if field == 'bloom_level':
+                    difficulty = normalize_difficulty(row['difficulty'])
+                    item[field] = row['reasoning_bloom'] or difficulty_to_bloom(difficulty)
+                elif field == 'difficulty':
+                    item[field] = normalize_difficulty(row['difficulty'])
+                elif field in ('id', 'subject_id', 'context_id'):
+                    item[field] = str(row[field]) if row[field] else None
+                elif field == 'created_at':
+                    item[field] = row['created_at'].isoformat()
+                else:
+                    item[field] = row[field]
+            questions_data.append(item)
+        
+        return JsonResponse({
+            'success': True,
+            'questions': questions_data,
+            'count': len(questions_data),
+            'has_next': has_next,
+            'next_cursor': encode_cursor(last['created_at'], last['id']) if has_next else None
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False, 
+            'error': str(e)
+        }, status=500)
+
+
+@login_required
+def api_search_questions(request):
+    """
+    Full-text search over the current user's questions (stem, options,
+    explanation, Subject topic), best match first.
+    Query params: q, subject_id (optional), page (1-based), page_size (max 100).
+    """
+    try:
+        text = request.GET.get('q', '').strip()
+        if not text:
+            return JsonResponse({'success': False, 'error': 'Thiếu từ khóa tìm kiếm'}, status=400)
+        subject_id = request.GET.get('subject_id') or None
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+            page_size = min(100, max(1, int(request.GET.get('page_size', 20))))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Tham số phân trang không hợp lệ'}, status=400)
+        
+        hits, total = search_questions(
+            request.user, text, subject_id=subject_id,
+            limit=page_size, offset=(page - 1) * page_size
+        )
+        questions = Question.objects.in_bulk([qid for qid, _ in hits])
         questions_data = []
-        for q in questions:
-            difficulty = normalize_difficulty(getattr(q, 'difficulty', 'medium'))
-            bloom = q.reasoning.get('bloom_level') if isinstance(q.reasoning, dict) else None
-            bloom = bloom or difficulty_to_bloom(difficulty)
+        for qid, score in hits:
+            q = questions.get(uuid.UUID(qid))
+            if q is None:
+                continue
             questions_data.append({
-                'id': str(q.id),
-                'stem': q.stem,
-                'options': q.options,
-                'correct_answer': q.correct_answer,
-                'explanation': q.explanation,
-                'bloom_level': bloom,
-                'difficulty': difficulty,
-                'order': q.order,
-                'user_edited': q.user_edited,
-                'created_at': q.created_at.isoformat()
+                **question_payload(q),
+                'subject_id': str(q.subject_id),
+                'score': score
             })
         
         return JsonResponse({
             'success': True,
             'questions': questions_data,
-            'count': len(questions_data)
+            'count': total,
+            'page': page,
+            'page_size': page_size,
+            'has_next': page * page_size < total
         })
         
     except Exception as e:
@@ -602,6 +959,130 @@ def api_delete_subject(request, subject_id):
             'error': str(e)
         }, status=500)
 
+@login_required
+@require_http_methods(["GET"])
+def api_export_subject(request, subject_id):
+    """
+    API endpoint to download all questions of a subject.
+
+    Query params:
+        format: csv | jsonl | json | xlsx | docx | pdf (default: csv)
+
+    Rows are streamed from the database in chunks, so large subjects do not
+    have to fit in memory; DOCX and PDF still build the whole document in
+    memory before it is sent.
+    """
+    fmt = request.GET.get('format', 'csv').lower()
+    if fmt not in export.EXPORT_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'error': f'Định dạng không hỗ trợ: {fmt}'
+        }, status=400)
+
+    try:
+        subject = Subject.objects.get(id=subject_id, user=request.user)
+    except Subject.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Không tìm thấy môn học'
+        }, status=404)
+
+    content_type, extension = export.EXPORT_FORMATS[fmt]
+    filename = f'questions-{subject.id}.{extension}'
+    try:
+        if fmt in export.STREAMED_FORMATS:
+            response = StreamingHttpResponse(export.stream_text(subject, fmt), content_type=content_type)
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        return FileResponse(
+            export.write_export_file(subject, fmt),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type
+        )
+    except ImportError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Thiếu thư viện để xuất file: {e.name or e}'
+        }, status=500)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@login_required
+@require_POST
+def api_import_questions(request):
+    """
+    API endpoint to bulk import questions from an existing bank.
+
+    Multipart form:
+        file: Moodle XML, GIFT, IMS QTI (XML or zip package) or CSV
+        format: moodle | gift | qti | csv (default: detected from the file)
+        subject_id / subject: target subject (default: a new subject named after the file)
+        difficulty: default difficulty for questions that do not set one
+    """
+    try:
+        if 'file' not in request.FILES:
+            return JsonResponse({'success': False, 'error': 'Không có file'}, status=400)
+        file_obj = request.FILES['file']
+
+        fmt = request.POST.get('format', '').lower()
+        try:
+            fmt = fmt or importers.detect_format(file_obj.name, file_obj)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        if fmt not in importers.IMPORT_FORMATS:
+            return JsonResponse({
+                'success': False,
+                'error': f'Định dạng không hỗ trợ: {fmt}'
+            }, status=400)
+
+        try:
+            subject_obj = importers.resolve_subject(
+                request.user,
+                subject_id=request.POST.get('subject_id') or None,
+                subject_name=request.POST.get('subject', '').strip(),
+                filename=file_obj.name
+            )
+        except (Subject.DoesNotExist, ValueError, ValidationError):
+            return JsonResponse({
+                'success': False,
+                'error': 'Không tìm thấy môn học'
+            }, status=404)
+
+        difficulty = normalize_difficulty(request.POST.get('difficulty', 'medium'))
+        result = importers.import_questions(
+            subject_obj, file_obj, fmt,
+            difficulty=difficulty,
+            bloom_level=difficulty_to_bloom(difficulty)
+        )
+
+        return JsonResponse({
+            'success': True,
+            'message': f"Đã nhập {result['imported']} câu hỏi",
+            **result
+        })
+
+    except ET.ParseError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'File XML không hợp lệ: {e}'
+        }, status=400)
+    except UnicodeDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'File phải được mã hóa UTF-8'
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
 def extract_text_from_sourcefile(sf: SourceFile) -> str:
     """
     Extract text from SourceFile based on file_type.
@@ -614,7 +1095,9 @@ def extract_text_from_sourcefile(sf: SourceFile) -> str:
     ext = sf.file_type
 
     try:
+        # Parsers are imported on first use: they are only needed here
         if ext == 'pdf':
+            import PyPDF2
             text_parts = []
             with open(path, 'rb') as f:
                 reader = PyPDF2.PdfReader(f)
@@ -627,6 +1110,7 @@ def extract_text_from_sourcefile(sf: SourceFile) -> str:
             return result
 
         if ext == 'docx':
+            import docx
             doc = docx.Document(path)
             result = '\n'.join(p.text for p in doc.paragraphs)
             if not result.strip():
@@ -634,6 +1118,7 @@ def extract_text_from_sourcefile(sf: SourceFile) -> str:
             return result
 
         if ext == 'pptx':
+            import pptx
             prs = pptx.Presentation(path)
             texts = []
             for slide in prs.slides:
@@ -669,11 +1154,155 @@ def extract_text_from_sourcefile(sf: SourceFile) -> str:
     except Exception as e:
         raise ValueError(f"Lỗi khi trích xuất văn bản từ file: {str(e)}")
 
+def question_fields_from_mcq_item(mcq_item, bloom_level: str, difficulty: str) -> dict:
+    """
+    Normalize an MCQItem from the generation graph into Question field values.
+    Returns stem/options/correct_answer/explanation/reasoning/review fields
+    plus 'context_index' (the index of the source context in the run).
+    """
+    mcq_obj = mcq_item.get('mcq') if isinstance(mcq_item, dict) else getattr(mcq_item, 'mcq', mcq_item)
+    if isinstance(mcq_obj, dict):
+        q_data = mcq_obj.get('question', mcq_obj)
+    else:
+        q_data = getattr(mcq_obj, 'question', mcq_obj)
+
+    # Normalize question payload
+    if hasattr(q_data, 'model_dump'):
+        q_data = q_data.model_dump()
+    elif hasattr(q_data, 'dict'):
+        q_data = q_data.dict()
+    elif hasattr(q_data, '__dict__'):
+        q_data = {k: v for k, v in q_data.__dict__.items() if not k.startswith('_')}
+    elif not isinstance(q_data, dict):
+        q_data = {}
+
+    stem = q_data.get('stem', '')
+    options_data = q_data.get('options', {})
+    if isinstance(options_data, dict):
+        options_list = options_data.get('options', [])
+    else:
+        options_list = options_data or []
+
+    correct_answer = q_data.get('correct_answer', '')
+    normalized_options = []
+    for opt in options_list:
+        if isinstance(opt, dict):
+            opt_id = opt.get('id')
+            opt_text = opt.get('text', '')
+            is_correct_flag = opt.get('is_correct')
+        else:
+            opt_id = getattr(opt, 'id', None)
+            opt_text = getattr(opt, 'text', '')
+            is_correct_flag = getattr(opt, 'is_correct', None)
+        normalized_options.append({
+            "id": opt_id,
+            "text": opt_text,
+            "is_correct": is_correct_flag if is_correct_flag is not None else str(opt_id).lower() == str(correct_answer).lower()
+        })
+
+    reasoning = q_data.get('reasoning', {}) or {}
+    if not isinstance(reasoning, dict):
+        reasoning = {}
+    reasoning = {
+        **reasoning,
+        "bloom_level": bloom_level,
+        "difficulty": difficulty
+    }
+    explanation = reasoning.get('answer_justification', q_data.get('explanation', ''))
+
+    review_feedback = ''
+    suggestions = []
+    is_approved = False
+    context_index = None
+    if isinstance(mcq_item, dict):
+        review_feedback = mcq_item.get('review', '')
+        suggestions = mcq_item.get('suggestions', [])
+        is_approved = mcq_item.get('is_approved', False)
+        context_index = mcq_item.get('context_index')
+    elif hasattr(mcq_item, 'context_index'):
+        review_feedback = getattr(mcq_item, 'review', '')
+        suggestions = getattr(mcq_item, 'suggestions', [])
+        is_approved = getattr(mcq_item, 'is_approved', False)
+        context_index = getattr(mcq_item, 'context_index')
+
+    return {
+        'stem': stem,
+        'difficulty': difficulty,
+        'options': normalized_options,
+        'correct_answer': correct_answer,
+        'explanation': explanation,
+        'reasoning': reasoning,
+        'review_feedback': review_feedback,
+        'suggestions': suggestions,
+        'is_approved': is_approved,
+        'context_index': context_index,
+    }
+
+
+def question_payload(question: Question, bloom_level: str = '') -> dict:
+    """Serialize a Question the way the generation endpoints return it."""
+    return {
+        'id': str(question.id),
+        'stem': question.stem,
+        'options': question.options,
+        'correct_answer': question.correct_answer,
+        'explanation': question.explanation,
+        'bloom_level': question.reasoning.get('bloom_level', bloom_level),
+        'difficulty': question.difficulty,
+        'order': question.order,
+        'user_edited': question.user_edited,
+        'duplicate_of': question.reasoning.get('duplicate_of')
+    }
+
+
+# Batched generation: larger batches make one response too long to parse reliably
+MAX_QUESTIONS_PER_CONTEXT = 10
+MAX_CONTEXTS_PER_CALL = 10
+
+
+def batch_size_param(data: dict, key: str, maximum: int) -> int:
+    """Positive integer field of the request (default 1), clamped to `maximum`"""
+    value = data.get(key)
+    if value is None or value == '':
+        return 1
+    try:
+        if isinstance(value, bool) or int(value) != float(value):
+            raise ValueError
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'{key} phải là số nguyên dương')
+    if value < 1:
+        raise ValueError(f'{key} phải là số nguyên dương')
+    return min(value, maximum)
+
+
+def number_param(data: dict, key: str, cast=float, minimum: float = 0, maximum: float = None):
+    """Numeric field of the request in [minimum, maximum]; None when missing or empty"""
+    value = data.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = float(value)
+        if number != number or number in (float('inf'), float('-inf')):
+            raise ValueError
+        if cast is int and not number.is_integer():
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} phải là {"số nguyên" if cast is int else "số"}')
+    if number < minimum or (maximum is not None and number > maximum):
+        bounds = f'từ {minimum:g} đến {maximum:g}' if maximum is not None else f'>= {minimum:g}'
+        raise ValueError(f'{key} phải {bounds}')
+    return cast(number)
+
+
 @login_required
 def api_generate_mcq(request):
     """
     API endpoint to generate a new MCQ.
     """
+    credit_reserved = False
     try:
         data = json.loads(request.body)
         source_type = data.get('source_type', 'text')
@@ -692,6 +1321,38 @@ def api_generate_mcq(request):
         max_iterations = 2
         max_workers = 1
         delay_seconds = 5.0
+        # Batched MCQ generation: fewer, larger calls under strict RPM limits
+        try:
+            questions_per_context = batch_size_param(data, 'questions_per_context', MAX_QUESTIONS_PER_CONTEXT)
+            contexts_per_call = batch_size_param(data, 'contexts_per_call', MAX_CONTEXTS_PER_CALL)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        # Fused review-and-refine: one call per item per iteration instead of two
+        fused_review = bool(data.get('fused_review', False))
+        # Speculative MCQ generation: off / approved / produced
+        speculative_mcqs = data.get('speculative_mcqs', 'off')
+        if speculative_mcqs not in ('off', 'approved', 'produced'):
+            speculative_mcqs = 'off'
+        try:
+            # Run budget: bound the request's wall-clock time / LLM usage (0 = unbounded)
+            deadline_seconds = number_param(data, 'deadline_seconds') or None
+            max_llm_calls = number_param(data, 'max_llm_calls', int) or None
+            max_tokens = number_param(data, 'max_tokens', int) or None
+            # Redundant contexts: TF-IDF cosine threshold (0 = off)
+            diversity_threshold = number_param(data, 'diversity_threshold', maximum=1)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        if diversity_threshold is None:
+            diversity_threshold = 0.8
+        on_budget_exhausted = 'drop' if data.get('on_budget_exhausted') == 'drop' else 'approve'
+        # Redundant contexts: drop / regenerate
+        redundant_contexts = 'regenerate' if data.get('redundant_contexts') == 'regenerate' else 'drop'
+        # Items whose refinement stopped changing them leave the loop early
+        stop_converged = bool(data.get('stop_converged', True))
+        # Near-duplicates of questions already in the Subject: flag / skip / off
+        duplicates = data.get('duplicates', 'flag')
+        if duplicates not in ('flag', 'skip', 'off'):
+            duplicates = 'flag'
         sf = None
 
         # If file source, try to extract text from file if not already stored
@@ -721,6 +1382,45 @@ def api_generate_mcq(request):
         if not text.strip():
             return JsonResponse({'success': False, 'error': 'Thiếu nội dung văn bản để tạo câu hỏi'}, status=400)
 
+        # Model per graph node (e.g. reviews on a lighter model), with fallbacks
+        # for rate limits; the graph stack is loaded on first use
+        from graph.g import run_mcq_generation, normalize_model_routes, normalize_generation_config
+        model_routes = data.get('model_routes') or {}
+        try:
+            if not isinstance(model_routes, dict):
+                raise ValueError('cần dạng {node: model}')
+            model_routes = normalize_model_routes({**settings.LLM_MODEL_ROUTES, **model_routes})
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': f'model_routes không hợp lệ: {e}'}, status=400)
+        # Thinking budget / output cap / temperature per node: a named profile
+        # plus per-node overrides. Generating into an existing Subject reuses
+        # the settings stored with it unless the request sets its own.
+        stored_config = {}
+        if data.get('subject_id') and not data.get('generation_profile'):
+            try:
+                stored_config = Subject.objects.filter(
+                    id=data['subject_id'], user=request.user
+                ).values_list('config', flat=True).first() or {}
+            except ValidationError:
+                stored_config = {}
+        generation_profile = (data.get('generation_profile') or stored_config.get('generation_profile')
+                              or settings.LLM_GENERATION_PROFILE)
+        try:
+            if not data.get('generation_profile') and not data.get('generation_config') and stored_config.get('generation_config'):
+                generation_config = normalize_generation_config(stored_config['generation_config'])
+            else:
+                generation_config = normalize_generation_config(
+                    generation_config_for(generation_profile, data.get('generation_config'))
+                )
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': f'generation_config không hợp lệ: {e}'}, status=400)
+
+        # Reserve 1 credit per generation request (not per question);
+        # it is refunded below if the generation produces nothing
+        if not request.user.use_credits(1):
+            return JsonResponse({'success': False, 'error': 'Không đủ credits để tạo câu hỏi'}, status=402)
+        credit_reserved = True
+
         # Run generation with thread_id
         thread_id = str(uuid.uuid4())
         result = run_mcq_generation(
@@ -734,11 +1434,33 @@ def api_generate_mcq(request):
             model=model,
             max_iterations=max_iterations,
             max_workers=max_workers,
-            delay_seconds=delay_seconds
+            delay_seconds=delay_seconds,
+            questions_per_context=questions_per_context,
+            contexts_per_call=contexts_per_call,
+            fused_review=fused_review,
+            speculative_mcqs=speculative_mcqs,
+            deadline_seconds=deadline_seconds,
+            max_llm_calls=max_llm_calls,
+            max_tokens=max_tokens,
+            on_budget_exhausted=on_budget_exhausted,
+            diversity_threshold=diversity_threshold,
+            redundant_contexts=redundant_contexts,
+            model_routes=model_routes,
+            generation_config=generation_config,
+            stop_converged=stop_converged
         )
 
         contexts_result = result.get('contexts', [])
         mcqs = result.get('mcqs', [])
+        if not contexts_result:
+            # gen_context failed after retries (or the run budget was spent)
+            request.user.refund_credits(1)
+            credit_reserved = False
+            return JsonResponse({
+                'success': False,
+                'error': 'Không tạo được ngữ cảnh nào từ mô hình, vui lòng thử lại sau',
+                'budget': result.get('budget', {})
+            }, status=502)
 
         # Get or create Subject
         subject_id = data.get('subject_id')
@@ -777,9 +1499,28 @@ def api_generate_mcq(request):
                 iteration_count=result.get('mcq_iteration', 0),
                 config={
                     "model": model,
+                    "model_routes": model_routes,
+                    "generation_profile": generation_profile,
+                    "generation_config": generation_config,
                     "max_iterations": max_iterations,
                     "max_workers": max_workers,
                     "delay_seconds": delay_seconds,
+                    "questions_per_context": questions_per_context,
+                    "contexts_per_call": contexts_per_call,
+                    "fused_review": fused_review,
+                    "speculative_mcqs": speculative_mcqs,
+                    "speculation": result.get('speculation', {}),
+                    "deadline_seconds": deadline_seconds,
+                    "max_llm_calls": max_llm_calls,
+                    "max_tokens": max_tokens,
+                    "on_budget_exhausted": on_budget_exhausted,
+                    "budget": result.get('budget', {}),
+                    "diversity_threshold": diversity_threshold,
+                    "redundant_contexts": redundant_contexts,
+                    "diversity": result.get('diversity', {}),
+                    "validation": result.get('validation', {}),
+                    "stop_converged": stop_converged,
+                    "convergence": result.get('convergence', {}),
                     "difficulty": difficulty,
                     "bloom_level": bloom_level
                 },
@@ -789,7 +1530,7 @@ def api_generate_mcq(request):
         # Save contexts to DB
         context_objs = []
         for idx, ctx_item in enumerate(contexts_result):
-            ctx_data = ctx_item if isinstance(ctx_item, dict) else getattr(ctx_item, '__dict__', {}) or {}
+            ctx_data = ctx_item if isinstance(ctx_item, dict) else asdict(ctx_item)
             context_objs.append(
                 Context.objects.create(
                     subject=subject_obj,
@@ -804,99 +1545,38 @@ def api_generate_mcq(request):
             )
         context_map = {idx: ctx for idx, ctx in enumerate(context_objs)}
 
-        # Save questions
+        # Save questions, checking each against the Subject's bank and the
+        # questions saved before it for near-duplicates
         questions_payload = []
-        for idx, mcq_item in enumerate(mcqs):
-            mcq_obj = mcq_item.get('mcq') if isinstance(mcq_item, dict) else getattr(mcq_item, 'mcq', mcq_item)
-            if isinstance(mcq_obj, dict):
-                q_data = mcq_obj.get('question', mcq_obj)
-            else:
-                q_data = getattr(mcq_obj, 'question', mcq_obj)
-
-            # Normalize question payload
-            if hasattr(q_data, 'model_dump'):
-                q_data = q_data.model_dump()
-            elif hasattr(q_data, 'dict'):
-                q_data = q_data.dict()
-            elif hasattr(q_data, '__dict__'):
-                q_data = {k: v for k, v in q_data.__dict__.items() if not k.startswith('_')}
-            elif not isinstance(q_data, dict):
-                q_data = {}
-
-            stem = q_data.get('stem', '')
-            options_data = q_data.get('options', {})
-            if isinstance(options_data, dict):
-                options_list = options_data.get('options', [])
-            else:
-                options_list = options_data or []
-
-            correct_answer = q_data.get('correct_answer', '')
-            normalized_options = []
-            for opt in options_list:
-                if isinstance(opt, dict):
-                    opt_id = opt.get('id')
-                    opt_text = opt.get('text', '')
-                    is_correct_flag = opt.get('is_correct')
-                else:
-                    opt_id = getattr(opt, 'id', None)
-                    opt_text = getattr(opt, 'text', '')
-                    is_correct_flag = getattr(opt, 'is_correct', None)
-                normalized_options.append({
-                    "id": opt_id,
-                    "text": opt_text,
-                    "is_correct": is_correct_flag if is_correct_flag is not None else str(opt_id).lower() == str(correct_answer).lower()
-                })
-
-            reasoning = q_data.get('reasoning', {}) or {}
-            if not isinstance(reasoning, dict):
-                reasoning = {}
-            reasoning = {
-                **reasoning,
-                "bloom_level": bloom_level,
-                "difficulty": difficulty
-            }
-            explanation = reasoning.get('answer_justification', q_data.get('explanation', ''))
-
-            review_feedback = ''
-            suggestions = []
-            is_approved = False
-            context_ref = None
-            if isinstance(mcq_item, dict):
-                review_feedback = mcq_item.get('review', '')
-                suggestions = mcq_item.get('suggestions', [])
-                is_approved = mcq_item.get('is_approved', False)
-                context_ref = context_map.get(mcq_item.get('context_index'))
-            elif hasattr(mcq_item, 'context_index'):
-                context_ref = context_map.get(getattr(mcq_item, 'context_index'))
-
+        duplicates_skipped = 0
+        if duplicates != 'off':
+            bank_index, run_index = dedup.index_for_subject(subject_obj.id), dedup.NearDuplicateIndex()
+        for mcq_item in mcqs:
+            fields = question_fields_from_mcq_item(mcq_item, bloom_level, difficulty)
+            context_index = fields.pop('context_index')
+            if duplicates != 'off':
+                text = dedup.question_text(fields['stem'], fields['options'])
+                duplicate = bank_index.find(text) or run_index.find(text)
+                if duplicate and duplicates == 'skip':
+                    duplicates_skipped += 1
+                    continue
+                if duplicate:
+                    fields['reasoning'] = {
+                        **fields['reasoning'],
+                        'duplicate_of': duplicate[0],
+                        'duplicate_similarity': round(duplicate[1], 3)
+                    }
             q_instance = Question.objects.create(
                 subject=subject_obj,
-                context=context_ref,
+                context=context_map.get(context_index),
                 question_type='mcq',
-                stem=stem,
-                difficulty=difficulty,
-                options=normalized_options,
-                correct_answer=correct_answer,
-                explanation=explanation,
-                reasoning=reasoning,
-                review_feedback=review_feedback,
-                suggestions=suggestions,
-                is_approved=is_approved,
                 user_edited=False,
-                order=idx
+                order=len(questions_payload),
+                **fields
             )
-
-            questions_payload.append({
-                'id': str(q_instance.id),
-                'stem': q_instance.stem,
-                'options': q_instance.options,
-                'correct_answer': q_instance.correct_answer,
-                'explanation': q_instance.explanation,
-                'bloom_level': q_instance.reasoning.get('bloom_level', bloom_level),
-                'difficulty': q_instance.difficulty,
-                'order': q_instance.order,
-                'user_edited': q_instance.user_edited
-            })
+            if duplicates != 'off':
+                run_index.add(str(q_instance.id), text)
+            questions_payload.append(question_payload(q_instance, bloom_level))
 
         contexts_payload = [{
             'id': str(ctx.id),
@@ -912,19 +1592,10 @@ def api_generate_mcq(request):
             subject_obj.updated_at = timezone.now()
             subject_obj.save(update_fields=['updated_at'])
         
-        # Deduct credits from user after successful question generation
-        # Deduct 1 credit per generation request (not per question)
-        if len(mcqs) > 0:
-            # Refresh user from database to get latest credits
-            request.user.refresh_from_db()
-            # Deduct 1 credit per generation request
-            credits_deducted = request.user.use_credits(1)
-            if not credits_deducted:
-                # If not enough credits, still return success but log warning
-                # (Questions are already created, so we don't rollback)
-                pass
-            # Refresh again to get updated credits value
-            request.user.refresh_from_db()
+        # Settle the reserved credit: charged only if questions were generated
+        if not mcqs:
+            request.user.refund_credits(1)
+        credit_reserved = False
 
         return JsonResponse({
             'success': True,
@@ -932,17 +1603,203 @@ def api_generate_mcq(request):
             'subject_id': str(subject_obj.id),
             'thread_id': thread_id,
             'difficulty': difficulty,
+            'partial': result.get('budget_exhausted', False),
+            'duplicates_skipped': duplicates_skipped,
+            'diversity': result.get('diversity', {}),
+            'validation': result.get('validation', {}),
+            'convergence': result.get('convergence', {}),
             'contexts': contexts_payload,
             'questions': questions_payload,
             'user_credits': request.user.credits
         })
     except Exception as e:
+        if credit_reserved:
+            request.user.refund_credits(1)
         return JsonResponse({
             'success': False, 
             'error': str(e)
         }, status=500)
 
 
+def regenerate_from_contexts(subject_obj: Subject, contents: list[str], bloom_level: str):
+    """Run the MCQ-only graph on stored contexts with the Subject's generation config."""
+    from graph.g import run_mcq_regeneration
+    config = subject_obj.config or {}
+    return run_mcq_regeneration(
+        contexts=contents,
+        bloom_level=bloom_level,
+        subject=subject_obj.subject,
+        topic=subject_obj.topic,
+        model=config.get('model', 'gemini-2.5-flash'),
+        max_iterations=config.get('max_iterations', 2),
+        max_workers=config.get('max_workers', 1),
+        delay_seconds=config.get('delay_seconds', 5.0),
+        fused_review=config.get('fused_review', False),
+        deadline_seconds=config.get('deadline_seconds'),
+        max_llm_calls=config.get('max_llm_calls'),
+        max_tokens=config.get('max_tokens'),
+        model_routes=config.get('model_routes', settings.LLM_MODEL_ROUTES),
+        generation_config=config.get('generation_config') or generation_config_for(config.get('generation_profile', '')),
+        stop_converged=config.get('stop_converged', True)
+    )
+
+
+@login_required
+@require_POST
+def api_regenerate_question(request, question_id):
+    """
+    API endpoint to regenerate one question from its stored context.
+    Re-runs only gen_mcq → review_mcq → refine_mcqs and updates the question in place.
+    """
+    credit_reserved = False
+    try:
+        question = Question.objects.select_related('subject', 'context').get(
+            id=question_id,
+            subject__user=request.user
+        )
+        if not question.context or not question.context.content.strip():
+            return JsonResponse({
+                'success': False,
+                'error': 'Câu hỏi này không có ngữ cảnh để tạo lại'
+            }, status=400)
+
+        subject_obj = question.subject
+        difficulty = normalize_difficulty(question.difficulty)
+        bloom_level = question.reasoning.get('bloom_level') or difficulty_to_bloom(difficulty)
+
+        if not request.user.use_credits(1):
+            return JsonResponse({'success': False, 'error': 'Không đủ credits để tạo lại câu hỏi'}, status=402)
+        credit_reserved = True
+
+        result = regenerate_from_contexts(subject_obj, [question.context.content], bloom_level)
+        mcqs = result.get('mcqs', [])
+        if not mcqs:
+            request.user.refund_credits(1)
+            credit_reserved = False
+            return JsonResponse({
+                'success': False,
+                'error': 'Không tạo lại được câu hỏi, vui lòng thử lại sau'
+            }, status=502)
+
+        fields = question_fields_from_mcq_item(mcqs[0], bloom_level, difficulty)
+        fields.pop('context_index')
+        for name, value in fields.items():
+            setattr(question, name, value)
+        question.user_edited = False
+        question.original_data = {}
+        question.save()
+
+        subject_obj.updated_at = timezone.now()
+        subject_obj.save(update_fields=['updated_at'])
+
+        credit_reserved = False
+
+        return JsonResponse({
+            'success': True,
+            'message': 'Câu hỏi đã được tạo lại',
+            'question': question_payload(question, bloom_level),
+            'user_credits': request.user.credits
+        })
+
+    except Question.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Không tìm thấy câu hỏi'
+        }, status=404)
+    except Exception as e:
+        if credit_reserved:
+            request.user.refund_credits(1)
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@login_required
+@require_POST
+def api_regenerate_context(request, context_id):
+    """
+    API endpoint to regenerate the questions of one stored context.
+    AI-generated questions of the context are replaced (keeping their order);
+    questions the user edited are kept. Without any, a new question is appended.
+    """
+    credit_reserved = False
+    try:
+        context_obj = Context.objects.select_related('subject').get(
+            id=context_id,
+            subject__user=request.user
+        )
+        subject_obj = context_obj.subject
+        difficulty = normalize_difficulty(subject_obj.difficulty)
+        bloom_level = difficulty_to_bloom(difficulty)
+
+        if not request.user.use_credits(1):
+            return JsonResponse({'success': False, 'error': 'Không đủ credits để tạo lại câu hỏi'}, status=402)
+        credit_reserved = True
+
+        result = regenerate_from_contexts(subject_obj, [context_obj.content], bloom_level)
+        mcqs = result.get('mcqs', [])
+        if not mcqs:
+            request.user.refund_credits(1)
+            credit_reserved = False
+            return JsonResponse({
+                'success': False,
+                'error': 'Không tạo lại được câu hỏi, vui lòng thử lại sau'
+            }, status=502)
+
+        replaced = list(context_obj.questions.filter(user_edited=False).order_by('order'))
+        replaced_ids = [str(q.id) for q in replaced]
+        if replaced:
+            orders = [q.order for q in replaced]
+        else:
+            max_order = subject_obj.questions.aggregate(max_order=Max('order'))['max_order'] or 0
+            orders = [max_order + 1]
+        orders += [orders[-1] + i for i in range(1, len(mcqs))]
+
+        with transaction.atomic():
+            for q in replaced:
+                q.delete()
+            questions_payload = []
+            for mcq_item, order in zip(mcqs, orders):
+                fields = question_fields_from_mcq_item(mcq_item, bloom_level, difficulty)
+                fields.pop('context_index')
+                q_instance = Question.objects.create(
+                    subject=subject_obj,
+                    context=context_obj,
+                    question_type='mcq',
+                    user_edited=False,
+                    order=order,
+                    **fields
+                )
+                questions_payload.append(question_payload(q_instance, bloom_level))
+
+            subject_obj.updated_at = timezone.now()
+            subject_obj.save(update_fields=['updated_at'])
+
+        credit_reserved = False
+
+        return JsonResponse({
+            'success': True,
+            'message': 'Câu hỏi của ngữ cảnh đã được tạo lại',
+            'replaced_ids': replaced_ids,
+            'questions': questions_payload,
+            'user_credits': request.user.credits
+        })
+
+    except Context.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Không tìm thấy ngữ cảnh'
+        }, status=404)
+    except Exception as e:
+        if credit_reserved:
+            request.user.refund_credits(1)
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
 @login_required
 @require_POST
 def api_upload_source(request):
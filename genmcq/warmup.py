@@ -0,0 +1,31 @@
+"""
+Worker warm-up, run from the WSGI entry point (mcq_gen2025/wsgi.py) when
+WARMUP_ON_START is set.
+
+Management commands and tests never import wsgi.py, so they keep the lazy
+imports; web workers pay the one-off costs before accepting traffic instead
+of on their first generation request. Everything done here is safe to
+inherit across fork (gunicorn --preload): modules and compiled graphs are
+plain objects, and graph.g rebuilds the GenAI client in each child.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+
+def warm_up_worker():
+    if not getattr(settings, 'WARMUP_ON_START', False):
+        return
+    started = time.perf_counter()
+
+    # Import every view module now rather than on the first request
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+    from graph.g import warm_up, warm_up_connection
+    timings = warm_up(connect=False)
+
+    # Network round trips must not hold up worker boot
+    threading.Thread(target=warm_up_connection, daemon=True).start()
+    print(f"Worker warm-up done in {time.perf_counter() - started:.2f}s {timings}")
@@ -0,0 +1,221 @@
+import threading
+import time
+from typing import Callable, Optional, Sequence
+
+from .retry import (
+    call_with_retry, retry_after_seconds, RetryPolicy, DEFAULT_RETRY_POLICY,
+    SchemaParseError, LLMCallError, ModelRateLimit, RATE_LIMIT, CIRCUIT_OPEN
+)
+
+# Failures that move a call on to the next model of its fallback chain
+FAILOVER_ERRORS = {RATE_LIMIT, CIRCUIT_OPEN}
+
+
+class BudgetExceeded(Exception):
+    """Raised when a run has no wall-clock time, tokens or LLM calls left."""
+
+
+class RunBudget:
+    """
+    Wall-clock / token / LLM-call budget for one generation run, plus the
+    run's retry budget.
+
+    Budgets are registered per run_id so that every node (and every worker
+    thread of a node) of the same run shares one account. A limit of None
+    means unbounded; usage is tracked either way.
+    """
+    _runs: dict = {}
+    _lock = threading.Lock()
+
+    def __init__(self, deadline_seconds: Optional[float] = None,
+                 max_llm_calls: Optional[int] = None,
+                 max_tokens: Optional[int] = None,
+                 max_retries: Optional[int] = None):
+        self.deadline_seconds = deadline_seconds
+        self.max_llm_calls = max_llm_calls
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.started_at = time.monotonic()
+        self.calls = 0
+        self.tokens = 0
+        self.retries = 0
+        self.calls_by_model = {}
+        self.exhausted_reason = ""
+        self._usage_lock = threading.Lock()
+
+    @classmethod
+    def start(cls, run_id: str, **limits) -> "RunBudget":
+        budget = cls(**limits)
+        with cls._lock:
+            cls._runs[run_id] = budget
+        return budget
+
+    @classmethod
+    def for_run(cls, run_id: str) -> "RunBudget":
+        """Budget of a run; unknown or closed runs get a throwaway unbounded budget"""
+        with cls._lock:
+            budget = cls._runs.get(run_id)
+        return budget if budget is not None else cls()
+
+    @classmethod
+    def close(cls, run_id: str) -> dict:
+        with cls._lock:
+            budget = cls._runs.pop(run_id, None)
+        return budget.usage() if budget else {}
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.deadline_seconds is None:
+            return None
+        return max(0.0, self.deadline_seconds - self.elapsed())
+
+    @property
+    def exhausted(self) -> bool:
+        if self.exhausted_reason:
+            return True
+        if self.deadline_seconds is not None and self.elapsed() >= self.deadline_seconds:
+            self.exhausted_reason = "deadline"
+        elif self.max_llm_calls is not None and self.calls >= self.max_llm_calls:
+            self.exhausted_reason = "llm_calls"
+        elif self.max_tokens is not None and self.tokens >= self.max_tokens:
+            self.exhausted_reason = "tokens"
+        return bool(self.exhausted_reason)
+
+    def check(self):
+        """Raise BudgetExceeded if no further LLM call may start"""
+        if self.exhausted:
+            raise BudgetExceeded(f"run budget exhausted ({self.exhausted_reason})")
+
+    def reserve_call(self, model: str = ""):
+        """Check the budget and count one LLM call atomically"""
+        with self._usage_lock:
+            self.check()
+            self.calls += 1
+            if model:
+                self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+
+    def reserve_retry(self) -> bool:
+        """Charge one retry to the run; False when the retry budget is spent"""
+        with self._usage_lock:
+            if self.max_retries is not None and self.retries >= self.max_retries:
+                return False
+            self.retries += 1
+            return True
+
+    def record(self, response):
+        usage = getattr(response, 'usage_metadata', None)
+        total = getattr(usage, 'total_token_count', None) or 0
+        with self._usage_lock:
+            self.tokens += total
+
+    def usage(self) -> dict:
+        return {
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "llm_calls": self.calls,
+            "llm_calls_by_model": dict(self.calls_by_model),
+            "tokens": self.tokens,
+            "retries": self.retries,
+            "deadline_seconds": self.deadline_seconds,
+            "max_llm_calls": self.max_llm_calls,
+            "max_tokens": self.max_tokens,
+            "max_retries": self.max_retries,
+            "exhausted": self.exhausted,
+            "exhausted_reason": self.exhausted_reason,
+        }
+
+
+class _BudgetedModels:
+    def __init__(self, models, budget: RunBudget, retry_policy: RetryPolicy,
+                 pacer: Optional[Callable[[float], None]], fallbacks: Sequence[str],
+                 generation_config: dict):
+        self._models = models
+        self._budget = budget
+        self._retry_policy = retry_policy
+        self._pacer = pacer
+        self._fallbacks = list(fallbacks)
+        self._generation_config = generation_config
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        chain = [model] + [m for m in self._fallbacks if m != model]
+        for position, candidate in enumerate(chain):
+            fallback = chain[position + 1] if position + 1 < len(chain) else None
+            rate_limit = ModelRateLimit.for_model(candidate)
+            if fallback and rate_limit.backing_off:
+                print(f"LLM {candidate} is rate-limited, using {fallback}")
+                continue
+            try:
+                return self._generate(candidate, contents, config, failover=fallback is not None, **kwargs)
+            except LLMCallError as e:
+                if not fallback or e.kind not in FAILOVER_ERRORS:
+                    raise
+                if e.kind == RATE_LIMIT:
+                    # Send the model's other callers down the chain too
+                    rate_limit.hold(retry_after_seconds(e.__cause__) or self._retry_policy.base_delay)
+                print(f"LLM {candidate} {e.kind}, falling back to {fallback}")
+
+    def _generate(self, model, contents, config, failover: bool, **kwargs):
+        config = {**self._generation_config, **(config or {})}
+        rate_limit = ModelRateLimit.for_model(model)
+
+        def send():
+            rate_limit.acquire()
+            self._budget.reserve_call(model)
+            remaining = self._budget.remaining_seconds()
+            if remaining is not None:
+                # Bound the in-flight request by the time left in the run
+                http_options = dict(config.get("http_options") or {})
+                http_options["timeout"] = max(1, int(remaining * 1000))
+                config["http_options"] = http_options
+            response = self._models.generate_content(
+                model=model, contents=contents, config=config, **kwargs
+            )
+            parsed_response = response[0] if isinstance(response, tuple) else response
+            self._budget.record(parsed_response)
+            if config.get("response_schema") is not None and getattr(parsed_response, 'parsed', None) is None:
+                raise SchemaParseError(f"response did not match {getattr(config['response_schema'], '__name__', 'schema')}")
+            return response
+
+        try:
+            return call_with_retry(
+                send,
+                model=model,
+                budget=self._budget,
+                policy=self._retry_policy,
+                pacer=self._pacer or rate_limit.backoff,
+                failover=failover
+            )
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            if self._budget.exhausted:
+                raise BudgetExceeded(f"call cancelled: {e}") from e
+            raise
+
+
+class BudgetedClient:
+    """
+    Shared call wrapper over a GenAI client, used by every node.
+
+    Each generate_content call is charged to a RunBudget, bounded by the
+    run's deadline, validated against its response_schema and retried with
+    exponential backoff + jitter on classified errors (see graph/retry.py).
+    Requests are paced per model (ModelRateLimit); when the requested model
+    is rate-limited or its circuit is open, the call moves on to the next of
+    `fallbacks`. `generation_config` entries (temperature, output cap,
+    thinking) are added to every request's config. Exposes the same
+    `client.models.generate_content` surface used by graph/gen.py,
+    graph/review.py and graph/refine.py.
+    """
+    def __init__(self, client, budget: RunBudget,
+                 retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+                 pacer: Optional[Callable[[float], None]] = None,
+                 fallbacks: Sequence[str] = (),
+                 generation_config: Optional[dict] = None):
+        self._client = client
+        self.models = _BudgetedModels(client.models, budget, retry_policy, pacer, fallbacks,
+                                      generation_config or {})
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
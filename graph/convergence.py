@@ -0,0 +1,55 @@
+"""
+Convergence checks for the review / refine loops.
+
+An item has converged when refining it no longer changes it: the refined
+version equals its input up to whitespace, or a review repeats the
+suggestions the previous refinement was asked to address. Reviewing and
+refining such an item again only spends calls until max_iterations.
+
+The comparison is exact on purpose: a one-word edit to a stem or a new
+answer key is a real fix, however similar the texts look.
+"""
+import hashlib
+import re
+
+from .diversity import tokenize
+from .gen import MCQ
+
+_SPACE = re.compile(r'\s+')
+# Compared verbatim: relabelling an option or moving the key changes the MCQ
+_EXACT_FIELDS = {'id', 'correct_answer'}
+
+
+def suggestions_key(suggestions: list[str]) -> str:
+    """Hash of a review's suggestions, insensitive to case, spacing and order; "" for none"""
+    normalized = sorted(' '.join(tokenize(s)) for s in suggestions or [])
+    if not normalized:
+        return ""
+    return hashlib.sha1('\n'.join(normalized).encode('utf-8')).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    return _SPACE.sub(' ', text or '').strip()
+
+
+def _normalized(value, key: str = ''):
+    if isinstance(value, dict):
+        return {k: _normalized(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalized(v, key) for v in value]
+    if isinstance(value, str) and key not in _EXACT_FIELDS:
+        return normalize_text(value)
+    return value
+
+
+def context_unchanged(before: str, after: str) -> bool:
+    """True when a refined context differs from its input only in whitespace"""
+    return normalize_text(before) == normalize_text(after)
+
+
+def mcq_unchanged(before: MCQ, after: MCQ) -> bool:
+    """
+    True when a refined MCQ equals its input: texts up to whitespace,
+    option ids and correct_answer exactly
+    """
+    return _normalized(before.model_dump()) == _normalized(after.model_dump())
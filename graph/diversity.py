@@ -0,0 +1,74 @@
+"""
+Local redundancy check for generated contexts.
+
+Contexts are turned into L2-normalised TF-IDF vectors (smoothed IDF over the
+batch itself) and compared with cosine similarity. With NumPy available the
+whole similarity matrix is a single matrix product; otherwise a sparse
+pure-Python dot product is used, which is fine for the handful of contexts a
+run produces.
+"""
+import math
+import re
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+DEFAULT_THRESHOLD = 0.8
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall((text or '').lower())
+
+
+def tfidf_vectors(texts: list[str]) -> tuple[list[str], list[dict]]:
+    """Vocabulary and one {term: weight} L2-normalised vector per text"""
+    counts = [Counter(tokenize(t)) for t in texts]
+    df = Counter(term for c in counts for term in c)
+    n = len(texts)
+    idf = {term: math.log((1 + n) / (1 + d)) + 1 for term, d in df.items()}
+    vectors = []
+    for c in counts:
+        vec = {term: (1 + math.log(tf)) * idf[term] for term, tf in c.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        vectors.append({term: w / norm for term, w in vec.items()})
+    return sorted(df), vectors
+
+
+def similarity_matrix(texts: list[str]) -> list[list[float]]:
+    """Pairwise cosine similarity of the texts' TF-IDF vectors"""
+    vocabulary, vectors = tfidf_vectors(texts)
+    if np is not None and vectors:
+        column = {term: j for j, term in enumerate(vocabulary)}
+        X = np.zeros((len(vectors), len(vocabulary)))
+        for i, vec in enumerate(vectors):
+            for term, w in vec.items():
+                X[i, column[term]] = w
+        return (X @ X.T).tolist()
+    return [
+        [sum(w * b.get(term, 0.0) for term, w in a.items()) for b in vectors]
+        for a in vectors
+    ]
+
+
+def redundant_indices(texts: list[str], threshold: float = DEFAULT_THRESHOLD,
+                      keep: int = 0) -> list[int]:
+    """
+    Indices of texts that repeat an earlier text.
+
+    Texts are scanned in order; one is redundant when its cosine similarity
+    to any text kept so far reaches `threshold`. The first `keep` texts are
+    always kept (e.g. contexts that already passed the check).
+    """
+    sims = similarity_matrix(texts)
+    kept, redundant = list(range(min(keep, len(texts)))), []
+    for i in range(len(kept), len(texts)):
+        if any(sims[i][j] >= threshold for j in kept):
+            redundant.append(i)
+        else:
+            kept.append(i)
+    return redundant
@@ -0,0 +1,205 @@
+"""
+Offline stand-in for the GenAI client, used to benchmark generation profiles
+(python manage.py bench_generation_profiles) without calling the API.
+
+Every response_schema of the standard, fused and batched graphs gets a
+canned, schema-valid answer, with as many questions as the prompt asks for.
+
+Token usage and latency follow the request's generation config: thinking is
+spent up to thinking_budget, thinking and answer share max_output_tokens (a
+too small cap truncates the answer, which then fails schema validation and is
+retried), and the time taken grows with the tokens produced (summed up in
+stats["latency_seconds"]).
+
+Generated items carry a quality score that grows with the thinking spent on
+them; a review approves an item with that probability.
+"""
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from .gen import (
+    Context, Contexts, MCQ, MCQList, ContextMCQs, BatchMCQs, Question, Options, option, Reason
+)
+from .refine import RefinedContext, RefinedMCQ
+from .review import Review, ReviewedContext, ReviewedMCQ
+
+# Answer tokens per schema (per item for lists)
+OUTPUT_TOKENS = {
+    "Contexts": 250,
+    "MCQ": 600,
+    "MCQList": 600,
+    "BatchMCQs": 600,
+    "Review": 150,
+    "ReviewedContext": 400,
+    "ReviewedMCQ": 750,
+    "RefinedContext": 300,
+    "RefinedMCQ": 600,
+}
+# Thinking the model would spend when unbounded, relative to generation
+THINKING_WEIGHT = {"Review": 0.5, "ReviewedContext": 0.8, "ReviewedMCQ": 0.8}
+
+# Review evaluations, so callers can tell earned approvals from forced ones
+APPROVED = "Đạt"
+REJECTED = "Chưa đạt"
+
+_QUALITY = re.compile(r"\[(ctx|mcq) q=(\d\.\d+)\]")
+# Questions per context and packed contexts, as written by graph/gen.py prompts
+_NUM_QUESTIONS = re.compile(r'^num_questions: "(\d+)"', re.MULTILINE)
+_CONTEXT_BLOCK = re.compile(r"\[CONTEXT (\d+)\]\n")
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        return self._client.answer(model, str(contents), dict(config or {}))
+
+
+class FakeClient:
+    """
+    Offline GenAI client. `contexts` is the number of contexts gen_context
+    returns; `tokens_per_second` and `time_scale` set the simulated latency
+    (time_scale=0.01 runs a 10s call in 0.1s). Counters are in `stats`.
+    """
+    def __init__(self, contexts: int = 3, seed: int = 0, tokens_per_second: float = 200.0,
+                 base_latency: float = 0.4, time_scale: float = 0.01):
+        self.contexts = contexts
+        self.tokens_per_second = tokens_per_second
+        self.base_latency = base_latency
+        self.time_scale = time_scale
+        self.models = _FakeModels(self)
+        self.stats = {"calls": 0, "reviews": 0, "approvals": 0, "truncated": 0,
+                      "thinking_tokens": 0, "output_tokens": 0, "latency_seconds": 0.0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def answer(self, model: str, contents: str, config: dict):
+        schema = config["response_schema"].__name__
+        with self._lock:
+            rng = random.Random(self._random.random())
+        output = OUTPUT_TOKENS[schema] * self._items(schema, contents)
+        demand = int(rng.randint(400, 2000) * THINKING_WEIGHT.get(schema, 1.0))
+        budget = (config.get("thinking_config") or {}).get("thinking_budget", -1)
+        thinking = demand if budget < 0 else min(budget, demand)
+        cap = config.get("max_output_tokens")
+        truncated = cap is not None and thinking + output > cap
+        if truncated:
+            thinking = min(thinking, cap)
+            output = max(0, cap - thinking)
+        latency = self.base_latency + (thinking + output) / self.tokens_per_second
+        time.sleep(latency * self.time_scale)
+
+        parsed = None if truncated else self._parse(schema, contents, thinking, config, rng)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["truncated"] += truncated
+            self.stats["thinking_tokens"] += thinking
+            self.stats["output_tokens"] += output
+            self.stats["latency_seconds"] += latency
+        usage = SimpleNamespace(
+            prompt_token_count=len(contents) // 4,
+            thoughts_token_count=thinking,
+            candidates_token_count=output,
+            total_token_count=len(contents) // 4 + thinking + output
+        )
+        return SimpleNamespace(parsed=parsed, text="" if parsed is None else parsed.model_dump_json(),
+                               usage_metadata=usage)
+
+    def _items(self, schema: str, contents: str) -> int:
+        """Items in the answer: contexts, or questions across all packed contexts"""
+        if schema == "Contexts":
+            return self.contexts
+        if schema == "MCQList":
+            return self._num_questions(contents)
+        if schema == "BatchMCQs":
+            return self._num_questions(contents) * max(1, len(_CONTEXT_BLOCK.findall(contents)))
+        return 1
+
+    @staticmethod
+    def _num_questions(contents: str) -> int:
+        match = _NUM_QUESTIONS.search(contents)
+        return int(match.group(1)) if match else 1
+
+    def _quality(self, thinking: int, config: dict, rng: random.Random, floor: float = 0.0) -> float:
+        """Quality of a generated item: more thinking, better items; temperature adds noise"""
+        quality = 0.5 + 0.4 * min(1.0, thinking / 1500)
+        quality += rng.uniform(-0.1, 0.1) * config.get("temperature", 1.0)
+        return round(min(0.98, max(0.05, quality, floor)), 2)
+
+    def _verdict(self, contents: str, kind: str, rng: random.Random) -> bool:
+        scores = [float(q) for k, q in _QUALITY.findall(contents) if k == kind]
+        approved = rng.random() < (scores[0] if scores else 0.5)
+        with self._lock:
+            self.stats["reviews"] += 1
+            self.stats["approvals"] += approved
+        return approved
+
+    def _suggestions(self, contents: str, kind: str) -> list[str]:
+        """Rejection suggestions; they repeat only when the item did not change"""
+        scores = [q for k, q in _QUALITY.findall(contents) if k == kind]
+        return [f"Cần chỉnh sửa (q={scores[0] if scores else '?'})"]
+
+    def _refined_quality(self, contents: str, kind: str, thinking: int, config: dict, rng: random.Random) -> float:
+        scores = [float(q) for k, q in _QUALITY.findall(contents) if k == kind]
+        return self._quality(thinking, config, rng, floor=(scores[0] if scores else 0.5) + 0.15)
+
+    def _question(self, quality: float, rng: random.Random) -> Question:
+        n = rng.randint(0, 10 ** 6)
+        return Question(
+            stem=f"Câu hỏi {n} [mcq q={quality:.2f}]",
+            options=Options(options=[option(id=c, text=f"Phương án {c} {n}") for c in "ABCD"]),
+            correct_answer="A",
+            reasoning=Reason(
+                bloom_level_analysis="", tactic_analysis="", answer_justification="",
+                distractor_justification=[option(id=c, text="") for c in "BCD"]
+            )
+        )
+
+    def _parse(self, schema: str, contents: str, thinking: int, config: dict, rng: random.Random):
+        if schema == "Contexts":
+            return Contexts(contexts=[
+                Context(context=f"Ngữ cảnh {rng.randint(0, 10 ** 6)} [ctx q={self._quality(thinking, config, rng):.2f}]")
+                for _ in range(self.contexts)
+            ])
+        if schema == "MCQ":
+            return MCQ(question=self._question(self._quality(thinking, config, rng), rng))
+        if schema == "MCQList":
+            return MCQList(questions=[
+                self._question(self._quality(thinking, config, rng), rng)
+                for _ in range(self._num_questions(contents))
+            ])
+        if schema == "BatchMCQs":
+            return BatchMCQs(items=[
+                ContextMCQs(context_index=int(i), questions=[
+                    self._question(self._quality(thinking, config, rng), rng)
+                    for _ in range(self._num_questions(contents))
+                ])
+                for i in _CONTEXT_BLOCK.findall(contents)
+            ])
+        if schema == "Review":
+            kind = "mcq" if "[mcq q=" in contents else "ctx"
+            approved = self._verdict(contents, kind, rng)
+            return Review(evaluation=APPROVED if approved else REJECTED,
+                          suggestions=[] if approved else self._suggestions(contents, kind))
+        if schema == "RefinedContext":
+            quality = self._refined_quality(contents, "ctx", thinking, config, rng)
+            return RefinedContext(context_new=f"Ngữ cảnh {rng.randint(0, 10 ** 6)} [ctx q={quality:.2f}]", refinement="")
+        if schema == "RefinedMCQ":
+            return RefinedMCQ(mcq_new=self._question(self._refined_quality(contents, "mcq", thinking, config, rng), rng))
+        if schema == "ReviewedContext":
+            if self._verdict(contents, "ctx", rng):
+                return ReviewedContext(evaluation=APPROVED, suggestions=[], context_new="")
+            quality = self._refined_quality(contents, "ctx", thinking, config, rng)
+            return ReviewedContext(evaluation=REJECTED, suggestions=self._suggestions(contents, "ctx"),
+                                   context_new=f"Ngữ cảnh {rng.randint(0, 10 ** 6)} [ctx q={quality:.2f}]")
+        if schema == "ReviewedMCQ":
+            if self._verdict(contents, "mcq", rng):
+                return ReviewedMCQ(evaluation=APPROVED, suggestions=[])
+            quality = self._refined_quality(contents, "mcq", thinking, config, rng)
+            return ReviewedMCQ(evaluation=REJECTED, suggestions=self._suggestions(contents, "mcq"),
+                               mcq_new=self._question(quality, rng))
+        raise ValueError(f"FakeClient has no answer for {schema}")
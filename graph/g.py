@@ -1,14 +1,14 @@
-from typing import  Literal
+from typing import  Literal, Annotated, get_type_hints
 from typing_extensions import TypedDict
-from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
+from dataclasses import dataclass, field, replace
+import hashlib
 import threading
 import os
 import time
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
 from dotenv import load_dotenv
-from google import genai
 
 # Load environment variables from .env file
 # Find .env file in ai2025 directory (parent of graph directory)
@@ -16,9 +16,17 @@ env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(env_path)
 
 # Local imports (relative to graph package)
-from .gen import gen_context, gen_mcq, MCQ
+from .gen import gen_context, gen_mcq, gen_mcq_list, gen_mcq_batch, MCQ
 from .refine import refine_context, refine_mcqs as refine_mcqs_api, RefinedContext, RefinedMCQ
-from .review import review_mcq, review_context, Review
+from .budget import RunBudget, BudgetExceeded, BudgetedClient
+from .retry import LLMCallError
+from .diversity import redundant_indices, DEFAULT_THRESHOLD as DEFAULT_DIVERSITY_THRESHOLD
+from .validate import validate_mcq
+from .convergence import suggestions_key, context_unchanged, mcq_unchanged
+from .review import (
+    review_mcq, review_context, Review,
+    review_refine_context, review_refine_mcq, ReviewedContext, ReviewedMCQ
+)
 
 # ============== LANGSMITH TRACING CONFIGURATION ==============
 
@@ -65,9 +73,15 @@ def configure_langsmith(
         else:
             print("LangSmith tracing DISABLED")
 
-# Auto-enable tracing on import (only if API key is provided)
-if LANGSMITH_API_KEY:
-    configure_langsmith()
+_langsmith_configured = False
+
+def ensure_langsmith():
+    """Enable tracing once, before the first graph is built (only if an API key is provided)"""
+    global _langsmith_configured
+    if not _langsmith_configured:
+        _langsmith_configured = True
+        if LANGSMITH_API_KEY:
+            configure_langsmith()
 
 # Load Google API key from environment variable
 # Will be initialized when needed, not at import time
@@ -83,6 +97,7 @@ def get_client():
                 "GOOGLE_API_KEY environment variable is not set. "
                 "Please set it in your .env file or environment variables."
             )
+        from google import genai
         client = genai.Client(api_key=GOOGLE_API_KEY)
     return client
 
@@ -151,8 +166,10 @@ class WorkerPool:
         # Rate limiting: wait if last request was too recent
         with self._queue_lock:
             elapsed = time.time() - self._last_request_time
+            wait_time = 0.0
             if elapsed < self._delay_seconds and self._last_request_time > 0:
                 wait_time = self._delay_seconds - elapsed
+            if wait_time > 0:
                 print(f"Rate limit: waiting {wait_time:.1f}s...")
                 time.sleep(wait_time)
             self._last_request_time = time.time()
@@ -180,26 +197,330 @@ class WorkerPool:
 # Initialize with 5 second delay between requests (rate limiting)
 worker_pool = WorkerPool(max_workers=1, delay_seconds=20.0)
 
+# ============== SOURCE TEXT STORE ==============
+
+class SourceTexts:
+    """
+    Shared read-only store of source documents, keyed by content hash.
+    
+    GraphState carries only the key (text_ref): MemorySaver snapshots the
+    state at every superstep, so keeping the document out of it makes
+    checkpoint size independent of document size. Entries are reference
+    counted, so concurrent runs over the same document share one copy.
+    """
+    _texts: dict = {}  # ref -> [text, number of runs using it]
+    _lock = threading.Lock()
+    
+    @classmethod
+    def put(cls, text: str) -> str:
+        """Store text for a run and return its reference (release() when done)"""
+        if not text:
+            return ""
+        ref = "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with cls._lock:
+            entry = cls._texts.setdefault(ref, [text, 0])
+            entry[1] += 1
+        return ref
+    
+    @classmethod
+    def get(cls, ref: str) -> str:
+        if not ref:
+            return ""
+        with cls._lock:
+            entry = cls._texts.get(ref)
+        if entry is None:
+            raise KeyError(f"Source text {ref} is not in the store (run already finished?)")
+        return entry[0]
+    
+    @classmethod
+    def release(cls, ref: str):
+        if not ref:
+            return
+        with cls._lock:
+            entry = cls._texts.get(ref)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del cls._texts[ref]
+
+def source_text(state: "GraphState") -> str:
+    """The run's source document, resolved from the shared store"""
+    return SourceTexts.get(state.get('text_ref', ''))
+
+# ============== SPECULATIVE MCQ GENERATION ==============
+
+class SpeculativeMCQs:
+    """
+    Per-run registry of MCQ generations started before the context loop ends.
+    
+    Futures are not checkpointable, so they live here (keyed by run_id) rather
+    than in GraphState. Entries are keyed by (context_index, context text): a
+    context that is refined after speculation never reuses the stale MCQ, and
+    the call is accounted as wasted.
+    """
+    _runs: dict = {}
+    _lock = threading.Lock()
+    
+    def __init__(self):
+        import concurrent.futures
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=10)
+        self._futures: dict = {}
+        self._futures_lock = threading.Lock()
+        self.launched = 0
+        self.used = 0
+        self.wasted = 0
+        self.cancelled = 0
+    
+    @classmethod
+    def for_run(cls, run_id: str) -> "SpeculativeMCQs":
+        with cls._lock:
+            if run_id not in cls._runs:
+                cls._runs[run_id] = cls()
+            return cls._runs[run_id]
+    
+    @classmethod
+    def close(cls, run_id: str) -> dict:
+        """Discard unused speculations of a run and return its accounting"""
+        with cls._lock:
+            run = cls._runs.pop(run_id, None)
+        if run is None:
+            return {"launched": 0, "used": 0, "wasted": 0, "cancelled": 0}
+        return run._shutdown()
+    
+    def submit(self, state: "GraphState", idx: int, context: str):
+        key = (idx, context)
+        with self._futures_lock:
+            if key in self._futures:
+                return
+            self._futures[key] = self._executor.submit(
+                self._generate, state, idx, context
+            )
+            self.launched += 1
+    
+    def take(self, idx: int, context: str):
+        """Return the speculative MCQ for this exact context, or None"""
+        with self._futures_lock:
+            future = self._futures.pop((idx, context), None)
+        if future is None:
+            return None
+        try:
+            mcq = future.result()
+        except Exception as e:
+            print(f"  MCQ {idx}: speculative generation failed -> {e}")
+            with self._futures_lock:
+                self.wasted += 1
+            return None
+        with self._futures_lock:
+            self.used += 1
+        return mcq
+    
+    @staticmethod
+    def _generate(state: "GraphState", idx: int, context: str) -> MCQ:
+        with llm_slot(state):
+            print(f"  MCQ {idx}: Speculative generation...")
+            return gen_mcq(
+                context=context,
+                bloom_level=state['bloom_level'],
+                client=run_client(state, "generate_mcqs"),
+                MODEL=node_model(state, "generate_mcqs")
+            )
+    
+    def _shutdown(self) -> dict:
+        with self._futures_lock:
+            leftovers = list(self._futures.values())
+            self._futures.clear()
+        for future in leftovers:
+            if future.cancel():
+                self.cancelled += 1
+            else:
+                self.wasted += 1  # Already running or done: the call was paid for
+        self._executor.shutdown(wait=False)
+        return {
+            "launched": self.launched,
+            "used": self.used,
+            "wasted": self.wasted,
+            "cancelled": self.cancelled
+        }
+
+# ============== MODEL ROUTING ==============
+
+# Nodes that can be given their own model (and fallbacks). Fused
+# review-and-refine passes use the refine route, as they write the refined
+# item; their final, verdict-only pass uses the review route.
+ROUTED_NODES = (
+    "generate_contexts", "review_contexts", "refine_contexts",
+    "generate_mcqs", "review_mcqs", "refine_mcqs_node",
+)
+
+def normalize_model_routes(routes) -> dict:
+    """
+    Validate a routing table {node: model or [model, fallback, ...]} into
+    {node: [model, ...]}. Raises ValueError for unknown nodes or bad chains.
+    """
+    if not routes:
+        return {}
+    if not isinstance(routes, dict):
+        raise ValueError("model routes must map node names to models")
+    normalized = {}
+    for node, models in routes.items():
+        if node not in ROUTED_NODES:
+            raise ValueError(f"unknown node '{node}' (expected one of: {', '.join(ROUTED_NODES)})")
+        chain = [models] if isinstance(models, str) else models
+        if not isinstance(chain, list) or not chain or not all(isinstance(m, str) and m.strip() for m in chain):
+            raise ValueError(f"route for '{node}' must be a model name or a non-empty list of model names")
+        normalized[node] = [m.strip() for m in chain]
+    return normalized
+
+def node_models(state: "GraphState", node: str) -> list[str]:
+    """Model chain of a node: its route if it has one, else the run's model"""
+    return state.get('model_routes', {}).get(node) or [state.get('model', 'gemini-2.5-flash')]
+
+def node_model(state: "GraphState", node: str) -> str:
+    return node_models(state, node)[0]
+
+# Per-node generation settings and the types they accept. thinking_budget is
+# sent as thinking_config (0 = no thinking on Flash / Flash-Lite, -1 = the
+# model decides); thinking tokens count towards max_output_tokens.
+GENERATION_CONFIG_KEYS = {
+    "temperature": (int, float),
+    "max_output_tokens": int,
+    "thinking_budget": int,
+}
+
+def normalize_generation_config(config) -> dict:
+    """
+    Validate a per-node generation config table {node: {temperature,
+    max_output_tokens, thinking_budget}}. Raises ValueError for unknown
+    nodes or settings and for values of the wrong type.
+    """
+    if not config:
+        return {}
+    if not isinstance(config, dict):
+        raise ValueError("generation config must map node names to settings")
+    normalized = {}
+    for node, values in config.items():
+        if node not in ROUTED_NODES:
+            raise ValueError(f"unknown node '{node}' (expected one of: {', '.join(ROUTED_NODES)})")
+        if not isinstance(values, dict):
+            raise ValueError(f"generation config for '{node}' must be an object")
+        for key, value in values.items():
+            expected = GENERATION_CONFIG_KEYS.get(key)
+            if expected is None:
+                raise ValueError(f"unknown setting '{key}' for '{node}' (expected one of: {', '.join(GENERATION_CONFIG_KEYS)})")
+            if isinstance(value, bool) or not isinstance(value, expected):
+                raise ValueError(f"'{key}' for '{node}' must be a number")
+        normalized[node] = dict(values)
+    return normalized
+
+def node_generation_config(state: "GraphState", node: str) -> dict:
+    """Provider config entries (temperature, output cap, thinking) for a node's calls"""
+    values = state.get('generation_config', {}).get(node, {})
+    config = {key: values[key] for key in ("temperature", "max_output_tokens") if key in values}
+    if "thinking_budget" in values:
+        config["thinking_config"] = {"thinking_budget": values["thinking_budget"]}
+    return config
+
+# ============== RUN BUDGET ==============
+
+def run_client(state: "GraphState", node: str = None) -> BudgetedClient:
+    """
+    GenAI client whose calls are retried and charged to the run's budget,
+    made with the node's generation config and falling back along its model
+    chain when the model is rate-limited
+    """
+    return BudgetedClient(
+        get_client(),
+        RunBudget.for_run(state.get('run_id', '')),
+        fallbacks=node_models(state, node)[1:] if node else (),
+        generation_config=node_generation_config(state, node) if node else None
+    )
+
+@contextmanager
+def llm_slot(state: "GraphState"):
+    """
+    Worker pool slot for one LLM call. Fails fast with BudgetExceeded instead
+    of queueing (and sleeping on the rate limit) once the run budget is spent.
+    """
+    budget = RunBudget.for_run(state.get('run_id', ''))
+    budget.check()
+    with worker_pool:
+        budget.check()
+        yield
+
+def budget_exhausted(state: "GraphState") -> bool:
+    return RunBudget.for_run(state.get('run_id', '')).exhausted
+
+def run_items(state: "GraphState", fn, items: list, on_budget_exceeded=None) -> list:
+    """
+    Apply fn(idx, item) to every item in parallel, preserving order.
+    
+    Items whose call could not be made (run budget spent, provider circuit
+    open, or retries exhausted) keep their previous value, or
+    on_budget_exceeded(idx, item) when given.
+    """
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        futures = {executor.submit(fn, i, item): i for i, item in enumerate(items)}
+        results = [None] * len(items)
+        for future in concurrent.futures.as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+            except (BudgetExceeded, LLMCallError) as e:
+                print(f"  Item {idx}: skipped -> {e}")
+                results[idx] = on_budget_exceeded(idx, items[idx]) if on_budget_exceeded else items[idx]
+    return results
+
 # ============== STATE DEFINITIONS ==============
 
-class ContextItem(TypedDict):
+# Items are immutable slots records: a node that leaves an item alone hands
+# back the same object, and only items that are not `is` the previous ones
+# are written to the checkpoint (see changed_items)
+
+@dataclass(frozen=True, slots=True)
+class ContextItem:
     context: str
-    review: str
-    suggestions: list[str]
-    is_approved: bool  # True if suggestions is empty
-    iteration_count: int
+    review: str = ""
+    suggestions: list[str] = field(default_factory=list)
+    is_approved: bool = False  # True if suggestions is empty
+    iteration_count: int = 0
+    addressed: str = ""  # suggestions_key of the suggestions its last refinement addressed
+    converged: bool = False  # Refinement stopped changing it: left unapproved, out of the loop
 
-class MCQItem(TypedDict):
+@dataclass(frozen=True, slots=True)
+class MCQItem:
     mcq: MCQ
     context: str
     context_index: int
-    review: str
-    suggestions: list[str]
-    is_approved: bool
+    review: str = ""
+    suggestions: list[str] = field(default_factory=list)
+    is_approved: bool = False
+    addressed: str = ""
+    converged: bool = False
+
+def merge_items(items: list, updates: list) -> list:
+    """
+    Reducer for the `contexts` / `mcqs` channels. An update is either a list,
+    which replaces the items, or an {index: item} dict of changed items.
+    """
+    merged = items
+    for update in updates:
+        if isinstance(update, dict):
+            if merged is items:
+                merged = list(items)
+            for idx, item in update.items():
+                merged[idx] = item
+        else:
+            merged = list(update)
+    return merged
+
+def changed_items(before: list, after: list) -> dict:
+    """{index: item} delta of the items a node replaced"""
+    return {idx: item for idx, (old, item) in enumerate(zip(before, after)) if item is not old}
 
 class GraphState(TypedDict):
     """Main graph state"""
-    text: str
+    text_ref: str  # SourceTexts key of the source document (the text itself stays out of checkpoints)
     number_contexts: int
     subject: str
     topic: str
@@ -207,10 +528,26 @@ class GraphState(TypedDict):
     exercises: str
     bloom_level: str
     model: str
+    model_routes: dict  # node -> [model, fallback, ...]; nodes not listed use `model`
+    generation_config: dict  # node -> {temperature, max_output_tokens, thinking_budget}
+    questions_per_context: int  # MCQs generated from each context
+    contexts_per_call: int  # Contexts packed into one generation call
+    speculative_mcqs: str  # "off" | "approved" | "produced"
+    run_id: str
     
-    # Data - NOT using reducers for simpler control
+    # Data - per-item deltas merged by merge_items (see state_schema)
     contexts: list[ContextItem]
     mcqs: list[MCQItem]
+    speculation: dict  # launched / used / wasted / cancelled speculative MCQ calls
+    budget: dict  # elapsed seconds / LLM calls / tokens used by the run
+    budget_exhausted: bool  # True when the result is partial
+    on_budget_exhausted: str  # "approve" | "drop" unfinished items
+    diversity_threshold: float  # TF-IDF cosine at which a context is redundant (0 = off)
+    redundant_contexts: str  # "drop" | "regenerate"
+    diversity: dict  # generated / dropped / regenerated contexts and LLM calls saved
+    validation: dict  # MCQs checked / repaired / rejected by the local validator, LLM calls saved
+    stop_converged: bool  # Take items whose refinement stopped changing them out of the loop
+    convergence: dict  # contexts / MCQs whose loop stopped changing them, LLM calls saved
     
     # Control
     human_feedback: str
@@ -219,34 +556,100 @@ class GraphState(TypedDict):
     mcq_iteration: int
     max_iterations: int
 
+def state_schema():
+    """
+    GraphState as given to StateGraph, with `contexts` / `mcqs` as delta
+    channels: checkpoints keep each step's writes, not the whole lists
+    """
+    from langgraph.channels import DeltaChannel
+    hints = get_type_hints(GraphState)
+    return TypedDict("GraphState", {
+        **hints,
+        "contexts": Annotated[hints["contexts"], DeltaChannel(merge_items)],
+        "mcqs": Annotated[hints["mcqs"], DeltaChannel(merge_items)],
+    })
+
+def new_checkpointer():
+    """MemorySaver that can read back the item records it stores"""
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    stored_types = [(cls.__module__, cls.__name__) for cls in (ContextItem, MCQItem, MCQ)]
+    return MemorySaver(serde=JsonPlusSerializer(allowed_msgpack_modules=stored_types))
+
+# ============== CONVERGENCE ==============
+# An item whose refinement comes back unchanged, or whose review repeats the
+# suggestions its last refinement addressed, will not improve in further
+# passes. It leaves the loop unapproved, with its last review and
+# suggestions, instead of spending calls until max_iterations.
+
+def settled(item) -> bool:
+    """Approved, or taken out of the review / refine loop"""
+    return item.is_approved or item.converged
+
+def stop_converged(state: GraphState) -> bool:
+    return state.get('stop_converged', True)
+
+def repeats_suggestions(state: GraphState, item, suggestions: list[str]) -> bool:
+    """The review asks again for what the item's last refinement was meant to fix"""
+    return bool(
+        stop_converged(state)
+        and item.addressed and suggestions_key(suggestions) == item.addressed
+    )
+
+def converged(item, reason: str):
+    """Take an unapproved item out of the loop, keeping its review and suggestions"""
+    note = f"Converged: {reason}"
+    return replace(item, is_approved=False, converged=True,
+                   review=f"{item.review}\n{note}" if item.review else note)
+
+def convergence_update(state: GraphState, kind: str, calls_saved: list[int]) -> dict:
+    """state["convergence"] plus the items of `kind` that converged in this node"""
+    convergence = {"contexts": 0, "mcqs": 0, "llm_calls_saved": 0, **state.get('convergence', {})}
+    convergence[kind] += len(calls_saved)
+    convergence["llm_calls_saved"] += sum(calls_saved)
+    return convergence
+
 # ============== NODE FUNCTIONS ==============
 
+def speculation_enabled(state: GraphState) -> bool:
+    """Speculation only applies to the one-MCQ-per-context generation path"""
+    return (
+        state.get('speculative_mcqs', 'off') != 'off'
+        and state.get('questions_per_context', 1) <= 1
+        and state.get('contexts_per_call', 1) <= 1
+    )
+
+def speculate_mcqs(state: GraphState, contexts: list[ContextItem], approved_only: bool):
+    """Start MCQ generation early for contexts that are unlikely to change"""
+    if not speculation_enabled(state):
+        return
+    registry = SpeculativeMCQs.for_run(state['run_id'])
+    for idx, ctx in enumerate(contexts):
+        if approved_only and not ctx.is_approved:
+            continue
+        registry.submit(state, idx, ctx.context)
+
 def generate_contexts(state: GraphState) -> dict:
     """Generate initial contexts from text"""
     print(f"[generate_contexts] Generating {state['number_contexts']} contexts...")
     
-    contexts_list = gen_context(
-        text=state['text'],
-        subject=state['subject'],
-        topic=state['topic'],
-        number_context=state['number_contexts'],
-        bloom_level=state['bloom_level'],
-        client=get_client(),
-        key_point=state.get('key_point', ''),
-        exercises=state.get('exercises', ''),
-        MODEL=state.get('model', 'gemini-2.5-flash')
-    )
+    try:
+        contexts_list = gen_context(
+            text=source_text(state),
+            subject=state['subject'],
+            topic=state['topic'],
+            number_context=state['number_contexts'],
+            bloom_level=state['bloom_level'],
+            client=run_client(state, "generate_contexts"),
+            key_point=state.get('key_point', ''),
+            exercises=state.get('exercises', ''),
+            MODEL=node_model(state, "generate_contexts")
+        )
+    except (BudgetExceeded, LLMCallError) as e:
+        print(f"[generate_contexts] Failed -> {e}")
+        contexts_list = []
     
-    context_items = [
-        {
-            "context": ctx,
-            "review": "",
-            "suggestions": [],
-            "is_approved": False,
-            "iteration_count": 0
-        }
-        for ctx in contexts_list
-    ]
+    context_items = [new_context_item(ctx) for ctx in contexts_list]
     
     print(f"[generate_contexts] Generated {len(context_items)} contexts")
     return {
@@ -254,106 +657,179 @@ def generate_contexts(state: GraphState) -> dict:
         "current_stage": "context_review"
     }
 
+def new_context_item(context: str) -> ContextItem:
+    return ContextItem(context=context)
+
+def downstream_calls(state: GraphState, n_contexts: int) -> int:
+    """Minimum LLM calls the review loop and MCQ stage spend on n contexts"""
+    questions_per_context = max(1, state.get('questions_per_context', 1))
+    contexts_per_call = max(1, state.get('contexts_per_call', 1))
+    if questions_per_context > 1 or contexts_per_call > 1:
+        mcq_calls = -(-n_contexts // contexts_per_call)
+    else:
+        mcq_calls = n_contexts
+    # One context review, the MCQ generation, one review per MCQ
+    return n_contexts + mcq_calls + n_contexts * questions_per_context
+
+def filter_contexts(state: GraphState) -> dict:
+    """Drop (or regenerate) near-identical contexts before the review loop"""
+    contexts = state['contexts']
+    threshold = state.get('diversity_threshold', DEFAULT_DIVERSITY_THRESHOLD)
+    diversity = {"generated": len(contexts), "dropped": 0, "regenerated": 0, "llm_calls_saved": 0}
+    update = {"diversity": diversity}
+    
+    if threshold and len(contexts) > 1:
+        redundant = set(redundant_indices([c.context for c in contexts], threshold))
+        kept = [c for i, c in enumerate(contexts) if i not in redundant]
+        print(f"[filter_contexts] {len(redundant)}/{len(contexts)} contexts are redundant")
+        
+        regenerated = []
+        if redundant and state.get('redundant_contexts', 'drop') == 'regenerate' and not budget_exhausted(state):
+            # One extra generation call; replacements must be distinct too
+            try:
+                with llm_slot(state):
+                    candidates = gen_context(
+                        text=source_text(state),
+                        subject=state['subject'],
+                        topic=state['topic'],
+                        number_context=len(redundant),
+                        bloom_level=state['bloom_level'],
+                        client=run_client(state, "generate_contexts"),
+                        key_point=state.get('key_point', ''),
+                        exercises=state.get('exercises', ''),
+                        MODEL=node_model(state, "generate_contexts")
+                    )
+                diversity["llm_calls_saved"] -= 1
+            except (BudgetExceeded, LLMCallError) as e:
+                print(f"[filter_contexts] Regeneration failed -> {e}")
+                candidates = []
+            texts = [c.context for c in kept] + candidates[:len(redundant)]
+            still_redundant = set(redundant_indices(texts, threshold, keep=len(kept)))
+            regenerated = [
+                new_context_item(texts[i]) for i in range(len(kept), len(texts))
+                if i not in still_redundant
+            ]
+        
+        contexts = kept + regenerated
+        if redundant:
+            update["contexts"] = contexts
+        diversity["dropped"] = len(redundant) - len(regenerated)
+        diversity["regenerated"] = len(regenerated)
+        diversity["llm_calls_saved"] += (
+            downstream_calls(state, diversity["generated"]) - downstream_calls(state, len(contexts))
+        )
+        print(f"[filter_contexts] Kept {len(contexts)} contexts, "
+              f"~{diversity['llm_calls_saved']} LLM calls saved")
+    
+    if state.get('speculative_mcqs') == 'produced':
+        speculate_mcqs(state, contexts, approved_only=False)
+    return update
+
 def review_all_contexts(state: GraphState) -> dict:
     """Review all contexts in parallel (with worker pool limit)"""
     print(f"[review_all_contexts] Reviewing {len(state['contexts'])} contexts...")
     
     contexts = state['contexts']
-    updated_contexts = []
+    max_iter = state.get('max_iterations', 3)
+    # Another refine + review would follow a rejection
+    more_passes = state.get('context_iteration', 0) < max_iter
+    calls_saved = []
     
     def review_one(idx: int, ctx: ContextItem) -> ContextItem:
         # Skip already approved contexts
-        if ctx['is_approved']:
+        if settled(ctx):
             print(f"  Context {idx}: Already approved, skipping")
             return ctx
         
-        with worker_pool:
+        with llm_slot(state):
             print(f"  Context {idx}: Reviewing...")
             review_result: Review = review_context(
-                context_gen=ctx['context'],
-                text=state['text'],
-                client=get_client(),
+                context_gen=ctx.context,
+                text=source_text(state),
+                client=run_client(state, "review_contexts"),
                 subject=state['subject'],
                 topic=state['topic'],
                 bloom_level=state['bloom_level'],
                 key_point=state.get('key_point', ''),
                 exercise=state.get('exercises', ''),
-                MODEL=state.get('model', 'gemini-2.5-flash')
+                MODEL=node_model(state, "review_contexts")
             )
         
         is_approved = len(review_result.suggestions) == 0
         print(f"  Context {idx}: {'Approved' if is_approved else f'Needs refine ({len(review_result.suggestions)} suggestions)'}")
         
-        return {
-            **ctx,
-            "review": review_result.evaluation,
-            "suggestions": review_result.suggestions,
-            "is_approved": is_approved
-        }
+        reviewed = replace(
+            ctx,
+            review=review_result.evaluation,
+            suggestions=review_result.suggestions,
+            is_approved=is_approved
+        )
+        if (not is_approved and more_passes and ctx.iteration_count < max_iter
+                and repeats_suggestions(state, ctx, review_result.suggestions)):
+            print(f"  Context {idx}: Same suggestions as before its last refinement, stopping")
+            calls_saved.append(2)
+            return converged(reviewed, "the review repeated the suggestions of the previous pass")
+        return reviewed
     
-    # Process in parallel using threads
-    import concurrent.futures
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(review_one, i, ctx): i for i, ctx in enumerate(contexts)}
-        results = [None] * len(contexts)
-        for future in concurrent.futures.as_completed(futures):
-            idx = futures[future]
-            results[idx] = future.result()
+    results = run_items(state, review_one, contexts)
     
-    return {"contexts": results}
+    speculate_mcqs(state, results, approved_only=True)
+    return {
+        "contexts": changed_items(contexts, results),
+        "convergence": convergence_update(state, "contexts", calls_saved)
+    }
 
 def refine_contexts(state: GraphState) -> dict:
     """Refine contexts that have suggestions"""
     print(f"[refine_contexts] Refining contexts with suggestions...")
     
     contexts = state['contexts']
-    updated_contexts = []
+    calls_saved = []
     
     def refine_one(idx: int, ctx: ContextItem) -> ContextItem:
         # Skip approved contexts
-        if ctx['is_approved']:
+        if settled(ctx):
             return ctx
         
         # Skip if max iterations reached
-        if ctx['iteration_count'] >= state.get('max_iterations', 3):
+        if ctx.iteration_count >= state.get('max_iterations', 3):
             print(f"  Context {idx}: Max iterations reached, forcing approval")
-            return {**ctx, "is_approved": True, "suggestions": []}
+            return replace(ctx, is_approved=True, suggestions=[])
         
-        with worker_pool:
-            print(f"  Context {idx}: Refining (iteration {ctx['iteration_count'] + 1})...")
+        with llm_slot(state):
+            print(f"  Context {idx}: Refining (iteration {ctx.iteration_count + 1})...")
             refined: RefinedContext = refine_context(
-                context=ctx['context'],
-                context_review="\n".join(ctx['suggestions']),
-                text=state['text'],
-                client=get_client(),
+                context=ctx.context,
+                context_review="\n".join(ctx.suggestions),
+                text=source_text(state),
+                client=run_client(state, "refine_contexts"),
                 subject=state['subject'],
                 topic=state['topic'],
                 bloom_level=state['bloom_level'],
                 key_point=state.get('key_point', ''),
                 exercises=state.get('exercises', ''),
-                MODEL=state.get('model', 'gemini-2.5-flash')
+                MODEL=node_model(state, "refine_contexts")
             )
         
-        return {
-            "context": refined.context_new,
-            "review": "",
-            "suggestions": [],
-            "is_approved": False,  # Will be checked in next review
-            "iteration_count": ctx['iteration_count'] + 1
-        }
+        if stop_converged(state) and context_unchanged(ctx.context, refined.context_new):
+            # Reviewing the same text again would give the same verdict
+            print(f"  Context {idx}: Refinement left it unchanged, stopping")
+            calls_saved.append(1)
+            return converged(ctx, "the refinement left the context unchanged")
+        
+        return ContextItem(
+            context=refined.context_new,
+            is_approved=False,  # Will be checked in next review
+            iteration_count=ctx.iteration_count + 1,
+            addressed=suggestions_key(ctx.suggestions)
+        )
     
-    # Process in parallel
-    import concurrent.futures
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(refine_one, i, ctx): i for i, ctx in enumerate(contexts)}
-        results = [None] * len(contexts)
-        for future in concurrent.futures.as_completed(futures):
-            idx = futures[future]
-            results[idx] = future.result()
+    results = run_items(state, refine_one, contexts)
     
     return {
-        "contexts": results,
-        "context_iteration": state.get('context_iteration', 0) + 1
+        "contexts": changed_items(contexts, results),
+        "context_iteration": state.get('context_iteration', 0) + 1,
+        "convergence": convergence_update(state, "contexts", calls_saved)
     }
 
 def generate_mcqs(state: GraphState) -> dict:
@@ -361,35 +837,112 @@ def generate_mcqs(state: GraphState) -> dict:
     print(f"[generate_mcqs] Generating MCQs from {len(state['contexts'])} contexts...")
     
     contexts = state['contexts']
-    mcqs = []
+    questions_per_context = max(1, state.get('questions_per_context', 1))
+    contexts_per_call = max(1, state.get('contexts_per_call', 1))
+    
+    if questions_per_context > 1 or contexts_per_call > 1:
+        return generate_mcqs_batched(state, questions_per_context, contexts_per_call)
+    
+    registry = SpeculativeMCQs.for_run(state['run_id']) if speculation_enabled(state) else None
     
     def gen_one(idx: int, ctx: ContextItem) -> MCQItem:
-        with worker_pool:
+        if registry is not None:
+            speculative: MCQ = registry.take(idx, ctx.context)
+            if speculative is not None:
+                print(f"  MCQ {idx}: Using speculative result")
+                return new_mcq_item(speculative, ctx.context, idx)
+        
+        with llm_slot(state):
             print(f"  MCQ {idx}: Generating...")
             mcq_result: MCQ = gen_mcq(
-                context=ctx['context'],
+                context=ctx.context,
                 bloom_level=state['bloom_level'],
-                client=get_client(),
-                MODEL=state.get('model', 'gemini-2.5-flash')
+                client=run_client(state, "generate_mcqs"),
+                MODEL=node_model(state, "generate_mcqs")
             )
         
-        return {
-            "mcq": mcq_result,
-            "context": ctx['context'],
-            "context_index": idx,
-            "review": "",
-            "suggestions": [],
-            "is_approved": False
-        }
+        return new_mcq_item(mcq_result, ctx.context, idx)
+    
+    results = run_items(state, gen_one, contexts, on_budget_exceeded=lambda idx, ctx: None)
+    results = [item for item in results if item is not None]
+    
+    print(f"[generate_mcqs] Generated {len(results)} MCQs")
+    update = {
+        "mcqs": results,
+        "current_stage": "mcq_review"
+    }
+    if registry is not None:
+        # Speculations for contexts refined after launch are discarded here
+        update["speculation"] = SpeculativeMCQs.close(state['run_id'])
+        print(f"[generate_mcqs] Speculation: {update['speculation']}")
+    return update
+
+def generate_mcqs_batched(state: GraphState, questions_per_context: int, contexts_per_call: int) -> dict:
+    """
+    Generate MCQs with fewer, larger calls: `questions_per_context` MCQs per
+    context, with up to `contexts_per_call` contexts packed into one request.
+    """
+    contexts = state['contexts']
+    chunks = [
+        list(range(start, min(start + contexts_per_call, len(contexts))))
+        for start in range(0, len(contexts), contexts_per_call)
+    ]
+    print(f"[generate_mcqs] Batched mode: {questions_per_context} per context, "
+          f"{len(chunks)} calls for {len(contexts)} contexts")
+    
+    def gen_chunk(indices: list[int]) -> list[list[MCQ]]:
+        with llm_slot(state):
+            print(f"  MCQ batch {indices}: Generating...")
+            if len(indices) == 1:
+                return [gen_mcq_list(
+                    context=contexts[indices[0]].context,
+                    bloom_level=state['bloom_level'],
+                    client=run_client(state, "generate_mcqs"),
+                    num_questions=questions_per_context,
+                    MODEL=node_model(state, "generate_mcqs")
+                )]
+            return gen_mcq_batch(
+                contexts=[contexts[i].context for i in indices],
+                bloom_level=state['bloom_level'],
+                client=run_client(state, "generate_mcqs"),
+                num_questions=questions_per_context,
+                MODEL=node_model(state, "generate_mcqs")
+            )
     
-    # Process in parallel
     import concurrent.futures
+    grouped: list[list[MCQ]] = [[] for _ in contexts]
     with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(gen_one, i, ctx): i for i, ctx in enumerate(contexts)}
-        results = [None] * len(contexts)
+        futures = {executor.submit(gen_chunk, chunk): chunk for chunk in chunks}
         for future in concurrent.futures.as_completed(futures):
-            idx = futures[future]
-            results[idx] = future.result()
+            chunk = futures[future]
+            try:
+                chunk_result = future.result()
+            except (BudgetExceeded, LLMCallError) as e:
+                print(f"  MCQ batch {chunk}: skipped -> {e}")
+                continue
+            for idx, mcq_list in zip(chunk, chunk_result):
+                grouped[idx] = mcq_list[:questions_per_context]
+    
+    # The model occasionally skips a packed context; fill the gap with a single call
+    for idx, mcq_list in enumerate(grouped):
+        if not mcq_list and not budget_exhausted(state):
+            print(f"  MCQ {idx}: Missing from batch response, generating individually...")
+            try:
+                with llm_slot(state):
+                    grouped[idx] = [gen_mcq(
+                        context=contexts[idx].context,
+                        bloom_level=state['bloom_level'],
+                        client=run_client(state, "generate_mcqs"),
+                        MODEL=node_model(state, "generate_mcqs")
+                    )]
+            except (BudgetExceeded, LLMCallError) as e:
+                print(f"  MCQ {idx}: skipped -> {e}")
+    
+    results = [
+        new_mcq_item(mcq, contexts[idx].context, idx)
+        for idx, mcq_list in enumerate(grouped)
+        for mcq in mcq_list
+    ]
     
     print(f"[generate_mcqs] Generated {len(results)} MCQs")
     return {
@@ -397,46 +950,94 @@ def generate_mcqs(state: GraphState) -> dict:
         "current_stage": "mcq_review"
     }
 
+def new_mcq_item(mcq: MCQ, context: str, context_index: int) -> MCQItem:
+    """Wrap a freshly generated MCQ into an unreviewed MCQItem"""
+    return MCQItem(mcq=mcq, context=context, context_index=context_index)
+
+def screen_mcqs(state: GraphState, mcqs: list[MCQItem]) -> tuple[list[MCQItem], set[int], dict]:
+    """
+    Run the local validator on the MCQs awaiting review: trivial slips are
+    repaired in place, structurally broken MCQs get the validator's
+    suggestions instead of an LLM verdict.
+    
+    Returns:
+        (mcqs, rejected indices, updated state["validation"] counters)
+    """
+    validation = {"checked": 0, "repaired": 0, "rejected": 0, "llm_calls_saved": 0,
+                  **state.get('validation', {})}
+    screened, rejected = [], set()
+    for idx, mcq_item in enumerate(mcqs):
+        if not settled(mcq_item):
+            mcq, repairs, problems = validate_mcq(mcq_item.mcq)
+            validation["checked"] += 1
+            if repairs:
+                print(f"  MCQ {idx}: Repaired locally ({'; '.join(repairs)})")
+                validation["repaired"] += 1
+                mcq_item = replace(mcq_item, mcq=mcq)
+            if problems:
+                print(f"  MCQ {idx}: Rejected by the validator ({len(problems)} problems)")
+                validation["rejected"] += 1
+                rejected.add(idx)
+                mcq_item = replace(
+                    mcq_item,
+                    review="Kiểm tra cấu trúc tự động: câu hỏi chưa hợp lệ.",
+                    suggestions=problems,
+                    is_approved=False
+                )
+        screened.append(mcq_item)
+    return screened, rejected, validation
+
 def review_all_mcqs(state: GraphState) -> dict:
     """Review all MCQs in parallel"""
     print(f"[review_all_mcqs] Reviewing {len(state['mcqs'])} MCQs...")
     
     mcqs = state['mcqs']
+    screened, rejected, validation = screen_mcqs(state, mcqs)
+    # Rejected MCQs go straight to refinement with the validator's suggestions
+    validation["llm_calls_saved"] += len(rejected)
+    # Another refine + review would follow a rejection
+    more_passes = state.get('mcq_iteration', 0) < state.get('max_iterations', 3)
+    calls_saved = []
     
     def review_one(idx: int, mcq_item: MCQItem) -> MCQItem:
-        if mcq_item['is_approved']:
+        if settled(mcq_item):
             print(f"  MCQ {idx}: Already approved, skipping")
             return mcq_item
+        if idx in rejected:
+            return mcq_item
         
-        with worker_pool:
+        with llm_slot(state):
             print(f"  MCQ {idx}: Reviewing...")
             review_result: Review = review_mcq(
-                mcq=mcq_item['mcq'],
-                client=get_client(),
-                context=mcq_item['context'],
+                mcq=mcq_item.mcq,
+                client=run_client(state, "review_mcqs"),
+                context=mcq_item.context,
                 bloom_level=state['bloom_level'],
-                MODEL=state.get('model', 'gemini-2.5-flash')
+                MODEL=node_model(state, "review_mcqs")
             )
         
         is_approved = len(review_result.suggestions) == 0
         print(f"  MCQ {idx}: {'Approved' if is_approved else f'Needs refine ({len(review_result.suggestions)} suggestions)'}")
         
-        return {
-            **mcq_item,
-            "review": review_result.evaluation,
-            "suggestions": review_result.suggestions,
-            "is_approved": is_approved
-        }
+        reviewed = replace(
+            mcq_item,
+            review=review_result.evaluation,
+            suggestions=review_result.suggestions,
+            is_approved=is_approved
+        )
+        if not is_approved and more_passes and repeats_suggestions(state, mcq_item, review_result.suggestions):
+            print(f"  MCQ {idx}: Same suggestions as before its last refinement, stopping")
+            calls_saved.append(2)
+            return converged(reviewed, "the review repeated the suggestions of the previous pass")
+        return reviewed
     
-    import concurrent.futures
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(review_one, i, mcq): i for i, mcq in enumerate(mcqs)}
-        results = [None] * len(mcqs)
-        for future in concurrent.futures.as_completed(futures):
-            idx = futures[future]
-            results[idx] = future.result()
+    results = run_items(state, review_one, screened)
     
-    return {"mcqs": results}
+    return {
+        "mcqs": changed_items(mcqs, results),
+        "validation": validation,
+        "convergence": convergence_update(state, "mcqs", calls_saved)
+    }
 
 def refine_mcqs_node(state: GraphState) -> dict:
     """Refine MCQs that have suggestions (node function)"""
@@ -445,68 +1046,284 @@ def refine_mcqs_node(state: GraphState) -> dict:
     mcqs = state['mcqs']
     mcq_iteration = state.get('mcq_iteration', 0)
     max_iter = state.get('max_iterations', 3)
+    calls_saved = []
     
     def refine_one(idx: int, mcq_item: MCQItem) -> MCQItem:
-        if mcq_item['is_approved']:
+        if settled(mcq_item):
             return mcq_item
         
         # Force approval if max iterations
         if mcq_iteration >= max_iter:
             print(f"  MCQ {idx}: Max iterations reached, forcing approval")
-            return {**mcq_item, "is_approved": True, "suggestions": []}
+            return replace(mcq_item, is_approved=True, suggestions=[])
         
-        with worker_pool:
+        # Transient errors are retried by the client; a call that still fails
+        # leaves the item unchanged and unapproved (see run_items)
+        with llm_slot(state):
             print(f"  MCQ {idx}: Refining...")
-            try:
+            refined: RefinedMCQ = refine_mcqs_api(
+                mcq_gen=mcq_item.mcq,
+                mcq_review="\n".join(mcq_item.suggestions),
+                context=mcq_item.context,
+                bloom_level=state['bloom_level'],
+                client=run_client(state, "refine_mcqs_node"),
+                MODEL=node_model(state, "refine_mcqs_node")
+            )
+        
+        refined_mcq = MCQ(question=refined.mcq_new)
+        if stop_converged(state) and mcq_unchanged(mcq_item.mcq, refined_mcq):
+            print(f"  MCQ {idx}: Refinement left it unchanged, stopping")
+            calls_saved.append(1)
+            return converged(mcq_item, "the refinement left the MCQ unchanged")
+        
+        return replace(
+            mcq_item,
+            mcq=refined_mcq,
+            review="",
+            suggestions=[],
+            is_approved=False,
+            addressed=suggestions_key(mcq_item.suggestions)
+        )
+    
+    results = run_items(state, refine_one, mcqs)
+    
+    return {
+        "mcqs": changed_items(mcqs, results),
+        "mcq_iteration": mcq_iteration + 1,
+        "convergence": convergence_update(state, "mcqs", calls_saved)
+    }
+
+# ============== FUSED REVIEW-AND-REFINE NODES ==============
+# One structured call returns the verdict and, when not approved, the refined
+# artifact. Pass k < max_iterations is fused; the final pass is verdict-only so
+# the last refinement still gets reviewed, matching the two-node loop.
+
+def review_refine_all_contexts(state: GraphState) -> dict:
+    """Review contexts and refine rejected ones in a single call each"""
+    context_iteration = state.get('context_iteration', 0)
+    max_iter = state.get('max_iterations', 3)
+    final_pass = context_iteration >= max_iter
+    print(f"[review_refine_contexts] Pass {context_iteration} "
+          f"({'review only' if final_pass else 'fused'}) on {len(state['contexts'])} contexts...")
+    
+    contexts = state['contexts']
+    calls_saved = []
+    
+    def review_refine_one(idx: int, ctx: ContextItem) -> ContextItem:
+        if settled(ctx):
+            return ctx
+        
+        with llm_slot(state):
+            if final_pass:
+                print(f"  Context {idx}: Reviewing...")
+                review_result: Review = review_context(
+                    context_gen=ctx.context,
+                    text=source_text(state),
+                    client=run_client(state, "review_contexts"),
+                    subject=state['subject'],
+                    topic=state['topic'],
+                    bloom_level=state['bloom_level'],
+                    key_point=state.get('key_point', ''),
+                    exercise=state.get('exercises', ''),
+                    MODEL=node_model(state, "review_contexts")
+                )
+            else:
+                print(f"  Context {idx}: Reviewing + refining...")
+                review_result: ReviewedContext = review_refine_context(
+                    context_gen=ctx.context,
+                    text=source_text(state),
+                    client=run_client(state, "refine_contexts"),
+                    subject=state['subject'],
+                    topic=state['topic'],
+                    bloom_level=state['bloom_level'],
+                    key_point=state.get('key_point', ''),
+                    exercise=state.get('exercises', ''),
+                    MODEL=node_model(state, "refine_contexts")
+                )
+        
+        is_approved = len(review_result.suggestions) == 0
+        print(f"  Context {idx}: {'Approved' if is_approved else f'Needs refine ({len(review_result.suggestions)} suggestions)'}")
+        
+        reviewed = replace(
+            ctx,
+            review=review_result.evaluation,
+            suggestions=review_result.suggestions,
+            is_approved=is_approved
+        )
+        if is_approved or final_pass or not review_result.context_new.strip():
+            return reviewed
+        
+        # The next pass would be spent on a context that stopped improving
+        if repeats_suggestions(state, ctx, review_result.suggestions):
+            print(f"  Context {idx}: Same suggestions as the previous pass, stopping")
+            calls_saved.append(1)
+            return converged(reviewed, "the review repeated the suggestions of the previous pass")
+        if stop_converged(state) and context_unchanged(ctx.context, review_result.context_new):
+            print(f"  Context {idx}: Refinement left it unchanged, stopping")
+            calls_saved.append(1)
+            return converged(reviewed, "the refinement left the context unchanged")
+        
+        return ContextItem(
+            context=review_result.context_new,
+            is_approved=False,  # Will be checked in next pass
+            iteration_count=ctx.iteration_count + 1,
+            addressed=suggestions_key(review_result.suggestions)
+        )
+    
+    results = run_items(state, review_refine_one, contexts)
+    
+    speculate_mcqs(state, results, approved_only=True)
+    return {
+        "contexts": changed_items(contexts, results),
+        "context_iteration": context_iteration + 1,
+        "convergence": convergence_update(state, "contexts", calls_saved)
+    }
+
+def review_refine_all_mcqs(state: GraphState) -> dict:
+    """Review MCQs and refine rejected ones in a single call each"""
+    mcq_iteration = state.get('mcq_iteration', 0)
+    max_iter = state.get('max_iterations', 3)
+    final_pass = mcq_iteration >= max_iter
+    print(f"[review_refine_mcqs] Pass {mcq_iteration} "
+          f"({'review only' if final_pass else 'fused'}) on {len(state['mcqs'])} MCQs...")
+    
+    mcqs = state['mcqs']
+    screened, rejected, validation = screen_mcqs(state, mcqs)
+    if final_pass:
+        validation["llm_calls_saved"] += len(rejected)
+    calls_saved = []
+    
+    def review_refine_one(idx: int, mcq_item: MCQItem) -> MCQItem:
+        if settled(mcq_item) or (final_pass and idx in rejected):
+            return mcq_item
+        
+        with llm_slot(state):
+            if idx in rejected:
+                # The verdict is known: refine against the validator's suggestions
+                print(f"  MCQ {idx}: Refining...")
                 refined: RefinedMCQ = refine_mcqs_api(
-                    mcq_gen=mcq_item['mcq'],
-                    mcq_review="\n".join(mcq_item['suggestions']),
-                    context=mcq_item['context'],
+                    mcq_gen=mcq_item.mcq,
+                    mcq_review="\n".join(mcq_item.suggestions),
+                    context=mcq_item.context,
+                    bloom_level=state['bloom_level'],
+                    client=run_client(state, "refine_mcqs_node"),
+                    MODEL=node_model(state, "refine_mcqs_node")
+                )
+                return replace(
+                    mcq_item,
+                    mcq=MCQ(question=refined.mcq_new),
+                    review="",
+                    suggestions=[],
+                    is_approved=False,
+                    addressed=suggestions_key(mcq_item.suggestions)
+                )
+            if final_pass:
+                print(f"  MCQ {idx}: Reviewing...")
+                review_result: Review = review_mcq(
+                    mcq=mcq_item.mcq,
+                    client=run_client(state, "review_mcqs"),
+                    context=mcq_item.context,
+                    bloom_level=state['bloom_level'],
+                    MODEL=node_model(state, "review_mcqs")
+                )
+            else:
+                print(f"  MCQ {idx}: Reviewing + refining...")
+                review_result: ReviewedMCQ = review_refine_mcq(
+                    mcq=mcq_item.mcq,
+                    client=run_client(state, "refine_mcqs_node"),
+                    context=mcq_item.context,
                     bloom_level=state['bloom_level'],
-                    client=get_client(),
-                    MODEL=state.get('model', 'gemini-2.5-flash')
+                    MODEL=node_model(state, "refine_mcqs_node")
                 )
-            except Exception as e:
-                print(f"  MCQ {idx}: refine error -> {e}")
-                # Mark approved to avoid blocking pipeline; keep original mcq
-                return {
-                    **mcq_item,
-                    "review": f"Refine error: {e}",
-                    "suggestions": [],
-                    "is_approved": True
-                }
         
-        return {
-            **mcq_item,
-            "mcq": MCQ(question=refined.mcq_new),
-            "review": "",
-            "suggestions": [],
-            "is_approved": False
-        }
+        is_approved = len(review_result.suggestions) == 0
+        print(f"  MCQ {idx}: {'Approved' if is_approved else f'Needs refine ({len(review_result.suggestions)} suggestions)'}")
+        
+        reviewed = replace(
+            mcq_item,
+            review=review_result.evaluation,
+            suggestions=review_result.suggestions,
+            is_approved=is_approved
+        )
+        if is_approved or final_pass or review_result.mcq_new is None:
+            return reviewed
+        
+        # The next pass would be spent on an MCQ that stopped improving
+        refined_mcq = MCQ(question=review_result.mcq_new)
+        if repeats_suggestions(state, mcq_item, review_result.suggestions):
+            print(f"  MCQ {idx}: Same suggestions as the previous pass, stopping")
+            calls_saved.append(1)
+            return converged(reviewed, "the review repeated the suggestions of the previous pass")
+        if stop_converged(state) and mcq_unchanged(mcq_item.mcq, refined_mcq):
+            print(f"  MCQ {idx}: Refinement left it unchanged, stopping")
+            calls_saved.append(1)
+            return converged(reviewed, "the refinement left the MCQ unchanged")
+        
+        return replace(
+            mcq_item,
+            mcq=refined_mcq,
+            review="",
+            suggestions=[],
+            is_approved=False,
+            addressed=suggestions_key(review_result.suggestions)
+        )
     
-    import concurrent.futures
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(refine_one, i, mcq): i for i, mcq in enumerate(mcqs)}
-        results = [None] * len(mcqs)
-        for future in concurrent.futures.as_completed(futures):
-            idx = futures[future]
-            results[idx] = future.result()
+    results = run_items(state, review_refine_one, screened)
     
     return {
-        "mcqs": results,
-        "mcq_iteration": mcq_iteration + 1
+        "mcqs": changed_items(mcqs, results),
+        "mcq_iteration": mcq_iteration + 1,
+        "validation": validation,
+        "convergence": convergence_update(state, "mcqs", calls_saved)
     }
 
 def complete(state: GraphState) -> dict:
     """Mark workflow as complete"""
-    print("[complete] Workflow complete!")
-    return {"current_stage": "complete"}
+    budget = RunBudget.for_run(state.get('run_id', ''))
+    if not budget.exhausted:
+        print("[complete] Workflow complete!")
+        return {"current_stage": "complete", "budget": budget.usage()}
+    
+    # Budget ran out: settle unfinished items according to the run's policy
+    policy = state.get('on_budget_exhausted', 'approve')
+    print(f"[complete] Budget exhausted ({budget.exhausted_reason}), "
+          f"{'force-approving' if policy == 'approve' else 'dropping'} unfinished items")
+    contexts = state['contexts']
+    mcqs = state['mcqs']
+    note = f"Budget exhausted ({budget.exhausted_reason})"
+    
+    if policy == 'drop':
+        mcqs = [mcq for mcq in mcqs if mcq.is_approved]
+        referenced = {mcq.context_index for mcq in mcqs}
+        kept = [i for i, ctx in enumerate(contexts) if ctx.is_approved or i in referenced]
+        new_index = {old: new for new, old in enumerate(kept)}
+        contexts = [contexts[i] for i in kept]
+        mcqs = [replace(mcq, context_index=new_index[mcq.context_index]) for mcq in mcqs]
+    else:
+        contexts = changed_items(contexts, [
+            ctx if settled(ctx) else replace(ctx, is_approved=True, suggestions=[], review=ctx.review or note)
+            for ctx in contexts
+        ])
+        mcqs = changed_items(mcqs, [
+            mcq if settled(mcq) else replace(mcq, is_approved=True, suggestions=[], review=mcq.review or note)
+            for mcq in mcqs
+        ])
+    
+    return {
+        "contexts": contexts,
+        "mcqs": mcqs,
+        "current_stage": "complete",
+        "budget_exhausted": True,
+        "budget": budget.usage()
+    }
 
 # ============== ROUTING FUNCTIONS ==============
 
-def should_refine_contexts(state: GraphState) -> Literal["refine", "generate_mcqs"]:
+def should_refine_contexts(state: GraphState) -> Literal["refine", "generate_mcqs", "complete"]:
     """Check if any context needs refinement"""
-    needs_refine = any(not ctx['is_approved'] for ctx in state['contexts'])
+    if budget_exhausted(state):
+        return "complete"
+    needs_refine = any(not settled(ctx) for ctx in state['contexts'])
     max_iter = state.get('max_iterations', 3)
     current_iter = state.get('context_iteration', 0)
     
@@ -516,7 +1333,9 @@ def should_refine_contexts(state: GraphState) -> Literal["refine", "generate_mcq
 
 def should_refine_mcqs(state: GraphState) -> Literal["refine", "complete"]:
     """Check if any MCQ needs refinement"""
-    needs_refine = any(not mcq['is_approved'] for mcq in state['mcqs'])
+    if budget_exhausted(state):
+        return "complete"
+    needs_refine = any(not settled(mcq) for mcq in state['mcqs'])
     max_iter = state.get('max_iterations', 3)
     current_iter = state.get('mcq_iteration', 0)
     
@@ -524,26 +1343,58 @@ def should_refine_mcqs(state: GraphState) -> Literal["refine", "complete"]:
         return "refine"
     return "complete"
 
+def should_continue_fused_contexts(state: GraphState) -> Literal["review_refine", "generate_mcqs", "complete"]:
+    """Fused mode: loop while refined contexts still await a verdict"""
+    if budget_exhausted(state):
+        return "complete"
+    needs_review = any(not settled(ctx) for ctx in state['contexts'])
+    max_iter = state.get('max_iterations', 3)
+    
+    if needs_review and state.get('context_iteration', 0) <= max_iter:
+        return "review_refine"
+    return "generate_mcqs"
+
+def should_continue_fused_mcqs(state: GraphState) -> Literal["review_refine", "complete"]:
+    """Fused mode: loop while refined MCQs still await a verdict"""
+    if budget_exhausted(state):
+        return "complete"
+    needs_review = any(not settled(mcq) for mcq in state['mcqs'])
+    max_iter = state.get('max_iterations', 3)
+    
+    if needs_review and state.get('mcq_iteration', 0) <= max_iter:
+        return "review_refine"
+    return "complete"
+
 # ============== BUILD THE GRAPH ==============
 
-def build_mcq_graph():
+def build_mcq_graph(fused_review: bool = False):
     """
     Build MCQ generation graph with Batch Mode + Loop:
     
     Flow:
     1. Generate Contexts
-    2. Review ALL Contexts
-    3. Any needs refine? → Refine → Back to Review
-    4. All approved → Generate MCQs
-    5. Review ALL MCQs
-    6. Any needs refine? → Refine → Back to Review
-    7. All approved → Complete
+    2. Filter near-identical Contexts (local TF-IDF, no LLM call)
+    3. Review ALL Contexts
+    4. Any needs refine? → Refine → Back to Review
+    5. All approved → Generate MCQs
+    6. Review ALL MCQs
+    7. Any needs refine? → Refine → Back to Review
+    8. All approved → Complete
+    
+    With fused_review=True, each review/refine pair is replaced by a single
+    node that returns the verdict and the refined item in one call.
     """
+    if fused_review:
+        return build_fused_mcq_graph()
     
-    builder = StateGraph(GraphState)
+    # Tracing env vars must be set before langchain is first imported
+    ensure_langsmith()
+    from langgraph.graph import StateGraph, START, END
+    builder = StateGraph(state_schema())
     
     # Add nodes
     builder.add_node("generate_contexts", generate_contexts)
+    builder.add_node("filter_contexts", filter_contexts)
     builder.add_node("review_contexts", review_all_contexts)
     builder.add_node("refine_contexts", refine_contexts)
     builder.add_node("generate_mcqs", generate_mcqs)
@@ -553,7 +1404,8 @@ def build_mcq_graph():
     
     # Define edges
     builder.add_edge(START, "generate_contexts")
-    builder.add_edge("generate_contexts", "review_contexts")
+    builder.add_edge("generate_contexts", "filter_contexts")
+    builder.add_edge("filter_contexts", "review_contexts")
     
     # Context review → refine or generate MCQs
     builder.add_conditional_edges(
@@ -561,7 +1413,8 @@ def build_mcq_graph():
         should_refine_contexts,
         {
             "refine": "refine_contexts",
-            "generate_mcqs": "generate_mcqs"
+            "generate_mcqs": "generate_mcqs",
+            "complete": "complete"
         }
     )
     
@@ -588,11 +1441,110 @@ def build_mcq_graph():
     builder.add_edge("complete", END)
     
     # Compile
-    memory = MemorySaver()
+    memory = new_checkpointer()
     graph = builder.compile(checkpointer=memory)
     
     return graph
 
+def build_fused_mcq_graph():
+    """
+    Fused variant of build_mcq_graph: roughly half the round trips per iteration.
+    
+    Flow:
+    1. Generate Contexts
+    2. Filter near-identical Contexts
+    3. Review + refine contexts (loop until approved or max_iterations)
+    4. Generate MCQs
+    5. Review + refine MCQs (loop until approved or max_iterations)
+    6. Complete
+    """
+    # Tracing env vars must be set before langchain is first imported
+    ensure_langsmith()
+    from langgraph.graph import StateGraph, START, END
+    builder = StateGraph(state_schema())
+    
+    builder.add_node("generate_contexts", generate_contexts)
+    builder.add_node("filter_contexts", filter_contexts)
+    builder.add_node("review_refine_contexts", review_refine_all_contexts)
+    builder.add_node("generate_mcqs", generate_mcqs)
+    builder.add_node("review_refine_mcqs", review_refine_all_mcqs)
+    builder.add_node("complete", complete)
+    
+    builder.add_edge(START, "generate_contexts")
+    builder.add_edge("generate_contexts", "filter_contexts")
+    builder.add_edge("filter_contexts", "review_refine_contexts")
+    builder.add_conditional_edges(
+        "review_refine_contexts",
+        should_continue_fused_contexts,
+        {
+            "review_refine": "review_refine_contexts",
+            "generate_mcqs": "generate_mcqs",
+            "complete": "complete"
+        }
+    )
+    builder.add_edge("generate_mcqs", "review_refine_mcqs")
+    builder.add_conditional_edges(
+        "review_refine_mcqs",
+        should_continue_fused_mcqs,
+        {
+            "review_refine": "review_refine_mcqs",
+            "complete": "complete"
+        }
+    )
+    builder.add_edge("complete", END)
+    
+    memory = new_checkpointer()
+    return builder.compile(checkpointer=memory)
+
+def build_regeneration_graph(fused_review: bool = False):
+    """
+    MCQ-only graph for incremental regeneration from existing contexts.
+    
+    Flow:
+    1. Generate MCQs (contexts are given and already approved)
+    2. Review ALL MCQs
+    3. Any needs refine? → Refine → Back to Review
+    4. All approved → Complete
+    """
+    # Tracing env vars must be set before langchain is first imported
+    ensure_langsmith()
+    from langgraph.graph import StateGraph, START, END
+    builder = StateGraph(state_schema())
+    
+    builder.add_node("generate_mcqs", generate_mcqs)
+    builder.add_node("complete", complete)
+    builder.add_edge(START, "generate_mcqs")
+    
+    if fused_review:
+        builder.add_node("review_refine_mcqs", review_refine_all_mcqs)
+        builder.add_edge("generate_mcqs", "review_refine_mcqs")
+        builder.add_conditional_edges(
+            "review_refine_mcqs",
+            should_continue_fused_mcqs,
+            {
+                "review_refine": "review_refine_mcqs",
+                "complete": "complete"
+            }
+        )
+    else:
+        builder.add_node("review_mcqs", review_all_mcqs)
+        builder.add_node("refine_mcqs_node", refine_mcqs_node)
+        builder.add_edge("generate_mcqs", "review_mcqs")
+        builder.add_conditional_edges(
+            "review_mcqs",
+            should_refine_mcqs,
+            {
+                "refine": "refine_mcqs_node",
+                "complete": "complete"
+            }
+        )
+        builder.add_edge("refine_mcqs_node", "review_mcqs")
+    
+    builder.add_edge("complete", END)
+    
+    memory = new_checkpointer()
+    return builder.compile(checkpointer=memory)
+
 # ============== HELPER FUNCTIONS ==============
 
 def set_max_workers(max_workers: int, delay_seconds: float = 5.0):
@@ -618,7 +1570,21 @@ def run_mcq_generation(
     model: str = "gemini-2.5-flash",
     max_iterations: int = 3,
     max_workers: int = 3,
-    delay_seconds: float = 5.0
+    delay_seconds: float = 5.0,
+    questions_per_context: int = 1,
+    contexts_per_call: int = 1,
+    fused_review: bool = False,
+    speculative_mcqs: str = "off",
+    deadline_seconds: float = None,
+    max_llm_calls: int = None,
+    max_tokens: int = None,
+    on_budget_exhausted: str = "approve",
+    max_retries: int = 10,
+    diversity_threshold: float = DEFAULT_DIVERSITY_THRESHOLD,
+    redundant_contexts: str = "drop",
+    model_routes: dict = None,
+    generation_config: dict = None,
+    stop_converged: bool = True
 ):
     """
     Run the MCQ generation workflow.
@@ -635,18 +1601,52 @@ def run_mcq_generation(
         max_iterations: Maximum refinement iterations
         max_workers: Maximum concurrent API calls
         delay_seconds: Delay between API requests (default: 5.0s for rate limiting)
+        questions_per_context: MCQs generated from each context (total = number_contexts * this)
+        contexts_per_call: Contexts packed into one MCQ generation call
+        fused_review: Review and refine each item in a single call per iteration
+        speculative_mcqs: Start MCQ generation before the context loop ends:
+            "off", "approved" (when a context is approved) or "produced"
+            (as soon as it is generated; refined contexts waste the call).
+            Accounting is returned in result["speculation"].
+        deadline_seconds: Wall-clock budget for the whole run (None = unbounded)
+        max_llm_calls: Maximum number of LLM calls for the run (None = unbounded)
+        max_tokens: Maximum total tokens for the run (None = unbounded)
+        on_budget_exhausted: "approve" (force-approve) or "drop" unfinished items
+            when a budget runs out. The partial result has budget_exhausted=True.
+        max_retries: Retry budget shared by all LLM calls of the run
+        diversity_threshold: TF-IDF cosine similarity at which a generated
+            context counts as a repeat of an earlier one (0 disables the check)
+        redundant_contexts: "drop" redundant contexts, or "regenerate" them
+            with one extra gen_context call. Counts and the estimated LLM
+            calls saved are returned in result["diversity"].
+        model_routes: Model per node, {node: model or [model, fallback, ...]}
+            for the nodes in ROUTED_NODES; the others use `model`. A
+            fallback takes the call while the model before it is
+            rate-limited. Calls per model are in result["budget"].
+        generation_config: Generation settings per node, {node:
+            {temperature, max_output_tokens, thinking_budget}}; unset
+            settings keep the model's defaults.
+        stop_converged: Take items out of the review / refine loop, unapproved,
+            when a refinement returns them unchanged (texts up to whitespace,
+            option ids and key exactly) or a review repeats the suggestions
+            the previous refinement addressed, instead of looping to
+            max_iterations. Counts and LLM calls saved are returned in
+            result["convergence"].
     
     Returns:
-        Final state with generated MCQs
+        Final state with generated MCQs. result["validation"] counts the MCQs
+        the local validator repaired, or sent back to refinement without a
+        review call (see graph/validate.py).
     """
     # Reset and configure worker pool
     WorkerPool.reset()
     set_max_workers(max_workers, delay_seconds)
     
-    graph = build_mcq_graph()
+    graph = compiled_graph("generation", fused_review)
+    thread_id = str(uuid.uuid4())
     
     initial_state = {
-        "text": text,
+        "text_ref": SourceTexts.put(text),
         "subject": subject,
         "topic": topic,
         "bloom_level": bloom_level,
@@ -654,23 +1654,222 @@ def run_mcq_generation(
         "key_point": key_point,
         "exercises": exercises,
         "model": model,
+        "model_routes": normalize_model_routes(model_routes),
+        "generation_config": normalize_generation_config(generation_config),
+        "questions_per_context": questions_per_context,
+        "contexts_per_call": contexts_per_call,
+        "speculative_mcqs": speculative_mcqs,
+        "run_id": thread_id,
         "max_iterations": max_iterations,
         "contexts": [],
         "mcqs": [],
+        "speculation": {},
+        "budget": {},
+        "budget_exhausted": False,
+        "on_budget_exhausted": on_budget_exhausted,
+        "diversity_threshold": diversity_threshold,
+        "redundant_contexts": redundant_contexts,
+        "diversity": {},
+        "validation": {},
+        "stop_converged": stop_converged,
+        "convergence": {},
         "human_feedback": "",
         "current_stage": "start",
         "context_iteration": 0,
         "mcq_iteration": 0
     }
+    
+    return invoke_run(
+        graph,
+        initial_state,
+        deadline_seconds=deadline_seconds,
+        max_llm_calls=max_llm_calls,
+        max_tokens=max_tokens,
+        max_retries=max_retries
+    )
+
+def run_mcq_regeneration(
+    contexts: list[str],
+    bloom_level: str,
+    subject: str = "",
+    topic: str = "",
+    model: str = "gemini-2.5-flash",
+    max_iterations: int = 3,
+    max_workers: int = 3,
+    delay_seconds: float = 5.0,
+    questions_per_context: int = 1,
+    fused_review: bool = False,
+    deadline_seconds: float = None,
+    max_llm_calls: int = None,
+    max_tokens: int = None,
+    max_retries: int = 10,
+    model_routes: dict = None,
+    generation_config: dict = None,
+    stop_converged: bool = True
+):
+    """
+    Re-run only gen_mcq → review_mcq → refine_mcqs for existing contexts.
+    
+    Used to fix a single question (or the questions of a single context)
+    without regenerating and re-reviewing every context of the Subject.
+    
+    Args:
+        contexts: Stored context contents to generate from (already approved)
+        bloom_level: Bloom's taxonomy level
+        (other arguments: see run_mcq_generation)
+    
+    Returns:
+        Final state; result["mcqs"][i].context_index indexes `contexts`
+    """
+    WorkerPool.reset()
+    set_max_workers(max_workers, delay_seconds)
+    
+    graph = compiled_graph("regeneration", fused_review)
     thread_id = str(uuid.uuid4())
     
+    initial_state = {
+        "text_ref": "",
+        "subject": subject,
+        "topic": topic,
+        "bloom_level": bloom_level,
+        "number_contexts": len(contexts),
+        "key_point": "",
+        "exercises": "",
+        "model": model,
+        "model_routes": normalize_model_routes(model_routes),
+        "generation_config": normalize_generation_config(generation_config),
+        "questions_per_context": questions_per_context,
+        "contexts_per_call": 1,
+        "speculative_mcqs": "off",
+        "run_id": thread_id,
+        "max_iterations": max_iterations,
+        "contexts": [ContextItem(context=ctx, is_approved=True) for ctx in contexts],
+        "mcqs": [],
+        "speculation": {},
+        "budget": {},
+        "budget_exhausted": False,
+        "on_budget_exhausted": "approve",
+        "diversity_threshold": 0,
+        "redundant_contexts": "drop",
+        "diversity": {},
+        "validation": {},
+        "stop_converged": stop_converged,
+        "convergence": {},
+        "human_feedback": "",
+        "current_stage": "mcq_generation",
+        "context_iteration": 0,
+        "mcq_iteration": 0
+    }
+    
+    return invoke_run(
+        graph,
+        initial_state,
+        deadline_seconds=deadline_seconds,
+        max_llm_calls=max_llm_calls,
+        max_tokens=max_tokens,
+        max_retries=max_retries
+    )
+
+def invoke_run(graph, initial_state: dict, **budget_limits):
+    """Invoke a compiled graph under the run's budget, cleaning up per-run registries"""
+    thread_id = initial_state["run_id"]
     config = {"configurable": {"thread_id": thread_id}}
+    RunBudget.start(thread_id, **budget_limits)
     
-    result = graph.invoke(initial_state, config)
+    try:
+        result = graph.invoke(initial_state, config)
+    finally:
+        # No-op when generate_mcqs already settled the run's speculations
+        SpeculativeMCQs.close(thread_id)
+        RunBudget.close(thread_id)
+        SourceTexts.release(initial_state.get("text_ref", ""))
+        # Compiled graphs are shared by all runs: drop this run's checkpoints
+        graph.checkpointer.delete_thread(thread_id)
     
     return result
 
 
+# ============== WARM-UP ==============
+
+_compiled_graphs: dict = {}
+_compiled_graphs_lock = threading.Lock()
+_warm_connection_model = None
+
+def compiled_graph(kind: Literal["generation", "regeneration"], fused_review: bool = False):
+    """
+    Compiled graph shared by every run of this process (runs are isolated by
+    thread_id), built on first use or by warm_up()
+    """
+    key = (kind, fused_review)
+    graph = _compiled_graphs.get(key)
+    if graph is None:
+        with _compiled_graphs_lock:
+            graph = _compiled_graphs.get(key)
+            if graph is None:
+                builder = build_mcq_graph if kind == "generation" else build_regeneration_graph
+                graph = _compiled_graphs[key] = builder(fused_review=fused_review)
+    return graph
+
+def warm_up_connection(model: str = "gemini-2.5-flash") -> bool:
+    """
+    Build the GenAI client and open its keep-alive connection (DNS + TLS)
+    with a model metadata request, which uses no tokens
+    """
+    global _warm_connection_model
+    _warm_connection_model = model
+    if not GOOGLE_API_KEY:
+        return False
+    try:
+        get_client().models.get(model=model)
+        return True
+    except Exception as e:
+        print(f"Warm-up: could not reach the model provider: {e}")
+        return False
+
+def warm_up(connect: bool = True, model: str = "gemini-2.5-flash") -> dict:
+    """
+    Pay the first-request costs ahead of traffic: import langgraph / genai,
+    compile every graph variant and, with connect=True, open the provider
+    connection. Prompt templates are loaded with graph.gen on import.
+    
+    Returns:
+        Seconds spent per step
+    """
+    timings = {}
+    started = time.perf_counter()
+    for kind in ("generation", "regeneration"):
+        for fused_review in (False, True):
+            compiled_graph(kind, fused_review)
+    timings["graphs"] = round(time.perf_counter() - started, 3)
+    
+    started = time.perf_counter()
+    from google import genai  # noqa: F401 (imported for its import cost)
+    timings["genai_import"] = round(time.perf_counter() - started, 3)
+    
+    if connect:
+        started = time.perf_counter()
+        warm_up_connection(model)
+        timings["connection"] = round(time.perf_counter() - started, 3)
+    return timings
+
+def _after_fork_in_child():
+    """
+    Sockets and locks of the client must not be shared with the parent
+    (e.g. gunicorn --preload): rebuild it in the child, reconnecting in the
+    background if the parent had warmed a connection. Imported modules and
+    compiled graphs are inherited as they are.
+    """
+    global client
+    client = None
+    if _warm_connection_model:
+        threading.Thread(
+            target=warm_up_connection, args=(_warm_connection_model,), daemon=True
+        ).start()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
 # ============== MAIN ==============
 
 if __name__ == "__main__":
@@ -708,6 +1907,6 @@ if __name__ == "__main__":
     print(f"Generated {len(result.get('mcqs', []))} MCQs")
     for i, mcq in enumerate(result.get('mcqs', [])):
         print(f"\nMCQ {i+1}:")
-        q = mcq['mcq'].question if hasattr(mcq['mcq'], 'question') else mcq['mcq']
+        q = mcq.mcq.question if hasattr(mcq.mcq, 'question') else mcq.mcq
         print(f"  Question: {q.stem[:100]}...")
-        print(f"  Approved: {mcq['is_approved']}")
+        print(f"  Approved: {mcq.is_approved}")
@@ -1,7 +1,6 @@
 from prompt.context_prompt import ctx_prompt
-from prompt.stem_prompt import stem_gen_prompt
+from prompt.stem_prompt import stem_gen_prompt, stem_list_prompt, stem_batch_prompt
 from pydantic import BaseModel
-from google import genai
 
 
 class Context(BaseModel):
@@ -32,6 +31,16 @@ class Question(BaseModel):
 class MCQ(BaseModel):
     question: Question
 
+class MCQList(BaseModel):
+    questions: list[Question]
+
+class ContextMCQs(BaseModel):
+    context_index: int
+    questions: list[Question]
+
+class BatchMCQs(BaseModel):
+    items: list[ContextMCQs]
+
 def gen_mcq(context, bloom_level, client, num_questions: int = 1,
              MODEL = "gemini-2.5-flash") -> MCQ:
     """
@@ -88,6 +97,81 @@ def gen_mcq(context, bloom_level, client, num_questions: int = 1,
     my_mcq: MCQ = result.parsed
     return my_mcq
 
+def gen_mcq_list(context, bloom_level, client, num_questions: int = 1,
+                 MODEL = "gemini-2.5-flash") -> list[MCQ]:
+    """
+    gen_mcq_list generates several MCQs from one context in a single call.
+    Args:
+        context (str): The context to generate the questions from.
+        bloom_level (str): Bloom's taxonomy level to target.
+        client: The Google GenAI client instance.
+        num_questions (int): Number of questions to generate.
+        MODEL (str): The model to use for generation.
+    Returns:
+        List[MCQ]: The generated questions, wrapped as MCQ objects.
+    """
+    mcq_template = stem_gen_prompt.format(
+        context=context,
+        num_questions=num_questions,
+        bloom_level=bloom_level
+    ) + stem_list_prompt.format(num_questions=num_questions)
+    result = client.models.generate_content(
+        model=MODEL,
+        contents=mcq_template,
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": MCQList,
+        },
+    )
+    if isinstance(result, tuple):
+        result = result[0]
+    my_mcqs: MCQList = result.parsed
+    return [MCQ(question=q) for q in my_mcqs.questions]
+
+def gen_mcq_batch(contexts, bloom_level, client, num_questions: int = 1,
+                  MODEL = "gemini-2.5-flash") -> list[list[MCQ]]:
+    """
+    gen_mcq_batch packs several contexts into one call and generates
+    num_questions MCQs for each of them.
+    Args:
+        contexts (list[str]): The contexts to generate questions from.
+        bloom_level (str): Bloom's taxonomy level to target.
+        client: The Google GenAI client instance.
+        num_questions (int): Number of questions to generate per context.
+        MODEL (str): The model to use for generation.
+    Returns:
+        List[List[MCQ]]: One list of MCQs per input context, in input order.
+        A context the model skipped gets an empty list.
+    """
+    packed_context = "\n\n".join(
+        f"[CONTEXT {idx}]\n{ctx}" for idx, ctx in enumerate(contexts)
+    )
+    mcq_template = stem_gen_prompt.format(
+        context=packed_context,
+        num_questions=num_questions,
+        bloom_level=bloom_level
+    ) + stem_batch_prompt.format(
+        number_context=len(contexts),
+        num_questions=num_questions
+    )
+    result = client.models.generate_content(
+        model=MODEL,
+        contents=mcq_template,
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": BatchMCQs,
+        },
+    )
+    if isinstance(result, tuple):
+        result = result[0]
+    my_batch: BatchMCQs = result.parsed
+
+    grouped: list[list[MCQ]] = [[] for _ in contexts]
+    for item in my_batch.items:
+        if 0 <= item.context_index < len(contexts):
+            grouped[item.context_index].extend(MCQ(question=q) for q in item.questions)
+    return grouped
+
 def gen_context(text, subject, topic, number_context, bloom_level, client,
                 key_point: str = "",
                 exercises: str = "",
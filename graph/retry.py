@@ -0,0 +1,281 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+from pydantic import ValidationError
+
+# ============== ERROR CLASSIFICATION ==============
+
+RATE_LIMIT = "rate_limit"
+OVERLOADED = "overloaded"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+SCHEMA = "schema"
+FATAL = "fatal"
+CIRCUIT_OPEN = "circuit_open"
+
+RETRYABLE = {RATE_LIMIT, OVERLOADED, TIMEOUT, CONNECTION, SCHEMA}
+# Errors that say something about provider health (schema errors do not)
+PROVIDER_FAILURES = {RATE_LIMIT, OVERLOADED, TIMEOUT, CONNECTION}
+
+
+class SchemaParseError(Exception):
+    """The response did not parse into the requested response_schema."""
+
+
+class LLMCallError(Exception):
+    """An LLM call failed for good (non-retryable, or retries exhausted)."""
+    def __init__(self, kind: str, message: str, attempts: int = 1):
+        super().__init__(f"{kind} after {attempts} attempt(s): {message}")
+        self.kind = kind
+        self.attempts = attempts
+
+
+class ProviderUnavailable(LLMCallError):
+    """The circuit breaker is open: the provider is considered unhealthy."""
+
+
+def classify_error(e: Exception) -> str:
+    """Map a provider / transport / parsing exception to an error kind"""
+    if isinstance(e, (SchemaParseError, ValidationError, json.JSONDecodeError)):
+        return SCHEMA
+    code = getattr(e, 'code', None)
+    if isinstance(code, int):
+        if code == 429:
+            return RATE_LIMIT
+        if code in (500, 502, 503):
+            return OVERLOADED
+        if code in (408, 504):
+            return TIMEOUT
+        if 400 <= code < 500:
+            return FATAL
+    name = type(e).__name__.lower()
+    if isinstance(e, TimeoutError) or 'timeout' in name:
+        return TIMEOUT
+    if isinstance(e, ConnectionError) or 'connect' in name or 'network' in name or 'protocol' in name:
+        return CONNECTION
+    return FATAL
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    """Server-suggested delay (RetryInfo.retryDelay or Retry-After), if any"""
+    match = re.search(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s", str(getattr(e, 'details', '') or e))
+    if match:
+        return float(match.group(1))
+    response = getattr(e, 'response', None)
+    header = getattr(response, 'headers', {}).get('retry-after') if response is not None else None
+    try:
+        return float(header) if header else None
+    except ValueError:
+        return None
+
+# ============== RETRY POLICY ==============
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter:
+    delay = random(0, min(max_delay, base_delay * 2 ** attempt)).
+    Rate-limit errors wait at least the server-suggested delay.
+    """
+    def __init__(self, max_attempts: int = 4, base_delay: float = 2.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, kind: str, retry_after: Optional[float] = None) -> float:
+        capped = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, capped)
+        if kind == RATE_LIMIT:
+            # Never retry a 429 sooner than the base delay or the server's hint
+            delay = max(delay, retry_after or 0.0, self.base_delay)
+        return delay
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+# ============== CIRCUIT BREAKER ==============
+
+class CircuitBreaker:
+    """
+    Process-wide breaker per model. After `failure_threshold` consecutive
+    provider failures the circuit opens and calls fail fast for
+    `cooldown_seconds`; then a single trial call is let through (half-open).
+    """
+    _breakers: dict = {}
+    _lock = threading.Lock()
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._state_lock = threading.Lock()
+
+    @classmethod
+    def for_model(cls, model: str) -> "CircuitBreaker":
+        with cls._lock:
+            if model not in cls._breakers:
+                cls._breakers[model] = cls()
+            return cls._breakers[model]
+
+    @classmethod
+    def reset_all(cls):
+        with cls._lock:
+            cls._breakers = {}
+
+    @property
+    def is_open(self) -> bool:
+        return self._failures >= self.failure_threshold
+
+    def allow(self) -> bool:
+        with self._state_lock:
+            if not self.is_open:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True  # half-open: one trial call
+            return True
+
+    def record_success(self):
+        with self._state_lock:
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._state_lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.is_open:
+                self._opened_at = time.monotonic()
+                print(f"Circuit OPEN after {self._failures} consecutive provider failures")
+
+# ============== RATE LIMITS ==============
+
+def parse_rate_limits(value: str) -> dict:
+    """'gemini-2.5-flash=10,gemini-2.5-flash-lite=15' -> {model: requests per minute}"""
+    limits = {}
+    for entry in (value or '').split(','):
+        model, _, rpm = entry.partition('=')
+        if model.strip() and rpm.strip():
+            limits[model.strip()] = float(rpm)
+    return limits
+
+
+class ModelRateLimit:
+    """
+    Process-wide request bucket per model. Requests to a model are spaced to
+    its requests-per-minute limit (LLM_RATE_LIMITS; unlisted models are not
+    paced), and a 429 opens a backoff window that holds back every caller of
+    that model only, so a rate-limited generation model does not stall
+    reviews routed to another one.
+    """
+    _buckets: dict = {}
+    _limits: dict = parse_rate_limits(os.getenv("LLM_RATE_LIMITS", ""))
+    _lock = threading.Lock()
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0  # Monotonic time the next request may start
+        self._not_before = 0.0  # End of the backoff window
+        self._state_lock = threading.Lock()
+
+    @classmethod
+    def for_model(cls, model: str) -> "ModelRateLimit":
+        with cls._lock:
+            if model not in cls._buckets:
+                cls._buckets[model] = cls(cls._limits.get(model))
+            return cls._buckets[model]
+
+    @classmethod
+    def configure(cls, limits: dict):
+        """Replace the per-model requests-per-minute limits"""
+        with cls._lock:
+            cls._limits = dict(limits)
+            cls._buckets = {}
+
+    @classmethod
+    def reset_all(cls):
+        with cls._lock:
+            cls._buckets = {}
+
+    @property
+    def backing_off(self) -> bool:
+        return self._not_before > time.monotonic()
+
+    def acquire(self):
+        """Wait for the model's next request slot and take it"""
+        with self._state_lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._not_before)
+            self._next_slot = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def hold(self, seconds: float):
+        """Open (or extend) the model's backoff window"""
+        with self._state_lock:
+            self._not_before = max(self._not_before, time.monotonic() + seconds)
+
+    def backoff(self, seconds: float):
+        """Pacer for call_with_retry: hold the model for `seconds` and wait it out"""
+        self.hold(seconds)
+        time.sleep(max(0.0, self._not_before - time.monotonic()))
+
+# ============== CALL WRAPPER ==============
+
+def call_with_retry(send: Callable, *, model: str, budget=None,
+                    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+                    pacer: Optional[Callable[[float], None]] = None,
+                    failover: bool = False):
+    """
+    Run send() with classified retries.
+
+    Args:
+        send: Zero-argument callable performing one provider request.
+        model: Model name (selects the circuit breaker).
+        budget: Optional RunBudget; each retry is charged to its retry budget
+            and no backoff may outlast its deadline.
+        policy: Backoff policy.
+        pacer: Called with the backoff delay of rate-limit errors instead of
+            time.sleep, so the shared rate limiter can hold back every
+            queued caller as well. Other retryable errors (schema, timeout,
+            overload) only concern this call and sleep in the calling thread.
+        failover: Raise rate-limit errors at once instead of backing off,
+            because a fallback model will take the call.
+    Raises:
+        ProviderUnavailable: the circuit for this model is open.
+        LLMCallError: non-retryable error, or retries exhausted.
+    """
+    breaker = CircuitBreaker.for_model(model)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise ProviderUnavailable(CIRCUIT_OPEN, f"provider for {model} is unhealthy", attempt)
+        try:
+            result = send()
+        except Exception as e:
+            if budget is not None and budget.exhausted:
+                raise  # Let the budget layer report the cancellation
+            kind = classify_error(e)
+            if kind in PROVIDER_FAILURES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()  # The provider answered
+            attempt += 1
+            if kind not in RETRYABLE or attempt >= policy.max_attempts or (failover and kind == RATE_LIMIT):
+                raise LLMCallError(kind, str(e), attempt) from e
+            if budget is not None and not budget.reserve_retry():
+                raise LLMCallError(kind, f"run retry budget exhausted ({e})", attempt) from e
+            delay = policy.delay(attempt - 1, kind, retry_after_seconds(e))
+            remaining = budget.remaining_seconds() if budget is not None else None
+            if remaining is not None and delay >= remaining:
+                raise LLMCallError(kind, f"no time left to retry ({e})", attempt) from e
+            print(f"LLM {kind} error, retry {attempt}/{policy.max_attempts - 1} in {delay:.1f}s")
+            (pacer if pacer is not None and kind == RATE_LIMIT else time.sleep)(delay)
+            continue
+        breaker.record_success()
+        return result
@@ -1,11 +1,27 @@
+from typing import Optional
 from pydantic import BaseModel
-from google import genai
-from prompt.review_prompt import review_context_prompt, review_mcq_prompt
+from prompt.review_prompt import (
+    review_context_prompt, review_mcq_prompt,
+    fused_context_refine_prompt, fused_mcq_refine_prompt
+)
+from .gen import Question
 
 class Review(BaseModel):
     evaluation: str
     suggestions: list[str]
 
+class ReviewedContext(BaseModel):
+    """Review verdict plus the refined context (empty when approved)"""
+    evaluation: str
+    suggestions: list[str]
+    context_new: str
+
+class ReviewedMCQ(BaseModel):
+    """Review verdict plus the refined question (None when approved)"""
+    evaluation: str
+    suggestions: list[str]
+    mcq_new: Optional[Question] = None
+
 def review_context(context_gen, text, client, subject, topic,
                    bloom_level,
                    exercise: str = "",
@@ -50,6 +66,57 @@ def review_mcq(mcq, client, context, bloom_level,
     my_review: Review = result.parsed
     return my_review
 
+def review_refine_context(context_gen, text, client, subject, topic,
+                          bloom_level,
+                          exercise: str = "",
+                          key_point: str = "",
+                          MODEL = "gemini-2.5-flash") -> ReviewedContext:
+    """
+    review_refine_context reviews a context and, when it is not approved,
+    returns the refined context in the same call (fused review-and-refine mode).
+    """
+    template = review_context_prompt.format(context_gen=context_gen,
+                                            text=text,
+                                            subject=subject,
+                                            topic=topic,
+                                            bloom_level=bloom_level,
+                                            exercise=exercise,
+                                            key_point=key_point) + fused_context_refine_prompt
+    result = client.models.generate_content(
+        model=MODEL,
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": ReviewedContext,
+        },
+        contents=template,
+    )
+    if isinstance(result, tuple):
+        result = result[0]
+    my_review: ReviewedContext = result.parsed
+    return my_review
+
+def review_refine_mcq(mcq, client, context, bloom_level,
+                      MODEL = "gemini-2.5-flash") -> ReviewedMCQ:
+    """
+    review_refine_mcq reviews an MCQ and, when it is not approved,
+    returns the refined question in the same call (fused review-and-refine mode).
+    """
+    template = review_mcq_prompt.format(mcq = mcq,
+                                        context = context,
+                                        bloom_level = bloom_level) + fused_mcq_refine_prompt
+    result = client.models.generate_content(
+        model=MODEL,
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": ReviewedMCQ,
+        },
+        contents=template,
+    )
+    if isinstance(result, tuple):
+        result = result[0]
+    my_review: ReviewedMCQ = result.parsed
+    return my_review
+
 if __name__ == "__main__":
     # print(review_context_prompt)
     print(review_mcq_prompt)
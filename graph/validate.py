@@ -0,0 +1,153 @@
+"""
+Local structural checks for generated MCQs, run before the LLM review.
+
+validate_mcq first repairs what is unambiguous (stray whitespace, option ids
+written as "a." or "(B)", a correct_answer given as a label or as the text of
+an option, option texts that repeat their own label) and then lists what it
+cannot fix: too few options, duplicate ids or texts, an answer that is not
+one of the options, distractors without a justification, an empty or
+over-long stem. The problems are worded as reviewer suggestions so a broken
+MCQ can go straight to refinement without spending a review call.
+"""
+import re
+
+from .gen import MCQ
+
+MIN_OPTIONS = 4
+MAX_STEM_WORDS = 300  # The prompts target <= 150 words; code blocks make stems longer
+
+# "A", "a.", "(B)", "C)", "Đáp án D", "Phương án A:" ...
+_LABEL = re.compile(r'^\s*(?:(?:đáp án|phương án|option|answer)\s*)?[\(\[]?([A-Za-z])[\)\]\.:]?\s*$', re.IGNORECASE)
+_LEADING_LABEL = re.compile(r'^\s*[\(\[]?([A-Za-z])[\)\]\.:]\s+\S')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_label(value: str) -> str:
+    """Bare upper-case option label for "a.", "(B)", "Đáp án C" ...; the stripped input otherwise"""
+    value = (value or '').strip()
+    match = _LABEL.match(value)
+    return match.group(1).upper() if match else value
+
+
+def _same_text(text: str) -> str:
+    return _SPACE.sub(' ', (text or '').strip()).casefold()
+
+
+def _strip_own_label(option_id: str, text: str) -> str:
+    """"A. Hà Nội" -> "Hà Nội" for option A"""
+    match = re.match(rf'^\s*[\(\[]?{re.escape(option_id)}[\)\]\.:]\s+(.+)$', text or '', re.DOTALL)
+    return match.group(1).strip() if match else (text or '').strip()
+
+
+def repair_mcq(mcq: MCQ) -> tuple[MCQ, list[str]]:
+    """
+    Fix unambiguous formatting slips.
+
+    Returns:
+        (mcq, repairs): the repaired copy (the input itself when nothing
+        changed) and a description of each repair made
+    """
+    question = mcq.question
+    repairs = []
+
+    options = []
+    for opt in question.options.options:
+        option_id = normalize_label(opt.id)
+        text = _strip_own_label(option_id, opt.text)
+        if option_id != opt.id or text != opt.text:
+            options.append(opt.model_copy(update={"id": option_id, "text": text}))
+        else:
+            options.append(opt)
+    if any(new is not old for new, old in zip(options, question.options.options)):
+        repairs.append("normalized option ids / texts")
+
+    ids = {opt.id for opt in options}
+    correct_answer = normalize_label(question.correct_answer)
+    if correct_answer not in ids:
+        # The answer given as "B. <text>" or as the text of an option
+        labelled = _LEADING_LABEL.match(question.correct_answer or '')
+        by_text = [opt.id for opt in options if _same_text(opt.text) == _same_text(question.correct_answer)]
+        if labelled and labelled.group(1).upper() in ids:
+            correct_answer = labelled.group(1).upper()
+        elif len(by_text) == 1:
+            correct_answer = by_text[0]
+    if correct_answer != question.correct_answer:
+        repairs.append(f"correct_answer {question.correct_answer!r} -> {correct_answer!r}")
+
+    justifications = question.reasoning.distractor_justification
+    fixed_justifications = [
+        j if normalize_label(j.id) == j.id else j.model_copy(update={"id": normalize_label(j.id)})
+        for j in justifications
+    ]
+    if any(new is not old for new, old in zip(fixed_justifications, justifications)):
+        repairs.append("normalized distractor_justification ids")
+
+    stem = question.stem.strip()
+    if stem != question.stem:
+        repairs.append("trimmed stem")
+
+    if not repairs:
+        return mcq, repairs
+    return MCQ(question=question.model_copy(update={
+        "stem": stem,
+        "options": question.options.model_copy(update={"options": options}),
+        "correct_answer": correct_answer,
+        "reasoning": question.reasoning.model_copy(update={"distractor_justification": fixed_justifications}),
+    })), repairs
+
+
+def mcq_problems(mcq: MCQ) -> list[str]:
+    """Structural problems of an MCQ, worded as suggestions for the refine step"""
+    question = mcq.question
+    options = question.options.options
+    problems = []
+
+    if not question.stem.strip():
+        problems.append("Câu hỏi (stem) đang trống: cần viết lại phần dẫn của câu hỏi.")
+    elif len(question.stem.split()) > MAX_STEM_WORDS:
+        problems.append(f"Phần dẫn quá dài ({len(question.stem.split())} từ): rút gọn còn tối đa khoảng 150 từ.")
+
+    if len(options) < MIN_OPTIONS:
+        problems.append(f"Chỉ có {len(options)} phương án: cần đủ {MIN_OPTIONS} phương án (1 đáp án đúng và các phương án nhiễu).")
+
+    ids = [opt.id for opt in options]
+    duplicate_ids = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicate_ids:
+        problems.append(f"Mã phương án bị trùng ({', '.join(duplicate_ids)}): mỗi phương án cần một mã riêng.")
+
+    empty = [opt.id for opt in options if not opt.text.strip()]
+    if empty:
+        problems.append(f"Phương án {', '.join(empty)} không có nội dung.")
+
+    seen, duplicate_texts = {}, []
+    for opt in options:
+        key = _same_text(opt.text)
+        if key and key in seen:
+            duplicate_texts.append(f"{seen[key]}/{opt.id}")
+        seen.setdefault(key, opt.id)
+    if duplicate_texts:
+        problems.append(f"Các phương án trùng nội dung ({', '.join(duplicate_texts)}): "
+                        "thay bằng phương án nhiễu khác nhau.")
+
+    if question.correct_answer not in ids:
+        problems.append(f"Đáp án đúng '{question.correct_answer}' không phải mã của phương án nào "
+                        f"({', '.join(ids)}): chỉ rõ mã của đáp án đúng.")
+    else:
+        justified = {j.id for j in question.reasoning.distractor_justification}
+        missing = [i for i in ids if i != question.correct_answer and i not in justified]
+        if missing:
+            problems.append(f"Thiếu giải thích (distractor_justification) cho phương án nhiễu {', '.join(missing)}.")
+
+    return problems
+
+
+def validate_mcq(mcq: MCQ) -> tuple[MCQ, list[str], list[str]]:
+    """
+    Repair an MCQ, then check it.
+
+    Returns:
+        (mcq, repairs, problems): the repaired MCQ, the repairs made, and the
+        problems left (empty when the MCQ is structurally sound)
+    """
+    mcq, repairs = repair_mcq(mcq)
+    return mcq, repairs, mcq_problems(mcq)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 
@@ -81,12 +82,70 @@ WSGI_APPLICATION = 'mcq_gen2025.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# SQLite tuning profile (DATABASE_PROFILE env var). PRAGMAS are applied to
+# every new connection by genmcq.db.apply_sqlite_pragmas (connection_created).
+# "production" lets web workers and background generation jobs write
+# concurrently: WAL (readers never block the writer), a busy timeout instead
+# of immediate "database is locked", IMMEDIATE write transactions (no
+# read-to-write lock upgrade failures) and persistent connections.
+SQLITE_PROFILES = {
+    'development': {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {},
+        'PRAGMAS': {},
+    },
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 10000,  # ms
+            'mmap_size': 268435456,  # 256 MB
+            'temp_store': 'MEMORY',
+        },
+    },
 }
+DATABASE_PROFILE = os.getenv('DATABASE_PROFILE', 'development')
+_sqlite_profile = SQLITE_PROFILES[DATABASE_PROFILE]
+
+# DB_ENGINE=postgresql for multi-node deployments (requires psycopg[pool]);
+# connections come from Django's psycopg pool, so CONN_MAX_AGE stays 0
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    SQLITE_PRAGMAS = {}
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'mcq_gen2025'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+                },
+            },
+        }
+    }
+else:
+    SQLITE_PRAGMAS = _sqlite_profile['PRAGMAS']
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': _sqlite_profile['CONN_MAX_AGE'],
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': _sqlite_profile['OPTIONS'],
+            # A file test database (e.g. for load tests) instead of in-memory
+            'TEST': {'NAME': os.getenv('SQLITE_TEST_NAME') or None},
+        }
+    }
 
 
 # Password validation
@@ -156,4 +215,49 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 # Session settings
-SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 days
\ No newline at end of file
+SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 days
+# Warm up WSGI workers at start (URLconf, LLM stack, compiled graphs and the
+# provider connection) so the first request is not slower than the rest.
+# Opt in with WARMUP_ON_START=1; only mcq_gen2025/wsgi.py runs it
+WARMUP_ON_START = os.getenv('WARMUP_ON_START', '0') == '1'
+
+# LLM model per graph node: a model name or [model, fallback, ...], the
+# fallbacks taking calls while the model before them is rate-limited. Nodes
+# not listed use the request's model; with LLM_MODEL_ROUTES unset every node
+# does. Opt in with a JSON object, e.g.
+# {"review_mcqs": ["gemini-2.5-flash-lite", "gemini-2.5-flash"]}; requests can
+# override single nodes ("model_routes"). Requests per minute per model are
+# set with LLM_RATE_LIMITS, e.g. "gemini-2.5-flash=10,gemini-2.5-flash-lite=15"
+# (read by graph/retry.py).
+LLM_MODEL_ROUTES = json.loads(os.getenv('LLM_MODEL_ROUTES', '') or 'null') or {}
+
+# Generation config per graph node, as named profiles: temperature,
+# max_output_tokens and thinking_budget (thinking tokens count towards
+# max_output_tokens; 0 turns thinking off on Flash / Flash-Lite but is
+# rejected by Pro; -1 lets the model decide). Settings not given keep the
+# model defaults. Requests can pick a profile ("generation_profile") and
+# override single nodes ("generation_config"); the result is stored in
+# Subject.config and reused on regeneration. The default, model_defaults,
+# sends no overrides (the requests made before profiles existed); balanced and
+# fast are opt-in. Compare profiles offline with
+# `python manage.py bench_generation_profiles`.
+LLM_GENERATION_PROFILES = {
+    'balanced': {
+        'generate_contexts': {'thinking_budget': 2048},
+        'review_contexts': {'temperature': 0.0, 'thinking_budget': 512, 'max_output_tokens': 2048},
+        'refine_contexts': {'thinking_budget': 1024, 'max_output_tokens': 4096},
+        'generate_mcqs': {'thinking_budget': 1024},
+        'review_mcqs': {'temperature': 0.0, 'thinking_budget': 512, 'max_output_tokens': 2048},
+        'refine_mcqs_node': {'thinking_budget': 1024, 'max_output_tokens': 4096},
+    },
+    'fast': {
+        'generate_contexts': {'thinking_budget': 512},
+        'review_contexts': {'temperature': 0.0, 'thinking_budget': 0, 'max_output_tokens': 1024},
+        'refine_contexts': {'thinking_budget': 256, 'max_output_tokens': 2048},
+        'generate_mcqs': {'thinking_budget': 256},
+        'review_mcqs': {'temperature': 0.0, 'thinking_budget': 0, 'max_output_tokens': 1024},
+        'refine_mcqs_node': {'thinking_budget': 256, 'max_output_tokens': 2048},
+    },
+    'model_defaults': {},
+}
+LLM_GENERATION_PROFILE = os.getenv('LLM_GENERATION_PROFILE', 'model_defaults')
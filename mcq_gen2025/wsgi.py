@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mcq_gen2025.settings')
 
 application = get_wsgi_application()
+
+from genmcq.warmup import warm_up_worker  # noqa: E402 (needs the app registry)
+
+warm_up_worker()
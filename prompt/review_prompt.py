@@ -185,3 +185,19 @@ For each option, format your response as:
         comment: [Your evaluation and specific suggestions, if needed, or confirmation of effectiveness]
 """
 
+################################################################################################################################################
+
+# Appended to review_context_prompt / review_mcq_prompt in fused review-and-refine mode.
+fused_context_refine_prompt = """
+**Fused refinement step**
+After writing `evaluation` and `suggestions`:
+*   If `suggestions` is empty, the context is approved: return an empty string in `context_new`.
+*   Otherwise, act as the refinement expert and rewrite the context so that it resolves EVERY suggestion, staying faithful to LECTURE_CONTENT, SUBJECT_TOPIC, KEY_POINT and BLOOM_LEVEL. Return the full rewritten context (in VIETNAMESE) in `context_new`.
+"""
+
+fused_mcq_refine_prompt = """
+**Fused refinement step**
+After writing `evaluation` and `suggestions`:
+*   If `suggestions` is empty, the MCQ is approved: return null in `mcq_new`.
+*   Otherwise, act as the refinement expert and rewrite the complete MCQ (stem, options, correct_answer and reasoning, in VIETNAMESE) so that it resolves EVERY suggestion while staying faithful to ORIGINAL_CONTEXT and BLOOM_LEVEL. Return it in `mcq_new`.
+"""
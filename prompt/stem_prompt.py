@@ -146,4 +146,19 @@ Your final response must be a JSON object or a list of JSON objects, strictly fo
   }}
 }}
 ```
-"""
\ No newline at end of file
+"""
+
+# Appended to stem_gen_prompt when several questions are requested in one call.
+stem_list_prompt = """
+**List output override**
+Generate exactly {num_questions} distinct questions from the context above. Each question must target a different concept or tactic; do not paraphrase another question in the list.
+Instead of a single "question" object, return a JSON object with a "questions" array. Every element of the array follows the "question" structure of the OUTPUT FORMAT above.
+"""
+
+# Appended to stem_gen_prompt when several contexts are packed into one call.
+stem_batch_prompt = """
+**Batch output override**
+The context above contains {number_context} independent blocks, each starting with a `[CONTEXT i]` header (i starts at 0). Treat every block as a separate context: never mix information between blocks.
+For EACH block, generate exactly {num_questions} distinct questions using only that block.
+Return a JSON object with an "items" array. Each element has "context_index" (the integer i of its block) and "questions" (an array whose elements follow the "question" structure of the OUTPUT FORMAT above). Return exactly one element per block.
+"""
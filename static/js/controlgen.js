@@ -24,7 +24,9 @@ let currentSubjectName = null; // Store current subject name for export
 let currentPage = 1;
 let questionsPerPage = 5; // Maximum 5 questions per page
 let questionsToShow = 2; // Initial show 2 questions, scroll to show more
-let allQuestions = []; // Store all questions for current subject
+let allQuestions = []; // Questions of the current subject loaded so far
+let nextQuestionsCursor = null; // Cursor of the next page on the server, null when all are loaded
+const QUESTIONS_FETCH_SIZE = 50; // Questions fetched per request
 
 // ============== HELPER FUNCTIONS ==============
 
@@ -118,22 +120,53 @@ function initModalAnimations() {
     }
 }
 
+/**
+ * Fetch one page of questions (keyset pagination on the server)
+ */
+function fetchQuestionsPage(subjectId = null, cursor = null) {
+    const params = new URLSearchParams({ limit: QUESTIONS_FETCH_SIZE });
+    if (subjectId) params.set('subject_id', subjectId);
+    if (cursor) params.set('cursor', cursor);
+    return fetch(`${API_ENDPOINTS.getQuestions}?${params}`, {
+        method: 'GET',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    });
+}
+
+/**
+ * Append the next page of the current subject's questions; false when there is none
+ */
+async function loadMoreQuestions() {
+    if (!nextQuestionsCursor) return false;
+    try {
+        const response = await fetchQuestionsPage(currentSubjectId, nextQuestionsCursor);
+        if (!response.ok) return false;
+        const data = await response.json();
+        if (!data.success) return false;
+        allQuestions = allQuestions.concat(data.questions || []);
+        nextQuestionsCursor = data.next_cursor || null;
+        return true;
+    } catch (error) {
+        console.log('Error loading more questions:', error);
+        return false;
+    }
+}
+
+/**
+ * Load every remaining page (before copying / exporting the loaded questions)
+ */
+async function loadRemainingQuestions() {
+    while (nextQuestionsCursor && await loadMoreQuestions()) { }
+}
+
 /**
  * Load Questions from Backend
  */
 async function loadQuestionsFromBackend(subjectId = null) {
     try {
-        let url = API_ENDPOINTS.getQuestions;
-        if (subjectId) {
-            url += `?subject_id=${subjectId}`;
-        }
-
-        const response = await fetch(url, {
-            method: 'GET',
-            headers: {
-                'Content-Type': 'application/json',
-            }
-        });
+        const response = await fetchQuestionsPage(subjectId);
 
         if (!response.ok) {
             // User might not be logged in or no questions yet
@@ -144,8 +177,9 @@ async function loadQuestionsFromBackend(subjectId = null) {
         const data = await response.json();
 
         if (data.success && data.questions && data.questions.length > 0) {
-            // Store all questions for pagination
+            // First page; later pages are fetched when paging past them
             allQuestions = data.questions;
+            nextQuestionsCursor = data.next_cursor || null;
             currentSubjectId = subjectId;
             currentPage = 1;
 
@@ -239,6 +273,7 @@ async function loadQuestionsFromBackend(subjectId = null) {
                 questionsContainer.innerHTML = '';
             }
             allQuestions = [];
+            nextQuestionsCursor = null;
             currentSubjectName = null;
             updateQuestionCount();
         }
@@ -306,15 +341,16 @@ function updatePaginationControls(totalPages = 0, currentPageNum = 1, totalQuest
         existingPagination.remove();
     }
 
-    if (totalPages <= 1 && totalQuestions <= questionsPerPage) return; // No pagination needed
+    const hasMore = Boolean(nextQuestionsCursor);
+    if (totalPages <= 1 && totalQuestions <= questionsPerPage && !hasMore) return; // No pagination needed
 
     // Create pagination controls
     const paginationHTML = `
         <div class="questions-pagination mt-4 pt-4 border-t border-gray-200 dark:border-gray-700 flex items-center justify-between">
             <div class="text-sm text-gray-600 dark:text-gray-400">
-                ${totalPages > 1 ? `Trang ${currentPageNum} / ${totalPages}` : ''} (${totalQuestions} câu hỏi)
+                ${totalPages > 1 ? `Trang ${currentPageNum} / ${totalPages}${hasMore ? '+' : ''}` : ''} (${totalQuestions}${hasMore ? '+' : ''} câu hỏi)
             </div>
-            ${totalPages > 1 ? `
+            ${totalPages > 1 || hasMore ? `
             <div class="flex items-center gap-2">
                 <button onclick="goToQuestionsPage(${currentPageNum - 1})" 
                         ${currentPageNum === 1 ? 'disabled' : ''}
@@ -322,7 +358,7 @@ function updatePaginationControls(totalPages = 0, currentPageNum = 1, totalQuest
                     ← Trước
                 </button>
                 <button onclick="goToQuestionsPage(${currentPageNum + 1})" 
-                        ${currentPageNum === totalPages ? 'disabled' : ''}
+                        ${currentPageNum >= totalPages && !hasMore ? 'disabled' : ''}
                         class="px-3 py-1.5 text-sm font-medium rounded-lg border border-gray-300 dark:border-gray-600 text-gray-700 dark:text-gray-300 hover:bg-gray-50 dark:hover:bg-gray-700 disabled:opacity-50 disabled:cursor-not-allowed transition-colors">
                     Sau →
                 </button>
@@ -337,7 +373,11 @@ function updatePaginationControls(totalPages = 0, currentPageNum = 1, totalQuest
 /**
  * Go to specific questions page
  */
-function goToQuestionsPage(page) {
+async function goToQuestionsPage(page) {
+    // Fetch the next server page when paging past the loaded questions
+    while (page * questionsPerPage > allQuestions.length && nextQuestionsCursor) {
+        if (!await loadMoreQuestions()) break;
+    }
     const totalPages = Math.ceil(allQuestions.length / questionsPerPage);
     if (page < 1 || page > totalPages) return;
 
@@ -1267,22 +1307,35 @@ function updateCheckboxStyle(label, isChecked) {
 /**
  * Export Functions
  */
+function downloadExport(format) {
+    // Files are generated and streamed by the server from the saved subject
+    if (!currentSubjectId) {
+        showToast('Chưa có môn học nào để xuất!', 'warning');
+        return false;
+    }
+    const a = document.createElement('a');
+    a.href = `/api/subjects/${currentSubjectId}/export/?format=${format}`;
+    a.click();
+    return true;
+}
+
 function exportToPDF() {
-    alert('Đang xuất file PDF...');
-    // TODO: Implement PDF export
+    downloadExport('pdf');
 }
 
 function exportToWord() {
-    alert('Đang xuất file Word...');
-    // TODO: Implement Word export
+    downloadExport('docx');
 }
 
 function exportToExcel() {
-    alert('Đang xuất file Excel...');
-    // TODO: Implement Excel export
+    downloadExport('xlsx');
 }
 
 function exportToJSON() {
+    if (currentSubjectId) {
+        downloadExport('json');
+        return;
+    }
     const data = getQuestionsData();
 
     // Check if there are questions to export
@@ -1306,7 +1359,8 @@ function exportToJSON() {
     showToast('Đã xuất file JSON thành công!', 'success');
 }
 
-function copyToClipboard() {
+async function copyToClipboard() {
+    await loadRemainingQuestions();
     const data = getQuestionsData();
     // Get questions array from the data object
     const questions = data.questions || [];
@@ -2304,7 +2358,8 @@ function updateQuestionCount() {
     if (questionCount) {
         // Count from allQuestions array instead of DOM elements
         // This ensures we show the total count of all loaded questions, not just visible ones
+        // ("50+" while more pages are left on the server)
         const totalCount = allQuestions.length;
-        questionCount.textContent = totalCount;
+        questionCount.textContent = nextQuestionsCursor ? `${totalCount}+` : totalCount;
     }
 }
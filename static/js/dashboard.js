@@ -10,6 +10,67 @@ const DASHBOARD_API_ENDPOINTS = {
     deleteSubject: (id) => `/api/subjects/${id}/delete/`
 };
 
+// Modal questions are fetched a page at a time (keyset cursor from the server)
+let modalSubjectId = null;
+let modalNextCursor = null;
+let modalQuestionCount = 0;
+
+/**
+ * Append questions to the modal list and show "load more" while pages are left
+ */
+function appendModalQuestions(questions) {
+    const modalQuestionsList = document.getElementById('modalQuestionsList');
+    const existingButton = document.getElementById('modalLoadMore');
+    if (existingButton) existingButton.remove();
+
+    questions.forEach((question) => {
+        modalQuestionCount += 1;
+        const difficultyLabel = getDifficultyLabel(question.difficulty);
+        const questionHTML = createReadOnlyQuestionCardHTML(question, modalQuestionCount, difficultyLabel);
+        modalQuestionsList.insertAdjacentHTML('beforeend', questionHTML);
+    });
+
+    if (modalNextCursor) {
+        modalQuestionsList.insertAdjacentHTML('beforeend', `
+            <button id="modalLoadMore" onclick="loadMoreModalQuestions()"
+                    class="w-full mt-2 px-4 py-2 text-sm font-medium rounded-lg border border-gray-300 dark:border-gray-600 text-gray-700 dark:text-gray-300 hover:bg-gray-50 dark:hover:bg-gray-700 transition-colors">
+                Tải thêm câu hỏi
+            </button>
+        `);
+    }
+}
+
+/**
+ * Fetch the next page of the modal's subject
+ */
+async function loadMoreModalQuestions() {
+    if (!modalNextCursor) return;
+    const button = document.getElementById('modalLoadMore');
+    if (button) button.disabled = true;
+    try {
+        const params = new URLSearchParams({ subject_id: modalSubjectId, cursor: modalNextCursor });
+        const response = await fetch(`${DASHBOARD_API_ENDPOINTS.getQuestions}?${params}`, {
+            method: 'GET',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        });
+        if (!response.ok) {
+            throw new Error('Không thể tải câu hỏi');
+        }
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error || 'Không thể tải câu hỏi');
+        }
+        modalNextCursor = data.next_cursor || null;
+        appendModalQuestions(data.questions || []);
+    } catch (error) {
+        console.error('Error loading more questions for modal:', error);
+        if (button) button.disabled = false;
+        showToast('Không thể tải câu hỏi', 'error');
+    }
+}
+
 /**
  * Load and display questions in modal for a specific subject
  */
@@ -27,6 +88,9 @@ async function loadModalSubjectQuestions(subjectId) {
     modalLoading.classList.remove('hidden');
     modalQuestionsList.innerHTML = '';
     modalEmptyState.classList.add('hidden');
+    modalSubjectId = subjectId;
+    modalNextCursor = null;
+    modalQuestionCount = 0;
 
     try {
         // Fetch questions for this subject
@@ -61,12 +125,9 @@ async function loadModalSubjectQuestions(subjectId) {
         modalLoading.classList.add('hidden');
 
         if (data.success && data.questions && data.questions.length > 0) {
-            // Display questions using shared helper function
-            data.questions.forEach((question, index) => {
-                const difficultyLabel = getDifficultyLabel(question.difficulty);
-                const questionHTML = createReadOnlyQuestionCardHTML(question, index + 1, difficultyLabel);
-                modalQuestionsList.insertAdjacentHTML('beforeend', questionHTML);
-            });
+            // Display the first page using shared helper function
+            modalNextCursor = data.next_cursor || null;
+            appendModalQuestions(data.questions);
 
             modalEmptyState.classList.add('hidden');
         } else {